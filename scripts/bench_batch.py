@@ -0,0 +1,53 @@
+"""bench_batch.py – batch generation throughput against the mock OpenAI backend.
+
+Usage:
+    python scripts/bench_batch.py [--requests 200] [--concurrency 1 8 32] [--ttft 0.2]
+
+Writes a JSONL of prompts to a temporary directory, then runs
+OpenAIClientManager.generate_batch at each concurrency level against
+src.llm.mock_backends.MockOpenAIServer. It reports requests/second. Rate limits
+are disabled, so the numbers show the round-trip bound that concurrency removes.
+"""
+import argparse
+import json
+import logging
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import config  # noqa: E402
+from src.llm.clients import OpenAIClientManager  # noqa: E402
+from src.llm.mock_backends import MockBehavior, MockOpenAIServer  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--ttft", type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("src").setLevel(logging.ERROR)
+    config.LLM_RATE_LIMITS = {}
+
+    behavior = MockBehavior(ttft_sec=args.ttft, tokens_per_sec=0, replies=["ok"])
+    with tempfile.TemporaryDirectory() as tmp, MockOpenAIServer(behavior) as server:
+        requests = Path(tmp) / "requests.jsonl"
+        with requests.open("w") as fh:
+            for i in range(args.requests):
+                fh.write(json.dumps({"custom_id": f"r{i}", "prompt": f"question {i}"}) + "\n")
+        for concurrency in args.concurrency:
+            mgr = OpenAIClientManager(api_key="mock", default_model_name="gpt-4.1", base_url=server.base_url)
+            out = Path(tmp) / f"results-{concurrency}.jsonl"
+            summary = mgr.generate_batch(str(requests), str(out), concurrency=concurrency)
+            print(
+                f"concurrency={concurrency:<4} {summary.succeeded / summary.elapsed_sec:8.1f} req/s "
+                f"({summary.succeeded} ok, {summary.failed} failed, {summary.elapsed_sec:.2f} s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""bench_client_pool.py – session startup and first-request latency with and without the client pool.
+
+Usage:
+    python scripts/bench_client_pool.py [--sessions 30]
+
+Simulates sub-agent spawning. Each iteration builds a fresh ChatSession (as
+MultiAgentTool does per spawn) and sends one OpenAI turn to the mock server.
+It is run with LLM_CLIENT_POOL_ENABLED off (a new OpenAI client, connection
+pool and genai.configure per session) and then on (shared clients). Against
+real endpoints the first-request column also includes the TLS handshake
+that pooling avoids. Locally it only shows the TCP connect.
+"""
+import argparse
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import config  # noqa: E402
+from src.core.chat_session import ChatSession  # noqa: E402
+from src.llm import client_pool  # noqa: E402
+from src.llm import clients as llm_clients  # noqa: E402
+from src.llm.mock_backends import MockBehavior, MockOpenAIServer  # noqa: E402
+
+
+def _run(sessions: int, pooled: bool):
+    config.LLM_CLIENT_POOL_ENABLED = pooled
+    client_pool.reset_client_pool()
+    llm_clients._gemini_configured_key = None
+    startup, first = [], []
+    for i in range(sessions):
+        start = time.perf_counter()
+        cs = ChatSession(persist_history=False)
+        built = time.perf_counter()
+        cs.process_user_message(f"question {i}", model_choice="openai")
+        startup.append(built - start)
+        first.append(time.perf_counter() - built)
+    return startup, first
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=30)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("src").setLevel(logging.ERROR)
+    config.LLM_RATE_LIMITS = {}
+
+    with MockOpenAIServer(MockBehavior(ttft_sec=0.0, tokens_per_sec=0, replies=["ok"])) as server:
+        config.OPENAI_API_KEY = "mock"
+        config.OPENAI_BASE_URL = server.base_url
+        config.GOOGLE_API_KEY = config.GOOGLE_API_KEY or "mock"
+        for pooled in (False, True):
+            startup, first = _run(args.sessions, pooled)
+            label = "pooled" if pooled else "per-session"
+            print(
+                f"{label:<12} startup mean={statistics.mean(startup) * 1000:7.2f} ms"
+                f"  first request mean={statistics.mean(first) * 1000:7.2f} ms  (n={args.sessions})"
+            )
+
+
+if __name__ == "__main__":
+    main()
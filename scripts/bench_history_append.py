@@ -0,0 +1,76 @@
+"""bench_history_append.py – persistent history appends per second at a large history size.
+
+Usage:
+    python scripts/bench_history_append.py [--messages 100000] [--appends 2000]
+
+Prefills a history with ``--messages`` messages (about 200 bytes each) and then
+times further appends of one message each. The "rewrite" case is the previous
+implementation: load the whole JSON array, append, and write it back. It is
+only timed for a few appends because each one rewrites the full file. The
+JSONL journal is timed with each fsync policy (HISTORY_FSYNC).
+"""
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import config  # noqa: E402
+from src.shared import history  # noqa: E402
+
+CONTENT = "The quick brown fox jumps over the lazy dog. " * 4
+
+
+def _rewrite_append(path: Path, role: str, content: str) -> None:
+    convo = json.loads(path.read_text()) if path.exists() else []
+    convo.append({"r": role, "c": content})
+    path.write_text(json.dumps(convo, indent=0))
+
+
+def _bench_rewrite(directory: Path, messages: int, appends: int) -> float:
+    path = directory / "chat_history.json"
+    path.write_text(json.dumps([{"r": "user", "c": CONTENT}] * messages, indent=0))
+    start = time.perf_counter()
+    for i in range(appends):
+        _rewrite_append(path, "user", f"{i} {CONTENT}")
+    return appends / (time.perf_counter() - start)
+
+
+def _bench_journal(directory: Path, messages: int, appends: int, policy: str) -> float:
+    config.HISTORY_FSYNC = policy
+    history.HIST_PATH = directory / f"chat_history_{policy}.jsonl"
+    history.extend([("user", CONTENT)] * messages)
+    start = time.perf_counter()
+    for i in range(appends):
+        history.append("user", f"{i} {CONTENT}")
+    rate = appends / (time.perf_counter() - start)
+    history.reset()
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--appends", type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("src").setLevel(logging.ERROR)
+    config.LLM_RATE_LIMITS = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        print(f"history of {args.messages} messages")
+        rewrite = _bench_rewrite(directory, args.messages, max(3, args.appends // 200))
+        print(f"  rewrite whole JSON file : {rewrite:10.1f} appends/s")
+        for policy in ("never", "interval", "always"):
+            rate = _bench_journal(directory, args.messages, args.appends, policy)
+            print(f"  JSONL, fsync={policy:<9}: {rate:10.1f} appends/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""bench_history_pages.py – GUI startup reads of the persisted history at growing sizes.
+
+Usage:
+    python scripts/bench_history_pages.py [--sizes 1000,10000,100000] [--page 50]
+
+For each history size this times three reads: a full ``load()`` (what app.py
+did on every script run), ``load_tail(page)`` (the newest page, read backwards
+from the end) and ``load_range`` for a page in the middle of the history (an
+older page via the offset index). The last two should stay flat as the
+history grows.
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import config  # noqa: E402
+from src.shared import history  # noqa: E402
+
+CONTENT = "The quick brown fox jumps over the lazy dog. " * 4
+
+
+def _ms(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--page", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("src").setLevel(logging.ERROR)
+    config.LLM_RATE_LIMITS = {}
+    config.HISTORY_FSYNC = "never"
+
+    print(f"{'messages':>9}  {'load() ms':>10}  {'load_tail ms':>12}  {'load_range ms':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(",")):
+            history.HIST_PATH = Path(tmp) / f"history_{size}.jsonl"
+            history.extend([("user", f"{i} {CONTENT}") for i in range(size)])
+            middle = size // 2
+            full = _ms(history.load)
+            tail = _ms(lambda: history.load_tail(args.page))
+            page = _ms(lambda: history.load_range(middle, middle + args.page))
+            print(f"{size:>9}  {full:>10.2f}  {tail:>12.3f}  {page:>13.3f}")
+            history.reset()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""bench_history_sessions.py – persisted turns per second with several chat sessions writing at once.
+
+Usage:
+    python scripts/bench_history_sessions.py [--sessions 8] [--turns 300] [--fsync always]
+
+Each session runs in its own process and appends ``--turns`` turns (a user
+message plus a reply, as ChatSession commits them). The "shared" case writes
+every session to one history file, so all writers queue on its file lock. The
+"per-session" case gives each session its own journal (``history.for_session``),
+which is how ChatSession persists. ``--fsync`` sets HISTORY_FSYNC; with
+"always" every append holds the lock for a disk flush, and a shared file
+serialises those flushes.
+"""
+import argparse
+import logging
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import config  # noqa: E402
+from src.shared import history  # noqa: E402
+
+CONTENT = "The quick brown fox jumps over the lazy dog. " * 4
+
+
+def _writer(hist_path: Path, session: str, turns: int, shared: bool, fsync: str, ready) -> None:
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("src").setLevel(logging.ERROR)
+    config.LLM_RATE_LIMITS = {}
+    config.HISTORY_FSYNC = fsync
+    history.HIST_PATH = hist_path
+    store = history.store() if shared else history.for_session(session)
+    ready.wait()
+    for i in range(turns):
+        store.extend([("user", f"{session} {i}"), ("openai", CONTENT)])
+    store.close()
+
+
+def _run(directory: Path, sessions: int, turns: int, shared: bool, fsync: str) -> float:
+    context = multiprocessing.get_context("spawn")
+    hist_path = directory / ("shared" if shared else "split") / "chat_history.jsonl"
+    ready = context.Barrier(sessions + 1)
+    workers = [
+        context.Process(target=_writer, args=(hist_path, f"s{n}", turns, shared, fsync, ready))
+        for n in range(sessions)
+    ]
+    for worker in workers:
+        worker.start()
+    ready.wait()  # Every writer has started; time the appends only
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    if any(worker.exitcode for worker in workers):
+        raise SystemExit("a writer process failed")
+    return sessions * turns / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--fsync", choices=["never", "interval", "always"], default=config.HISTORY_FSYNC)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("src").setLevel(logging.ERROR)
+    config.LLM_RATE_LIMITS = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        print(f"{args.sessions} sessions x {args.turns} turns, fsync={args.fsync}")
+        for shared in (True, False):
+            label = "one shared file" if shared else "per-session files"
+            rate = _run(directory, args.sessions, args.turns, shared, args.fsync)
+            print(f"  {label:<18}: {rate:10.1f} turns/s")
+
+
+if __name__ == "__main__":
+    main()
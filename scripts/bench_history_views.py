@@ -0,0 +1,76 @@
+"""bench_history_views.py – per-turn cost of reading ConversationHistory views as it grows.
+
+Usage:
+    python scripts/bench_history_views.py [--sizes 100,1000,10000] [--turns 200]
+
+Each simulated turn adds a user and an assistant message, then reads the views
+the way the app does: the chat log three times (display, sidebar and command
+parsing) and the provider message list once. The "rebuild" column re-creates
+the lists from ``history.messages`` on every read, as the getters used to do.
+The "views" column uses the incrementally maintained HistoryView snapshots.
+Per-turn cost for views should stay flat as the history grows.
+"""
+import argparse
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import config  # noqa: E402
+from src.core.chat_session import ConversationHistory  # noqa: E402
+
+
+def _rebuilt_chat_log(hist):
+    return [
+        ((m.sender_provider or "assistant") if m.role != "user" else "user", m.content)
+        for m in hist.messages
+        if m.role in ("user", "assistant", "error")
+    ]
+
+
+def _rebuilt_prompt(hist):
+    return [
+        {"role": m.role, "content": m.content}
+        for m in hist.messages
+        if m.role in ("system", "user", "assistant")
+    ]
+
+
+def _per_turn_us(size: int, turns: int, rebuild: bool) -> float:
+    hist = ConversationHistory("You are a helpful AI assistant.")
+    for i in range(size // 2):
+        hist.add_message("user", f"question {i}", "user")
+        hist.add_message("assistant", f"answer {i}", "openai")
+    start = time.perf_counter()
+    for i in range(turns):
+        hist.add_message("user", f"question {i}", "user")
+        hist.add_message("assistant", f"answer {i}", "openai")
+        for _ in range(3):
+            log = _rebuilt_chat_log(hist) if rebuild else hist.get_chat_log()
+            log[-1]
+        prompt = _rebuilt_prompt(hist) if rebuild else hist.get_openai_format()
+        len(prompt)
+    return (time.perf_counter() - start) / turns * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("src").setLevel(logging.ERROR)
+    config.LLM_RATE_LIMITS = {}
+
+    print(f"{'messages':>9}  {'rebuild us/turn':>16}  {'views us/turn':>14}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        rebuilt = _per_turn_us(size, args.turns, rebuild=True)
+        views = _per_turn_us(size, args.turns, rebuild=False)
+        print(f"{size:>9}  {rebuilt:>16.1f}  {views:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
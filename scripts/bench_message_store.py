@@ -0,0 +1,112 @@
+"""bench_message_store.py – a long ChatSession's turn loop: memory held and per-turn latency.
+
+Usage:
+    python scripts/bench_message_store.py [--turns 200] [--reply-kb 60] [--hot 20]
+
+Each turn goes through the code the entry points run: ChatSession.process_user_message
+against the mock OpenAI server (the context window fits the history to the
+model's budget, counting new messages through the token memo), then the
+sidebar's per-provider totals (ChatSession.reply_tokens). Every reply is a
+fresh ``--reply-kb`` KB slice of this repository's sources, like a file read.
+
+Two configurations are compared. "plain" sets HISTORY_HOT_MESSAGES=-1, so
+every body stays a full string. "compact" keeps the last ``--hot`` messages
+plain and compresses older bodies. Memory is what tracemalloc sees released
+when the session is dropped after the last turn (history, context window
+state, client state). Latency is measured in a separate run without tracemalloc. Token
+counts use tiktoken when its encoding data is available, otherwise the
+word-count fallback; the script prints which.
+"""
+import argparse
+import gc
+import logging
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src import config  # noqa: E402
+from src.core.chat_session import ChatSession  # noqa: E402
+from src.llm import clients as llm_clients  # noqa: E402
+from src.llm.mock_backends import MockBehavior, MockOpenAIServer  # noqa: E402
+
+
+def _replies(reply_chars: int):
+    sources = "".join(p.read_text(encoding="utf-8") for p in sorted((ROOT / "src").rglob("*.py")))
+    sources *= reply_chars // len(sources) + 2
+    turn = 0
+
+    def reply(_prompt: str) -> str:
+        nonlocal turn
+        start = (turn * 7_919) % (len(sources) - reply_chars)
+        turn += 1
+        return f"Content of file_{turn}.py:\n" + sources[start:start + reply_chars]
+
+    return reply
+
+
+def _session_loop(turns: int, hot: int, measure_memory: bool):
+    config.HISTORY_HOT_MESSAGES = hot
+    llm_clients._token_count_memo.clear()
+    if measure_memory:
+        tracemalloc.start()
+    cs = ChatSession(persist_history=False)
+    if not cs.openai_available:
+        raise SystemExit("OpenAI mock client unavailable")
+    latencies = []
+    for i in range(turns):
+        start = time.perf_counter()
+        cs.process_user_message(f"Please read file_{i}.py and summarise it.", model_choice="openai")
+        cs.reply_tokens("openai"), cs.reply_tokens("gemini")  # Sidebar totals
+        latencies.append(time.perf_counter() - start)
+    held = 0.0
+    if measure_memory:
+        with_session = tracemalloc.get_traced_memory()[0]
+        del cs
+        gc.collect()
+        held = (with_session - tracemalloc.get_traced_memory()[0]) / 1e6
+        tracemalloc.stop()
+    return held, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--reply-kb", type=int, default=60)
+    parser.add_argument("--hot", type=int, default=config.HISTORY_HOT_MESSAGES)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("src").setLevel(logging.ERROR)
+    config.LLM_RATE_LIMITS = {}
+    config.LLM_HEDGE_ENABLED = False  # One provider per turn
+    config.LLM_CACHE_ENABLED = False  # Every turn reaches the backend
+
+    encoder = "word-count fallback"
+    try:
+        llm_clients._encoding_for_model("gpt-4.1")
+        encoder = "tiktoken"
+    except Exception:
+        llm_clients.TIKTOKEN_AVAILABLE = False
+
+    behavior = MockBehavior(ttft_sec=0.0, tokens_per_sec=0, replies=_replies(args.reply_kb * 1000))
+    with MockOpenAIServer(behavior) as server:
+        config.OPENAI_API_KEY = "mock"
+        config.OPENAI_BASE_URL = server.base_url
+        print(f"{args.turns} turns, {args.reply_kb} KB replies, token counts via {encoder}")
+        for label, hot in (("plain", -1), (f"compact (hot={args.hot})", args.hot)):
+            held, _ = _session_loop(args.turns, hot, measure_memory=True)
+            _, latencies = _session_loop(args.turns, hot, measure_memory=False)
+            tail = latencies[-20:]
+            print(
+                f"  {label:<18}: {held:8.1f} MB held  turn mean={statistics.mean(latencies) * 1000:7.2f} ms"
+                f"  last 20 mean={statistics.mean(tail) * 1000:7.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""bench_mock_backends.py – end-to-end latency/throughput against mock LLM backends.
+
+Usage:
+    python scripts/bench_mock_backends.py [--turns 20] [--concurrency 8]
+        [--ttft 0.2] [--tps 80] [--reply-words 60] [--error-rate 0.0]
+
+Runs real ChatSession turns against src.llm.mock_backends:
+- a local OpenAI-compatible server,
+- a fake Gemini GenerativeModel.
+Results are deterministic enough to compare across commits without network
+access or API keys. Reported scenarios:
+
+* blocking turns (p50/p95 latency),
+* streamed turns (time-to-first-token and total latency),
+* concurrent async turns (throughput in turns/second).
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import config  # noqa: E402
+from src.core.chat_session import ChatSession  # noqa: E402
+from src.llm.clients import OpenAIClientManager  # noqa: E402
+from src.llm.mock_backends import MockBehavior, MockOpenAIServer, use_mock_gemini  # noqa: E402
+
+
+def _pct(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def _report(name, samples, extra=""):
+    print(
+        f"{name:<28} n={len(samples):<4} p50={_pct(samples, 50) * 1000:8.1f} ms"
+        f"  p95={_pct(samples, 95) * 1000:8.1f} ms  mean={statistics.mean(samples) * 1000:8.1f} ms{extra}"
+    )
+
+
+def _session(server, behavior):
+    cs = ChatSession(persist_history=False)
+    cs.openai_manager = OpenAIClientManager(
+        api_key="mock", default_model_name="gpt-4.1", base_url=server.base_url
+    )
+    use_mock_gemini(cs.gemini_manager, behavior)
+    return cs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--tps", type=float, default=80.0)
+    parser.add_argument("--reply-words", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    # Keep the benchmark self-contained: no persistent history, no retry sleeps
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("src").setLevel(logging.ERROR)
+    config.LLM_RETRY_BASE_DELAY = 0.0
+    config.LLM_RATE_LIMITS = {}
+
+    reply = " ".join(f"word{i}" for i in range(args.reply_words))
+    behavior = MockBehavior(
+        ttft_sec=args.ttft, tokens_per_sec=args.tps, error_rate=args.error_rate, replies=[reply], seed=0
+    )
+    print(
+        f"mock backend: ttft={args.ttft}s tps={args.tps} reply={args.reply_words} tokens "
+        f"error_rate={args.error_rate}"
+    )
+
+    with MockOpenAIServer(behavior) as server:
+        for provider in ("openai", "gemini"):
+            cs = _session(server, behavior)
+            blocking = []
+            for i in range(args.turns):
+                start = time.perf_counter()
+                cs.process_user_message(f"question {i}", model_choice=provider)
+                blocking.append(time.perf_counter() - start)
+            _report(f"{provider} blocking", blocking)
+
+            cs = _session(server, behavior)
+            ttfts, totals = [], []
+            for i in range(args.turns):
+                start = time.perf_counter()
+                first = []
+                cs.process_user_message(
+                    f"question {i}",
+                    model_choice=provider,
+                    on_delta=lambda _s, _d: first or first.append(time.perf_counter()),
+                )
+                totals.append(time.perf_counter() - start)
+                ttfts.append((first[0] if first else time.perf_counter()) - start)
+            _report(f"{provider} streamed (ttft)", ttfts)
+            _report(f"{provider} streamed (total)", totals)
+
+            async def _concurrent():
+                sessions = [_session(server, behavior) for _ in range(args.concurrency)]
+
+                async def _worker(session, n):
+                    for i in range(n):
+                        await session.process_user_message_async(f"q{i}", model_choice=provider)
+
+                per_worker = max(1, args.turns // args.concurrency)
+                start = time.perf_counter()
+                await asyncio.gather(*(_worker(s, per_worker) for s in sessions))
+                elapsed = time.perf_counter() - start
+                for session in sessions:
+                    await session.openai_manager.aclose()
+                return per_worker * len(sessions), elapsed
+
+            done, elapsed = asyncio.run(_concurrent())
+            print(f"{provider + ' async x' + str(args.concurrency):<28} {done / elapsed:8.1f} turns/s ({done} turns)")
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""bench_session_startup.py – ChatSession construction time and first-turn latency per entry point.
+
+Usage:
+    python scripts/bench_session_startup.py [--sessions 30]
+
+Each iteration starts one session the way an entry point does and then sends
+one OpenAI turn to the mock server:
+
+* cli: ChatSession(session_id=...), then the availability check for --model openai.
+* gui: the same, plus the sidebar's status of both providers and the first
+  page of saved history.
+* sub-agent: ChatSession(persist_history=False) with a role prompt, as
+  MultiAgentTool spawns it.
+
+The "eager" rows build both provider managers inside the timed construction,
+as ChatSession did before clients were created on first use. The client pool
+is reset before every session, so each one pays the set-up cost of a fresh
+process (OpenAI client, genai.configure, GenerativeModel).
+"""
+import argparse
+import logging
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src import config  # noqa: E402
+from src.core.chat_session import ChatSession  # noqa: E402
+from src.llm import client_pool  # noqa: E402
+from src.llm import clients as llm_clients  # noqa: E402
+from src.llm.mock_backends import MockBehavior, MockOpenAIServer  # noqa: E402
+from src.shared import history  # noqa: E402
+
+
+def _cli(eager: bool) -> ChatSession:
+    cs = ChatSession(session_id=uuid.uuid4().hex)
+    if eager:
+        cs.openai_manager, cs.gemini_manager
+    if not cs.openai_available:
+        raise SystemExit("OpenAI mock client unavailable")
+    return cs
+
+
+def _gui(eager: bool) -> ChatSession:
+    cs = _cli(eager)
+    cs.openai_available and cs.gemini_available  # API status sidebar
+    saved = cs.persistent_history
+    saved.load_tail(config.HISTORY_PAGE_SIZE), saved.count()
+    return cs
+
+
+def _sub_agent(eager: bool) -> ChatSession:
+    cs = ChatSession(persist_history=False)
+    if eager:
+        cs.openai_manager, cs.gemini_manager
+    cs.set_role_prompt("You are a careful reviewer.", None)
+    return cs
+
+
+PATHS = {"cli": _cli, "gui": _gui, "sub-agent": _sub_agent}
+
+
+def _run(start_session, sessions: int, eager: bool):
+    startup, first = [], []
+    for i in range(sessions):
+        client_pool.reset_client_pool()
+        llm_clients._gemini_configured_key = None
+        start = time.perf_counter()
+        cs = start_session(eager)
+        built = time.perf_counter()
+        cs.process_user_message(f"question {i}", model_choice="openai")
+        startup.append(built - start)
+        first.append(time.perf_counter() - built)
+    return startup, first
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=30)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("src").setLevel(logging.ERROR)
+    config.LLM_RATE_LIMITS = {}
+    config.LLM_HEDGE_ENABLED = False  # One provider per turn, as the entry points default to
+
+    with tempfile.TemporaryDirectory() as tmp, MockOpenAIServer(
+        MockBehavior(ttft_sec=0.0, tokens_per_sec=0, replies=["ok"])
+    ) as server:
+        history.HIST_PATH = Path(tmp) / "chat_history.jsonl"
+        config.OPENAI_API_KEY = "mock"
+        config.OPENAI_BASE_URL = server.base_url
+        config.GOOGLE_API_KEY = config.GOOGLE_API_KEY or "mock"
+        for name, start_session in PATHS.items():
+            for eager in (True, False):
+                startup, first = _run(start_session, args.sessions, eager)
+                label = f"{name} ({'eager' if eager else 'lazy'})"
+                print(
+                    f"{label:<18} startup mean={statistics.mean(startup) * 1000:7.2f} ms"
+                    f"  first turn mean={statistics.mean(first) * 1000:7.2f} ms  (n={args.sessions})"
+                )
+
+
+if __name__ == "__main__":
+    main()
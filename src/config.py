@@ -19,6 +19,8 @@ logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
 # API Keys
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# Optional OpenAI-compatible endpoint (None = api.openai.com), e.g. a local mock server
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
 # Default Model Names
 DEFAULT_OPENAI_MODEL = os.getenv("OPENAI_MODEL", "o3")
@@ -35,6 +37,113 @@ AVAILABLE_GEMINI_MODELS = [
     "gemini-2.5-flash-preview-04-17"
 ]
 
+# Gemini token counting on the UI path: "estimate" (offline), "exact" (count_tokens RPC),
+# or "backfill" (estimate immediately, exact counts refreshed in the background).
+GEMINI_TOKEN_COUNT_MODE = os.getenv("GEMINI_TOKEN_COUNT_MODE", "backfill").lower()
+
+# --- LLM Rate Limits (process-wide, per provider+model; 0 = unlimited) ---
+# Every generate_response call waits on these before reaching the provider.
+# Token-per-minute limits depend on the account's usage tier, so they are off
+# unless set (e.g. OPENAI_TPM=30000 for OpenAI's tier-1 gpt-4.1 limit).
+LLM_RATE_LIMITS = {
+    "openai": {
+        "rpm": int(os.getenv("OPENAI_RPM", "500")),
+        "tpm": int(os.getenv("OPENAI_TPM", "0")),
+        "max_concurrency": int(os.getenv("OPENAI_MAX_CONCURRENCY", "8")),
+    },
+    "gemini": {
+        "rpm": int(os.getenv("GEMINI_RPM", "150")),
+        "tpm": int(os.getenv("GEMINI_TPM", "0")),
+        "max_concurrency": int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    },
+}
+
+# --- LLM Retries / Circuit Breaker (see src/llm/resilience.py) ---
+LLM_REQUEST_TIMEOUT_SEC = float(os.getenv("LLM_REQUEST_TIMEOUT_SEC", "120"))
+LLM_RETRY_MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "4"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SEC = float(os.getenv("LLM_CIRCUIT_RESET_SEC", "30"))
+
+# --- Context Window (see src/core/context_window.py) ---
+# Prompt history is trimmed to min(model window - response reserve, budget).
+# Older turns beyond the budget are folded into a rolling summary.
+LLM_CONTEXT_WINDOWS = {
+    "gpt-4.1": 1_047_576,
+    "o3": 200_000,
+    "o4-mini": 200_000,
+    "gemini-2.5": 1_048_576,
+}
+LLM_CONTEXT_DEFAULT_WINDOW = int(os.getenv("LLM_CONTEXT_DEFAULT_WINDOW", "128000"))
+LLM_CONTEXT_BUDGET_TOKENS = int(os.getenv("LLM_CONTEXT_BUDGET_TOKENS", "0"))  # 0 = model window
+LLM_CONTEXT_RESPONSE_RESERVE = int(os.getenv("LLM_CONTEXT_RESPONSE_RESERVE", "4096"))
+LLM_CONTEXT_SUMMARY_TOKENS = int(os.getenv("LLM_CONTEXT_SUMMARY_TOKENS", "1024"))
+# Longest line the extractive summary keeps per folded message; 0 = share the
+# summary budget between the messages folded in one go.
+LLM_CONTEXT_SUMMARY_LINE_CHARS = int(os.getenv("LLM_CONTEXT_SUMMARY_LINE_CHARS", "0"))
+LLM_CONTEXT_MIN_RECENT_MESSAGES = int(os.getenv("LLM_CONTEXT_MIN_RECENT_MESSAGES", "4"))
+# Once over budget, fold down to this fraction of it so the prompt prefix stays
+# stable (and provider prompt caches stay warm) for several turns.
+LLM_CONTEXT_LOW_WATER = float(os.getenv("LLM_CONTEXT_LOW_WATER", "0.75"))
+
+# --- Hedged Requests (opt-in; see src/llm/hedging.py) ---
+# When enabled and both providers are available, a turn that has not answered
+# (or streamed its first token) within the primary's latency percentile is also
+# sent to the other provider; the first answer wins.
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "").lower() in ["true", "1", "yes"]
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY_SEC = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SEC", "10"))
+LLM_HEDGE_MIN_DELAY_SEC = float(os.getenv("LLM_HEDGE_MIN_DELAY_SEC", "0.5"))
+
+# --- Multi-Agent Collaboration (model_choice="collab"; see src/llm/collaboration.py) ---
+LLM_COLLAB_MAX_ROUNDS = int(os.getenv("LLM_COLLAB_MAX_ROUNDS", "3"))
+# Word-level similarity at which agents' answers count as converged (ends rounds early)
+LLM_COLLAB_CONVERGENCE = float(os.getenv("LLM_COLLAB_CONVERGENCE", "0.85"))
+# Streamed collaborations start an agent's revision once every unfinished peer
+# draft has this many characters (0 disables speculative rounds)
+LLM_COLLAB_SPECULATE_CHARS = int(os.getenv("LLM_COLLAB_SPECULATE_CHARS", "400"))
+# ...and keep it if it saw at least this fraction of each peer's final draft
+LLM_COLLAB_SPECULATE_ACCEPT = float(os.getenv("LLM_COLLAB_SPECULATE_ACCEPT", "0.8"))
+
+# --- Conversation Memory (see src/core/message_store.py) ---
+# Messages further back than this many positions are "cold"; -1 disables compression
+HISTORY_HOT_MESSAGES = int(os.getenv("HISTORY_HOT_MESSAGES", "20"))
+# Cold message bodies at least this long are kept zlib-compressed in memory
+HISTORY_COMPRESS_MIN_CHARS = int(os.getenv("HISTORY_COMPRESS_MIN_CHARS", "2048"))
+HISTORY_COMPRESS_LEVEL = int(os.getenv("HISTORY_COMPRESS_LEVEL", "6"))
+
+# --- Persistent Chat History (see src/shared/history.py) ---
+# When appends are fsynced: "always", "interval" (at most every HISTORY_FSYNC_INTERVAL_SEC) or "never"
+HISTORY_FSYNC = os.getenv("HISTORY_FSYNC", "interval").lower()
+HISTORY_FSYNC_INTERVAL_SEC = float(os.getenv("HISTORY_FSYNC_INTERVAL_SEC", "1.0"))
+# Compaction keeps the newest HISTORY_MAX_ENTRIES messages (0 = keep all) and drops
+# corrupt lines; it is considered every HISTORY_COMPACT_EVERY appended messages.
+HISTORY_MAX_ENTRIES = int(os.getenv("HISTORY_MAX_ENTRIES", "0"))
+HISTORY_COMPACT_EVERY = int(os.getenv("HISTORY_COMPACT_EVERY", "10000"))
+# Saved messages the GUI loads at startup and per "Load older messages" click
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+# Session journals kept open at once; the least recently used are closed (two file handles each)
+HISTORY_OPEN_STORES = int(os.getenv("HISTORY_OPEN_STORES", "64"))
+
+# --- Shared SDK Clients (see src/llm/client_pool.py) ---
+# Sessions and sub-agents reuse pooled clients keyed by (provider, model, api key).
+LLM_CLIENT_POOL_ENABLED = os.getenv("LLM_CLIENT_POOL_ENABLED", "true").lower() in ["true", "1", "yes"]
+LLM_CLIENT_POOL_MAX_ENTRIES = int(os.getenv("LLM_CLIENT_POOL_MAX_ENTRIES", "64"))
+
+# --- Batch Generation (see src/llm/batch.py) ---
+# Maximum in-flight requests for concurrent batch mode; the rate limiter does the pacing.
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "16"))
+
+# --- LLM Response Cache (opt-in) ---
+# Content-addressed cache in front of generate_response; see src/llm/response_cache.py
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "").lower() in ["true", "1", "yes"]
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "agent_workspace/llm_cache.sqlite3")
+LLM_CACHE_TTL_SEC = float(os.getenv("LLM_CACHE_TTL_SEC", str(24 * 3600)))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_MAX_DISK_MB = int(os.getenv("LLM_CACHE_MAX_DISK_MB", "50"))
+
 # System Prompt for ChatSession (optional, can still be in ChatSession if preferred)
 # For true centralization, it could live here.
 # DEFAULT_SYSTEM_PROMPT = ("You are a helpful AI assistant. You have access to a local project file system. "
@@ -3,8 +3,11 @@ chat_session.py - Defines the ChatSession class for managing multi-turn conversa
 command parsing, and routing to language models and file operations.
 """
 
-from typing import Optional, List, Dict, Tuple
-from dataclasses import dataclass
+import asyncio
+import threading
+import uuid
+from collections.abc import Sequence
+from typing import Any, Optional, List, Dict, Tuple, Callable, Iterator
 
 from src import config  # Updated import
 import logging
@@ -16,30 +19,103 @@ import logging
 # except ImportError:
 #     import file_manager
 
-from src.handlers.command import CommandHandler, Command  # Updated import
+from src.handlers.command import Command, get_command_handler
+from src.core.context_window import ContextWindow
+from src.core.message_store import Message, compact_cold
+from src.core.turn_journal import TurnJournal
 from src.llm.clients import OpenAIClientManager, GeminiClientManager  # Updated import
-from src.tools.file_system import FileManagerTool  # Updated import
+from src.llm.collaboration import CollabAgent, Collaboration, CollaborationResult, format_event
+from src.llm.fanout import afan_out_call, fan_out_call, fan_out_stream
+from src.llm.hedging import ahedged_call, hedged_call, hedged_stream
+from src.llm.resilience import LLMCallError
+from src.shared import history as persistent_history
 from src.tools.base import ToolInput  # Updated import
-from src.shared import history  # persistent history
 
 logger = logging.getLogger(__name__)  # Added
 
+# Providers that can answer a turn directly, mapped to their display names.
+_PROVIDER_LABELS = {"openai": "OpenAI", "gemini": "Gemini"}
+# Provider that a hedged turn falls back to.
+_HEDGE_PARTNER = {"openai": "gemini", "gemini": "openai"}
+# Model choice that sends the turn to every provider concurrently.
+_BOTH = "both"
+# Model choice where the providers draft and revise one answer together.
+_COLLAB = "collab"
+
 
 # --- Start of new History Management Classes ---
-@dataclass
-class Message:
-    role: str  # "system", "user", or "assistant"
-    content: str
-    # sender_provider helps distinguish who generated an "assistant" message for chat_log display
-    # or to identify the user or system easily.
-    sender_provider: Optional[str] = (
-        None  # e.g., "user", "system", "openai", "gemini", "collab"
-    )
+# Message lives in message_store (slotted, with cold-body compression); re-exported here.
+
+
+class HistoryView(Sequence):
+    """Read-only view of the first ``length`` items of an append-only list.
+
+    Creating one is O(1). Later appends to the list do not show up in an
+    existing view, so a view handed out for one turn stays a stable snapshot.
+    Items are passed through *transform* when read, so the list can hold
+    Message objects (whose cold bodies stay compressed) rather than copies.
+    """
+
+    __slots__ = ("_items", "_length", "_transform")
+
+    def __init__(
+        self,
+        items: List[Any],
+        length: Optional[int] = None,
+        transform: Optional[Callable[[Any], Any]] = None,
+    ):
+        self._items = items
+        self._length = len(items) if length is None else length
+        self._transform = transform
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            items = self._items[slice(*index.indices(self._length))]
+            return [self._transform(item) for item in items] if self._transform else items
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("history view index out of range")
+        item = self._items[index]
+        return self._transform(item) if self._transform else item
+
+    def __iter__(self):
+        items, transform = self._items, self._transform
+        for index in range(self._length):
+            yield transform(items[index]) if transform else items[index]
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (list, tuple, HistoryView)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"HistoryView({list(self)!r})"
 
 
 class ConversationHistory:
+    """The conversation as a list of Message objects, plus derived views.
+
+    The display log and the provider message list are extended as messages are
+    added instead of being rebuilt on every read. The getters hand out
+    :class:`HistoryView` snapshots of them, so reading costs O(1) at any length.
+    Messages must only be added through :meth:`add_message`, which also
+    compresses bodies that have gone cold (see message_store.compact_cold).
+    """
+
     def __init__(self, system_prompt_content: str):
         self.messages: List[Message] = []
+        # Messages shown in the chat log / sent to providers, in order
+        self._chat_log: List[Message] = []
+        self._prompt: List[Message] = []
+        # Bumped on clear_chat so derived caches (e.g. ContextWindow) can tell a new
+        # conversation from an extended one.
+        self.generation = 0
         if system_prompt_content:
             logger.debug(
                 "Initializing ConversationHistory with system prompt."
@@ -52,64 +128,56 @@ class ConversationHistory:
         logger.debug(
             f"Adding message to history: Role={role}, Provider={sender_provider}, Content='{content[:50]}...' "
         )  # Added log
-        self.messages.append(
-            Message(role=role, content=content, sender_provider=sender_provider)
-        )
+        message = Message(role=role, content=content, sender_provider=sender_provider)
+        self.messages.append(message)
+        if role in _PROMPT_ROLES:
+            self._prompt.append(message)
+        if role in ("user", "assistant", "error"):
+            # "error" messages are shown to the user but never sent back to a model.
+            # System messages are not included in the display chat_log.
+            self._chat_log.append(message)
+        compact_cold(self.messages)
 
     def clear_chat(self, system_prompt_content: str):
         logger.info("Clearing chat history.")  # Added log
+        # New lists rather than clearing in place: views already handed out stay valid
         self.messages = []
+        self._chat_log = []
+        self._prompt = []
+        self.generation += 1
         if system_prompt_content:
             self.add_message(
                 role="system", content=system_prompt_content, sender_provider="system"
             )
 
-    def get_chat_log(self) -> List[Tuple[str, str]]:
-        """Formats history for display (compatible with old chat_log format)."""
-        display_log = []
-        for msg in self.messages:
-            if msg.role == "user":
-                display_log.append(("user", msg.content))
-            elif msg.role == "assistant":
-                # msg.sender_provider should be "openai" or "gemini" for assistant messages
-                # or potentially "collab" in the future.
-                # Default to "assistant" if sender_provider is None for some reason, though it shouldn't be.
-                sender = msg.sender_provider if msg.sender_provider else "assistant"
-                display_log.append((sender, msg.content))
-            # System messages are generally not included in the display chat_log
-        return display_log
-
-    def get_openai_format(self) -> List[Dict[str, str]]:
-        """Formats history for OpenAI API (roles: system, user, assistant)."""
-        formatted_messages = []
-        for msg in self.messages:
-            # OpenAI expects roles "system", "user", or "assistant".
-            # Our Message.role should align with this.
-            if msg.role in ["system", "user", "assistant"]:
-                formatted_messages.append({"role": msg.role, "content": msg.content})
-        return formatted_messages
-
-    def get_gemini_format(self) -> List[Dict[str, str]]:
+    def get_chat_log(self) -> HistoryView:
+        """History for display: ``(sender, content)`` pairs (compatible with the old chat_log format)."""
+        return HistoryView(self._chat_log, transform=_display_entry)
+
+    def get_openai_format(self) -> HistoryView:
+        """History for the OpenAI API (roles: system, user, assistant)."""
+        return HistoryView(self._prompt, transform=_prompt_entry)
+
+    def get_gemini_format(self) -> HistoryView:
         """
-        Formats history for Gemini API (which also takes a list of dicts for its chat mode,
-        similar to OpenAI, before the manager formats it further into a string if needed).
+        History for Gemini. GeminiClientManager (via GeminiContents) maps "system" to
+        system_instruction and "user"/"assistant" to Gemini's "user"/"model" roles,
+        so the same OpenAI-style messages are handed over.
         """
-        # Gemini typically uses "user" and "model" roles in its newer chat APIs.
-        # However, our GeminiClientManager._format_history_for_gemini currently expects
-        # "system", "user", "assistant" and converts "system" specially.
-        # So, we provide the same format as for OpenAI for now.
-        # If GeminiClientManager is updated to use glm.Content parts, this might change.
-        gemini_messages = []
-        for msg in self.messages:
-            if msg.role == "system":
-                # Gemini manager handles system prompt by prepending it.
-                # So pass it along.
-                gemini_messages.append({"role": "system", "content": msg.content})
-            elif msg.role == "user":
-                gemini_messages.append({"role": "user", "content": msg.content})
-            elif msg.role == "assistant":
-                gemini_messages.append({"role": "assistant", "content": msg.content})
-        return gemini_messages
+        return HistoryView(self._prompt, transform=_prompt_entry)
+
+
+_PROMPT_ROLES = ("system", "user", "assistant")
+
+
+def _display_entry(message: Message) -> Tuple[str, str]:
+    # sender_provider is "openai", "gemini" or "collab" for assistant messages
+    sender = "user" if message.role == "user" else message.sender_provider or "assistant"
+    return sender, message.content
+
+
+def _prompt_entry(message: Message) -> Dict[str, str]:
+    return {"role": message.role, "content": message.content}
 
 
 # --- End of new History Management Classes ---
@@ -121,28 +189,30 @@ class ChatSession:
     command parsing (/read, /write, /list, /overwrite), and integration with file system and optional A2A collaboration.
     """
 
-    def __init__(self):
-        # Initialize API clients and state
-        # load_dotenv() # Removed, now done in config.py
+    def __init__(self, session_id: Optional[str] = None, persist_history: bool = True):
+        """*session_id* names the saved history to append to (a new one by default).
 
-        # Get API keys and default model names from config module
-        openai_api_key = config.OPENAI_API_KEY
-        google_api_key = config.GOOGLE_API_KEY
-        default_openai_model = config.DEFAULT_OPENAI_MODEL
-        default_gemini_model = config.DEFAULT_GEMINI_MODEL
-
-        # Initialize LLM client managers
-        self.openai_manager = OpenAIClientManager(
-            api_key=openai_api_key, default_model_name=default_openai_model
-        )
-        self.gemini_manager = GeminiClientManager(
-            api_key=google_api_key, default_model_name=default_gemini_model
+        With ``persist_history=False`` (sub-agents) nothing is written to disk.
+        """
+        self.session_id = session_id or uuid.uuid4().hex
+        # This session's own journal, so concurrent sessions never share a file
+        self.persistent_history: Optional[persistent_history.HistoryStore] = (
+            persistent_history.for_session(self.session_id) if persist_history else None
         )
 
-        self.file_tool = FileManagerTool()
-        self.command_handler = CommandHandler(
-            file_tool=self.file_tool
-        )  # Changed and initialized with file_tool
+        # Provider clients are built on first use (see openai_manager / gemini_manager),
+        # so a session that only talks to OpenAI never configures Gemini and vice versa.
+        # Keys and default models are read now, as if the managers were built here.
+        self._provider_settings = {
+            "openai": (config.OPENAI_API_KEY, config.DEFAULT_OPENAI_MODEL),
+            "gemini": (config.GOOGLE_API_KEY, config.DEFAULT_GEMINI_MODEL),
+        }
+        self._managers: Dict[str, Any] = {}
+        self._managers_lock = threading.Lock()
+
+        # Stateless, so every session shares one instance (see get_command_handler)
+        self.command_handler = get_command_handler()
+        self.file_tool = self.command_handler.file_tool
 
         # Initialize ConversationHistory
         # System prompt could also come from config.py if desired: config.DEFAULT_SYSTEM_PROMPT
@@ -151,12 +221,59 @@ class ChatSession:
             "You can read files, write files (with user confirmation), and list directories when asked."
         )
         self.history = ConversationHistory(system_prompt_content=self.system_prompt)
+        # Keeps each request within the model's token budget
+        self.context_window = ContextWindow()
 
         # Pending write operation data (for overwrite confirmation)
         self.pending_write_user_path: Optional[str] = None
         self.pending_write_content: Optional[str] = None
         # Track last model used for context synchronization
         self.last_model = None
+        # Send slow turns to the other provider as well (see src/llm/hedging.py)
+        self.hedge_requests = config.LLM_HEDGE_ENABLED
+        # Rounds and transcript of the most recent "collab" turn
+        self.last_collaboration: Optional[CollaborationResult] = None
+
+    def _manager(self, provider: str) -> Any:
+        """The client manager for *provider*, built on first use."""
+        manager = self._managers.get(provider)
+        if manager is None:
+            with self._managers_lock:
+                manager = self._managers.get(provider)
+                if manager is None:
+                    api_key, model_name = self._provider_settings[provider]
+                    manager_cls = OpenAIClientManager if provider == "openai" else GeminiClientManager
+                    manager = manager_cls(api_key=api_key, default_model_name=model_name)
+                    self._managers[provider] = manager
+                    logger.debug(f"Initialized {provider} client manager on first use")
+        return manager
+
+    def _set_model(self, provider: str, model_name: str) -> Optional[bool]:
+        """Switch *provider*'s model; before first use this only changes the default."""
+        if not model_name:
+            return False
+        manager = self._managers.get(provider)
+        if manager is None:
+            api_key, _ = self._provider_settings[provider]
+            self._provider_settings[provider] = (api_key, model_name)
+            return True
+        return manager.set_model_name(model_name)
+
+    @property
+    def openai_manager(self) -> OpenAIClientManager:
+        return self._manager("openai")
+
+    @openai_manager.setter
+    def openai_manager(self, manager: Any) -> None:
+        self._managers["openai"] = manager
+
+    @property
+    def gemini_manager(self) -> GeminiClientManager:
+        return self._manager("gemini")
+
+    @gemini_manager.setter
+    def gemini_manager(self, manager: Any) -> None:
+        self._managers["gemini"] = manager
 
     @property
     def openai_available(self) -> bool:
@@ -168,38 +285,220 @@ class ChatSession:
 
     @property
     def openai_model(self) -> str:
-        return self.openai_manager.get_model_name()
+        manager = self._managers.get("openai")
+        return manager.get_model_name() if manager else self._provider_settings["openai"][1]
 
     @openai_model.setter
     def openai_model(self, model_name: str):
-        self.openai_manager.set_model_name(model_name)
+        self._set_model("openai", model_name)
 
     @property
     def gemini_model(self) -> str:
-        return self.gemini_manager.get_model_name()
+        manager = self._managers.get("gemini")
+        return manager.get_model_name() if manager else self._provider_settings["gemini"][1]
 
     @gemini_model.setter
     def gemini_model(self, model_name: str):
-        self.gemini_manager.set_model_name(model_name)
+        self._set_model("gemini", model_name)
 
     @property
-    def chat_log(self) -> List[Tuple[str, str]]:
+    def chat_log(self) -> HistoryView:
         return self.history.get_chat_log()
 
+    def reply_tokens(self, provider: str) -> int:
+        """Tokens in *provider*'s replies so far, from the context window's per-message counts."""
+        manager = self._provider_manager(provider)
+        counts = self.context_window.message_counts(
+            self.history, provider, manager if manager.available else None
+        )
+        return sum(
+            tokens
+            for msg, tokens in zip(self.history.messages, counts)
+            if msg.role == "assistant" and msg.sender_provider == provider
+        )
+
+    def set_role_prompt(self, role_prompt: str, tool_context: Optional[str] = None) -> None:
+        """Start a fresh conversation for a role-specialised agent.
+
+        The prompt prefix is laid out from most to least shared:
+        base system prompt, then role prompt, then tool context. Sub-agents
+        with the same role then share a byte-identical prefix, which providers
+        can serve from their prompt cache.
+        """
+        self.history.clear_chat(self.system_prompt)
+        for content in (role_prompt, tool_context):
+            if content:
+                self.history.add_message(
+                    role="system", content=content, sender_provider="system"
+                )
+
     def process_user_message(
         self,
         user_input: str,
         model_choice: str = "openai",
         specific_model_name: Optional[str] = None,
         use_a2a: bool = False,
+        on_delta: Optional[Callable[[str, str], None]] = None,
     ):
         """
         Process a user input message, handle commands or get response from model(s).
-        model_choice: "openai" or "gemini" (acts as provider based on GUI selection).
+        model_choice: "openai" or "gemini" (acts as provider based on GUI selection), or
+            "both" to ask every available provider concurrently; each answer is
+            returned and recorded under its own sender. "collab" runs a multi-round
+            collaboration (src/llm/collaboration.py) and returns one answer from "collab".
         specific_model_name: The exact model name selected in the GUI (e.g., "gpt-4.1", "gemini-2.5-pro-preview-05-06")
         use_a2a: Currently unused due to single model selection GUI.
+        on_delta: Optional callback ``(sender, text_delta)``. When given, model answers are
+            streamed and the callback is invoked for every delta as it arrives. A "collab"
+            turn streams its round-by-round transcript and timings as "collab" deltas.
+        When ``hedge_requests`` is set and the other provider is available, a slow turn is
+        also sent there and the first answer wins; the reply's sender names the winner.
         Returns a list of (sender, content) tuples representing the assistant responses generated.
         """
+        turn, parsed_command = self._begin_turn(
+            user_input, model_choice, specific_model_name
+        )
+
+        # Check and handle file system commands using the new CommandHandler
+        if parsed_command:
+            command_response_text = self.command_handler.execute_command(
+                parsed_command, self, turn.user_input
+            )
+            self._collect_command_output(command_response_text, model_choice, turn)
+
+        # If no command was parsed, get model response
+        if not parsed_command and model_choice in _PROVIDER_LABELS:
+            manager, messages = self._provider_request(model_choice)
+            if not manager.available:
+                return self._unavailable_reply(model_choice, turn, parsed_command)
+
+            logger.debug(
+                f"Sending request to {_PROVIDER_LABELS[model_choice]} model: {manager.get_model_name()}"
+            )
+            sender = model_choice
+            try:
+                if self._can_hedge(model_choice):
+                    sender, answer = self._hedged_answer(model_choice, messages, on_delta)
+                elif on_delta:
+                    answer = self._consume_stream(
+                        manager.stream_response(messages), model_choice, on_delta
+                    )
+                else:
+                    answer = manager.generate_response(messages)
+            except LLMCallError as e:
+                return self._error_reply(model_choice, e, turn, parsed_command)
+            self._collect_answer(sender, answer, turn)
+
+        if not parsed_command and model_choice == _BOTH:
+            requests = self._fan_out_requests()
+            if on_delta:
+                results = fan_out_stream(
+                    [(p, lambda m=m, msgs=msgs: m.stream_response(msgs)) for p, (m, msgs) in requests.items()],
+                    lambda sender, delta: self._forward_delta(on_delta, sender, delta),
+                )
+            else:
+                results = fan_out_call(
+                    [(p, lambda m=m, msgs=msgs: m.generate_response(msgs)) for p, (m, msgs) in requests.items()]
+                )
+            return self._finish_fan_out(results, turn, parsed_command)
+
+        if not parsed_command and model_choice == _COLLAB:
+            collaboration, messages = self._collaboration_request()
+            if collaboration is None:
+                return self._unavailable_reply(_COLLAB, turn, parsed_command)
+            try:
+                if on_delta:
+                    # The live transcript streams as "collab"; the final answer follows it
+                    result = collaboration.stream(
+                        messages,
+                        lambda event: self._forward_delta(on_delta, _COLLAB, format_event(event)),
+                    )
+                else:
+                    result = collaboration.run(messages)
+            except LLMCallError as e:
+                return self._error_reply(_COLLAB, e, turn, parsed_command)
+            self._collect_collaboration(result, turn)
+
+        return self._finish_turn(turn, parsed_command)
+
+    async def process_user_message_async(
+        self,
+        user_input: str,
+        model_choice: str = "openai",
+        specific_model_name: Optional[str] = None,
+    ):
+        """
+        Asyncio counterpart of :meth:`process_user_message`.
+
+        Model calls go through the managers' ``agenerate_response`` so the event loop is
+        free while a provider is thinking. Commands are executed by tools that do
+        blocking I/O, so they are offloaded to a worker thread.
+        Returns a list of (sender, content) tuples representing the assistant responses generated.
+        """
+        turn, parsed_command = self._begin_turn(
+            user_input, model_choice, specific_model_name
+        )
+
+        if parsed_command:
+            command_response_text = await asyncio.to_thread(
+                self.command_handler.execute_command,
+                parsed_command,
+                self,
+                turn.user_input,
+            )
+            self._collect_command_output(command_response_text, model_choice, turn)
+
+        if not parsed_command and model_choice in _PROVIDER_LABELS:
+            manager, messages = self._provider_request(model_choice)
+            if not manager.available:
+                return self._unavailable_reply(model_choice, turn, parsed_command)
+
+            logger.debug(
+                f"Sending async request to {_PROVIDER_LABELS[model_choice]} model: {manager.get_model_name()}"
+            )
+            sender = model_choice
+            try:
+                if self._can_hedge(model_choice):
+                    partner = _HEDGE_PARTNER[model_choice]
+                    partner_manager, partner_messages = self._provider_request(partner)
+                    sender, answer = await ahedged_call(
+                        (model_choice, lambda: manager.agenerate_response(messages)),
+                        (partner, lambda: partner_manager.agenerate_response(partner_messages)),
+                    )
+                else:
+                    answer = await manager.agenerate_response(messages)
+            except LLMCallError as e:
+                return self._error_reply(model_choice, e, turn, parsed_command)
+            self._collect_answer(sender, answer, turn)
+
+        if not parsed_command and model_choice == _BOTH:
+            requests = self._fan_out_requests()
+            results = await afan_out_call(
+                [(p, lambda m=m, msgs=msgs: m.agenerate_response(msgs)) for p, (m, msgs) in requests.items()]
+            )
+            return self._finish_fan_out(results, turn, parsed_command)
+
+        if not parsed_command and model_choice == _COLLAB:
+            collaboration, messages = self._collaboration_request()
+            if collaboration is None:
+                return self._unavailable_reply(_COLLAB, turn, parsed_command)
+            try:
+                result = await collaboration.arun(messages)
+            except LLMCallError as e:
+                return self._error_reply(_COLLAB, e, turn, parsed_command)
+            self._collect_collaboration(result, turn)
+
+        return self._finish_turn(turn, parsed_command)
+
+    # --- Turn helpers shared by the sync and async paths ---
+
+    def _begin_turn(
+        self,
+        user_input: str,
+        model_choice: str,
+        specific_model_name: Optional[str],
+    ) -> Tuple[TurnJournal, Optional[Command]]:
+        """Open the turn's journal (recording the user message) and parse it for commands."""
         processed_user_input = (
             user_input.strip()
         )  # Renamed to avoid conflict with original user_input
@@ -207,10 +506,10 @@ class ChatSession:
         # Update the relevant model in the session if a specific one is passed
         if specific_model_name:
             if model_choice == "openai":
-                self.openai_manager.set_model_name(specific_model_name)
+                self._set_model("openai", specific_model_name)
                 logger.info(f"OpenAI model changed to: {specific_model_name}")
             elif model_choice == "gemini":
-                success = self.gemini_manager.set_model_name(specific_model_name)
+                success = self._set_model("gemini", specific_model_name)
                 if success:
                     logger.info(f"Gemini model changed to: {specific_model_name}")
                 else:
@@ -223,88 +522,164 @@ class ChatSession:
             f"Processing user message. Model choice: {model_choice}, Last model: {self.last_model}, User input: '{processed_user_input[:50]}...' "
         )  # Added log
 
-        self.history.add_message(
-            role="user", content=processed_user_input, sender_provider="user"
-        )
-        history.append("user", processed_user_input) # Append user message to persistent history
-
-        # Check and handle file system commands using the new CommandHandler
-        output_messages = []
+        turn = TurnJournal(self.history, processed_user_input, store=self.persistent_history)
 
         parsed_command: Optional[Command] = self.command_handler.parse(
             processed_user_input, self.history.get_chat_log()
         )
-
         if parsed_command:
             logger.info(
                 f"Parsed command: {parsed_command.command_type} with args: {parsed_command.args}"
             )  # Added log
-            command_response_text = self.command_handler.execute_command(
-                parsed_command, self, processed_user_input
-            )
-
-            if command_response_text:
-                logger.info(
-                    f"Command response generated: '{command_response_text[:100]}...' "
-                )  # Added log
-                # Command output is treated as an assistant message
-                output_messages.append((model_choice, command_response_text))
-
-        # If no command was parsed, get model response
-        if not parsed_command:
-            if model_choice == "openai":
-                if not self.openai_manager.available:
-                    error_msg = "⚠️ OpenAI model is not available."
-                    logger.warning("OpenAI model unavailable for user message processing.")
-                    self.history.add_message(
-                        role="assistant", content=error_msg, sender_provider="openai"
-                    )
-                    output_messages.append(("openai", error_msg))
-                    return output_messages
-
-                logger.debug(
-                    f"Sending request to OpenAI model: {self.openai_manager.get_model_name()}"
-                )
-                answer = self.openai_manager.generate_response(
-                    self.history.get_openai_format()
-                )
-                logger.debug(f"Received answer from OpenAI: '{answer[:100]}...' ")
-                self.history.add_message(
-                    role="assistant", content=answer, sender_provider="openai"
-                )
-                output_messages.append(("openai", answer))
-
-            elif model_choice == "gemini":
-                if not self.gemini_manager.available:
-                    error_msg = "⚠️ Gemini model is not available."
-                    logger.warning("Gemini model unavailable for user message processing.")
-                    self.history.add_message(
-                        role="assistant", content=error_msg, sender_provider="gemini"
-                    )
-                    output_messages.append(("gemini", error_msg))
-                    return output_messages
-
-                logger.debug(
-                    f"Sending request to Gemini model: {self.gemini_manager.get_model_name()}"
-                )
-                answer = self.gemini_manager.generate_response(
-                    self.history.get_gemini_format()
-                )
-                logger.debug(f"Received answer from Gemini: '{answer[:100]}...' ")
-                self.history.add_message(
-                    role="assistant", content=answer, sender_provider="gemini"
-                )
-                output_messages.append(("gemini", answer))
+        return turn, parsed_command
+
+    @staticmethod
+    def _collect_command_output(
+        command_response_text: Optional[str],
+        model_choice: str,
+        turn: TurnJournal,
+    ) -> None:
+        if command_response_text:
+            logger.info(
+                f"Command response generated: '{command_response_text[:100]}...' "
+            )  # Added log
+            # Command output is treated as an assistant message
+            turn.reply(model_choice, command_response_text)
+
+    def _provider_manager(self, model_choice: str):
+        if model_choice == "gemini":
+            return self.gemini_manager
+        return self.openai_manager
+
+    def _provider_request(self, model_choice: str):
+        """Return the manager for *model_choice* and the history fitted to its budget."""
+        manager = self._provider_manager(model_choice)
+        return manager, self.context_window.fit(self.history, model_choice, manager)
+
+    def _can_hedge(self, model_choice: str) -> bool:
+        partner = _HEDGE_PARTNER.get(model_choice)
+        return bool(
+            self.hedge_requests
+            and partner
+            and self._provider_manager(partner).available
+        )
 
-        # Add model responses to conversation history and collect for display
-        for sender, content in output_messages:
-            # Determine the role based on sender for history storage (typically 'assistant' for LLMs)
-            role = "assistant"
-            # Use sender_provider to store the actual source ('openai', 'gemini', 'collab')
-            sender_provider = sender # Use sender directly as it indicates openai/gemini/collab
+    def _hedged_answer(
+        self,
+        model_choice: str,
+        messages: List[Dict[str, str]],
+        on_delta: Optional[Callable[[str, str], None]],
+    ) -> Tuple[str, str]:
+        """Ask *model_choice*, hedging with its partner provider; return ``(sender, answer)``."""
+        manager = self._provider_manager(model_choice)
+        partner = _HEDGE_PARTNER[model_choice]
+        partner_manager, partner_messages = self._provider_request(partner)
+        if not on_delta:
+            return hedged_call(
+                (model_choice, lambda: manager.generate_response(messages)),
+                (partner, lambda: partner_manager.generate_response(partner_messages)),
+            )
+        sender, parts = model_choice, []
+        for sender, delta in hedged_stream(
+            (model_choice, lambda: manager.stream_response(messages)),
+            (partner, lambda: partner_manager.stream_response(partner_messages)),
+        ):
+            parts.append(delta)
+            self._forward_delta(on_delta, sender, delta)
+        return sender, "".join(parts)
+
+    def _fan_out_requests(self) -> Dict[str, Tuple[Any, List[Dict[str, str]]]]:
+        """Managers and fitted histories of every available provider, for a "both" turn.
+
+        Every request is built before any is sent, so each provider answers the
+        same conversation and neither sees the other's reply.
+        """
+        requests = {}
+        for provider in _PROVIDER_LABELS:
+            manager, messages = self._provider_request(provider)
+            if manager.available:
+                requests[provider] = (manager, messages)
+        return requests
+
+    def _collaboration_request(self) -> Tuple[Optional[Collaboration], List[Dict[str, str]]]:
+        """A Collaboration over every available provider (each on its configured model)."""
+        agents = [
+            CollabAgent(provider, self._provider_manager(provider))
+            for provider in _PROVIDER_LABELS
+            if self._provider_manager(provider).available
+        ]
+        if not agents:
+            return None, []
+        # The lead agent's budget shapes the shared conversation
+        messages = self.context_window.fit(self.history, agents[0].name, agents[0].manager)
+        return Collaboration(agents), messages
+
+    def _collect_collaboration(self, result: CollaborationResult, turn: TurnJournal) -> None:
+        self.last_collaboration = result
+        self._collect_answer(_COLLAB, result.answer, turn)
+
+    def _finish_fan_out(
+        self,
+        results: Dict[str, Any],
+        turn: TurnJournal,
+        parsed_command: Optional[Command],
+    ) -> List[Tuple[str, str]]:
+        """Record each provider's answer (or failure), in provider order."""
+        for provider in _PROVIDER_LABELS:
+            if provider not in results:
+                self._note_unavailable(provider, turn)
+                continue
+            result = results[provider]
+            if isinstance(result, LLMCallError):
+                self._note_error(provider, result, turn)
+            elif isinstance(result, Exception):
+                raise result
+            else:
+                self._collect_answer(provider, result, turn)
+        return self._finish_turn(turn, parsed_command)
+
+    def _unavailable_reply(
+        self, model_choice: str, turn: TurnJournal, parsed_command: Optional[Command]
+    ) -> List[Tuple[str, str]]:
+        self._note_unavailable(model_choice, turn)
+        return self._finish_turn(turn, parsed_command)
+
+    def _error_reply(
+        self,
+        model_choice: str,
+        error: LLMCallError,
+        turn: TurnJournal,
+        parsed_command: Optional[Command],
+    ) -> List[Tuple[str, str]]:
+        """Report a failed provider call without recording it as the model's answer."""
+        self._note_error(model_choice, error, turn)
+        return self._finish_turn(turn, parsed_command)
+
+    @staticmethod
+    def _note_unavailable(model_choice: str, turn: TurnJournal) -> None:
+        label = _PROVIDER_LABELS.get(model_choice, "Collaboration")
+        logger.warning(f"{label} model unavailable for user message processing.")
+        turn.error(model_choice, f"⚠️ {label} model is not available.")
+
+    @staticmethod
+    def _note_error(model_choice: str, error: LLMCallError, turn: TurnJournal) -> None:
+        logger.warning(f"{_PROVIDER_LABELS.get(model_choice, model_choice)} request failed: {error}")
+        turn.error(model_choice, f"⚠️ {error}")
+
+    @staticmethod
+    def _collect_answer(sender: str, answer: str, turn: TurnJournal) -> None:
+        logger.debug(
+            f"Received answer from {_PROVIDER_LABELS.get(sender, sender)}: '{answer[:100]}...' "
+        )
+        turn.reply(sender, answer)
 
-            self.history.add_message(role=role, content=content, sender_provider=sender_provider)
-            history.append(sender_provider, content) # Append agent message to persistent history
+    def _finish_turn(
+        self,
+        turn: TurnJournal,
+        parsed_command: Optional[Command],
+    ) -> List[Tuple[str, str]]:
+        # Every reply is written to the in-memory and persistent history exactly once here
+        replies = turn.commit()
 
         # Check if the last message was a file write command response that requires confirmation
         if parsed_command and parsed_command.command_type == "write" and not parsed_command.args.get("overwrite", False):
@@ -312,7 +687,30 @@ class ChatSession:
             self.pending_write_user_path = parsed_command.args.get("path")
             self.pending_write_content = parsed_command.args.get("content")
 
-        return output_messages
+        return replies
+
+    @staticmethod
+    def _consume_stream(
+        stream: Iterator[str], sender: str, on_delta: Callable[[str, str], None]
+    ) -> str:
+        """Drain a manager's delta stream, forwarding each delta to *on_delta*.
+
+        Returns the full answer text once the stream is exhausted.
+        """
+        parts: List[str] = []
+        for delta in stream:
+            parts.append(delta)
+            ChatSession._forward_delta(on_delta, sender, delta)
+        return "".join(parts)
+
+    @staticmethod
+    def _forward_delta(
+        on_delta: Callable[[str, str], None], sender: str, delta: str
+    ) -> None:
+        try:
+            on_delta(sender, delta)
+        except Exception as e:  # A broken display must not abort the turn
+            logger.warning(f"Streaming callback failed for {sender}: {e}")
 
     def confirm_overwrite(self):
         """
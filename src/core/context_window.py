@@ -0,0 +1,266 @@
+"""
+context_window.py - Fits a ConversationHistory into a per-model token budget.
+
+The leading system messages (system prompt, then any role prompt and tool
+context) are always kept. The most recent turns are kept verbatim. Older turns
+that no longer fit are folded into a rolling summary, which is sent right after
+the pinned messages. Token counts are cached per message and per provider, so
+each call only counts messages added since the previous call.
+
+The layout is kept stable for provider prompt caching: the pinned prefix never
+changes within a conversation, and turns are only ever appended. When folding
+is needed, it goes down to a low-water mark below the budget. That way the
+summary, and everything after it, stays byte-identical for many turns instead
+of changing on every request.
+"""
+
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+# Roles that are sent to providers; "error" entries are display-only.
+_PROMPT_ROLES = ("system", "user", "assistant")
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+# Shortest per-message line the extractive summary clips to.
+_MIN_LINE_CHARS = 200
+
+# summarizer(previous_summary, folded_messages, max_tokens) -> new summary
+Summarizer = Callable[[str, Sequence[Any], int], str]
+
+
+def extractive_summarizer(previous: str, folded: Sequence[Any], max_tokens: int) -> str:
+    """Cheap default summarizer: one clipped line per folded message, newest kept.
+
+    Lines are clipped to LLM_CONTEXT_SUMMARY_LINE_CHARS, or by default to an
+    equal share of the ~4 chars/token summary budget per folded message.
+    """
+    max_chars = max_tokens * 4
+    share = max_chars // max(1, len(folded))
+    lines = [line for line in previous.splitlines() if line]
+    for msg in folded:
+        speaker = msg.sender_provider if msg.role == "assistant" else msg.role
+        prefix = f"- {speaker}: "
+        clip = config.LLM_CONTEXT_SUMMARY_LINE_CHARS or max(
+            _MIN_LINE_CHARS, share - len(prefix) - 1
+        )
+        text = re.sub(r"\s+", " ", msg.content).strip()
+        if len(text) > clip:
+            text = text[: clip - 3] + "..."
+        lines.append(prefix + text)
+    kept: List[str] = []
+    size = 0
+    for line in reversed(lines):
+        if size + len(line) + 1 > max_chars:
+            break
+        kept.append(line)
+        size += len(line) + 1
+    return "\n".join(reversed(kept))
+
+
+def make_llm_summarizer(manager: Any) -> Summarizer:
+    """Summarize folded turns with *manager* (a client manager); falls back to extractive."""
+
+    def summarize(previous: str, folded: Sequence[Any], max_tokens: int) -> str:
+        transcript = "\n".join(f"{m.role}: {m.content}" for m in folded)
+        prompt = [
+            {
+                "role": "system",
+                "content": (
+                    "Condense the conversation below into a factual summary of at most "
+                    f"{max_tokens} tokens. Keep names, file paths, decisions and open questions."
+                ),
+            },
+            {"role": "user", "content": f"{previous}\n\n{transcript}".strip()},
+        ]
+        try:
+            return manager.generate_response(prompt)
+        except Exception as e:
+            logger.warning(f"LLM summarization failed, using extractive summary: {e}")
+            return extractive_summarizer(previous, folded, max_tokens)
+
+    return summarize
+
+
+def budget_for_model(model_name: str) -> int:
+    """Prompt token budget for *model_name* (longest matching prefix in config)."""
+    window = config.LLM_CONTEXT_DEFAULT_WINDOW
+    best = ""
+    for prefix, size in config.LLM_CONTEXT_WINDOWS.items():
+        if model_name.startswith(prefix) and len(prefix) > len(best):
+            best, window = prefix, size
+    budget = window - config.LLM_CONTEXT_RESPONSE_RESERVE
+    if config.LLM_CONTEXT_BUDGET_TOKENS > 0:
+        budget = min(budget, config.LLM_CONTEXT_BUDGET_TOKENS)
+    return budget
+
+
+def _estimate_many(texts: List[str]) -> List[int]:
+    return [len(t) // 4 + 1 if t else 0 for t in texts]
+
+
+@dataclass
+class _WindowState:
+    """Per-provider bookkeeping for one history generation and model."""
+
+    generation: int
+    model: str = ""  # Counts are only valid for the tokenizer they came from
+    counts: List[int] = field(default_factory=list)  # Tokens per history message
+    pinned: int = 0  # Number of leading system messages that are always sent
+    start: int = 0  # First message index not yet folded into the summary
+    live_tokens: int = 0  # Tokens of prompt messages in [start:]
+    summary: str = ""
+    summary_tokens: int = 0
+    # Formatted output, extended in place until the next fold
+    formatted: List[Dict[str, str]] = field(default_factory=list)
+    formatted_start: int = -1  # ``start`` the formatted prefix was built for
+    formatted_upto: int = 0  # History messages already formatted
+
+
+def _model_name(manager: Any) -> str:
+    return (manager.get_model_name() if manager is not None else "") or ""
+
+
+class ContextWindow:
+    """Trims history to a token budget with a pinned system prompt and rolling summary."""
+
+    def __init__(
+        self,
+        summarizer: Optional[Summarizer] = None,
+        min_recent_messages: Optional[int] = None,
+        summary_tokens: Optional[int] = None,
+    ):
+        self.summarizer = summarizer or extractive_summarizer
+        self.min_recent_messages = (
+            config.LLM_CONTEXT_MIN_RECENT_MESSAGES
+            if min_recent_messages is None
+            else min_recent_messages
+        )
+        self.summary_tokens = (
+            config.LLM_CONTEXT_SUMMARY_TOKENS if summary_tokens is None else summary_tokens
+        )
+        self._states: Dict[str, _WindowState] = {}
+
+    def fit(
+        self,
+        history: Any,
+        provider: str,
+        manager: Any = None,
+        budget: Optional[int] = None,
+    ) -> List[Dict[str, str]]:
+        """Return *history* as ``[{"role", "content"}, ...]`` within the token budget.
+
+        *manager* supplies ``count_tokens_many`` and the model name; without it
+        counts are estimated at ~4 characters per token.
+        """
+        count_many = getattr(manager, "count_tokens_many", None) or _estimate_many
+        model = _model_name(manager)
+        if budget is None:
+            budget = budget_for_model(model)
+        messages = history.messages
+        state = self._state_for(provider, history, model)
+        self._count_new(state, messages, count_many)
+
+        pinned_tokens = sum(state.counts[: state.pinned])
+
+        if pinned_tokens + state.summary_tokens + state.live_tokens > budget:
+            target = int(budget * config.LLM_CONTEXT_LOW_WATER)
+            while (
+                pinned_tokens + state.summary_tokens + state.live_tokens > target
+                and len(messages) - state.start > self.min_recent_messages
+            ):
+                # The summary may use at most a quarter of the budget
+                summary_cap = min(self.summary_tokens, budget // 4)
+                self._fold_oldest_turn(state, messages, count_many, summary_cap)
+
+        if pinned_tokens + state.summary_tokens + state.live_tokens > budget:
+            logger.warning(
+                f"{provider} prompt still exceeds budget ({budget} tokens) after summarizing; "
+                f"keeping the last {len(messages) - state.start} messages"
+            )
+
+        if state.formatted_start != state.start:
+            state.formatted = [
+                {"role": "system", "content": msg.content} for msg in messages[: state.pinned]
+            ]
+            if state.summary:
+                state.formatted.append(
+                    {"role": "system", "content": SUMMARY_PREFIX + state.summary}
+                )
+            state.formatted_start = state.start
+            state.formatted_upto = state.start
+        for msg in messages[state.formatted_upto:]:
+            if msg.role in _PROMPT_ROLES:
+                state.formatted.append({"role": msg.role, "content": msg.content})
+        state.formatted_upto = len(messages)
+        # Same dict objects across turns, so consumers can detect appended messages
+        return list(state.formatted)
+
+    def message_counts(self, history: Any, provider: str, manager: Any = None) -> List[int]:
+        """Token count of every message in *history* with *provider*'s tokenizer.
+
+        Shares the per-message cache with :meth:`fit`, so only messages added
+        since the last call are counted (and cold, compressed ones are not read).
+        """
+        count_many = getattr(manager, "count_tokens_many", None) or _estimate_many
+        state = self._state_for(provider, history, _model_name(manager))
+        self._count_new(state, history.messages, count_many)
+        return list(state.counts)
+
+    def reset(self) -> None:
+        self._states.clear()
+
+    # --- internals ---
+
+    def _state_for(self, provider: str, history: Any, model: str) -> _WindowState:
+        generation = getattr(history, "generation", 0)
+        state = self._states.get(provider)
+        messages = history.messages
+        if (
+            state is None
+            or state.generation != generation
+            or state.model != model  # Switched model: recount with its tokenizer
+            or len(state.counts) > len(messages)
+        ):
+            # The leading system messages are pinned; everything after may be summarized
+            pinned = 0
+            while pinned < len(messages) and messages[pinned].role == "system":
+                pinned += 1
+            state = _WindowState(generation=generation, model=model, pinned=pinned, start=pinned)
+            if messages:
+                self._states[provider] = state
+        return state
+
+    @staticmethod
+    def _count_new(state: _WindowState, messages: Sequence[Any], count_many) -> None:
+        new = messages[len(state.counts):]
+        if not new:
+            return
+        counts = count_many([m.content for m in new])
+        for index, (msg, tokens) in enumerate(zip(new, counts), start=len(state.counts)):
+            state.counts.append(tokens)
+            if index >= state.start and msg.role in _PROMPT_ROLES:
+                state.live_tokens += tokens
+
+    def _fold_oldest_turn(
+        self, state: _WindowState, messages: Sequence[Any], count_many, summary_cap: int
+    ) -> None:
+        """Move the oldest unsummarized turn (up to the next user message) into the summary."""
+        end = state.start + 1
+        limit = len(messages) - self.min_recent_messages
+        while end < limit and messages[end].role != "user":
+            end += 1
+        folded = [m for m in messages[state.start:end] if m.role in _PROMPT_ROLES]
+        for index in range(state.start, end):
+            if messages[index].role in _PROMPT_ROLES:
+                state.live_tokens -= state.counts[index]
+        state.start = end
+        if folded:
+            state.summary = self.summarizer(state.summary, folded, summary_cap)
+            state.summary_tokens = count_many([SUMMARY_PREFIX + state.summary])[0]
@@ -0,0 +1,102 @@
+"""
+message_store.py - Compact in-memory representation of conversation messages.
+
+Long sessions accumulate many messages, and file reads of up to 100 KB each are
+stored as assistant messages. Message therefore uses ``__slots__`` instead of a
+per-instance ``__dict__``, and interns its role and provider strings so every
+message shares one copy of them.
+
+Once a message is older than ``config.HISTORY_HOT_MESSAGES`` positions (see
+:func:`compact_cold`), its body is zlib-compressed if it is at least
+``config.HISTORY_COMPRESS_MIN_CHARS`` long. ``Message.content`` decompresses
+transparently, so callers never see the difference. Hot messages, which are the
+ones every turn reads, stay plain strings.
+"""
+
+import logging
+import sys
+import zlib
+from typing import List, Optional, Union
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value is not None else None
+
+
+class Message:
+    """One conversation message: role ("system", "user", "assistant" or "error"),
+    content, and the provider that produced it (e.g. "user", "openai", "collab")."""
+
+    __slots__ = ("role", "sender_provider", "_body")
+
+    def __init__(self, role: str, content: str, sender_provider: Optional[str] = None):
+        self.role = _intern(role)
+        self.sender_provider = _intern(sender_provider)
+        self._body: Union[str, bytes] = content  # zlib-compressed UTF-8 once cold
+
+    @property
+    def content(self) -> str:
+        body = self._body
+        if isinstance(body, bytes):
+            return zlib.decompress(body).decode("utf-8")
+        return body
+
+    @content.setter
+    def content(self, value: str) -> None:
+        self._body = value
+
+    @property
+    def compressed(self) -> bool:
+        return isinstance(self._body, bytes)
+
+    def compress(self, min_chars: int = 0) -> int:
+        """Compress the body if it is at least *min_chars* long; return the bytes saved."""
+        body = self._body
+        if isinstance(body, bytes) or len(body) < max(min_chars, 1):
+            return 0
+        raw = body.encode("utf-8")
+        packed = zlib.compress(raw, config.HISTORY_COMPRESS_LEVEL)
+        if len(packed) >= len(raw):
+            return 0  # Incompressible (e.g. already-encoded data); keep the string
+        self._body = packed
+        return len(raw) - len(packed)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Message):
+            return NotImplemented
+        return (self.role, self.sender_provider, self.content) == (
+            other.role,
+            other.sender_provider,
+            other.content,
+        )
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return (
+            f"Message(role={self.role!r}, content={self.content!r}, "
+            f"sender_provider={self.sender_provider!r})"
+        )
+
+
+def compact_cold(messages: List[Message]) -> None:
+    """Compress the message that just moved out of the hot tail of *messages*.
+
+    Called after every append, so each message is considered exactly once.
+    """
+    hot = config.HISTORY_HOT_MESSAGES
+    if hot < 0:
+        return  # Compression disabled
+    index = len(messages) - hot - 1
+    if index < 0:
+        return
+    message = messages[index]
+    if message.role == "system":
+        return  # The system prompt is read every turn
+    saved = message.compress(config.HISTORY_COMPRESS_MIN_CHARS)
+    if saved:
+        logger.debug(f"Compressed cold message {index} ({message.role}), saved {saved} bytes")
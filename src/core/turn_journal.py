@@ -0,0 +1,91 @@
+"""
+turn_journal.py - Collects the messages of one chat turn and records them exactly once.
+
+A turn starts with the user's message, which goes into the in-memory history
+right away because the provider requests are built from it. Answers, command
+output and failures are then noted in the journal as they arrive. Nothing else
+touches the history until :meth:`TurnJournal.commit`. It appends the replies to
+the in-memory history and writes the user message plus the replies to the
+persistent store in a single call. A journal without a store (a sub-agent's
+turn) only updates memory. If the store cannot be written (see
+:class:`~src.shared.history.HistoryStoreError`) the failure is logged and the
+turn's replies are still returned; :meth:`TurnJournal.persist` can retry it.
+
+Failures ("error" entries) are shown to the user and kept in memory for display,
+but they are never persisted and never sent back to a model.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+from src.shared.history import HistoryStoreError
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class JournalEntry:
+    role: str  # "assistant" or "error"
+    sender: str  # "openai", "gemini", "collab", ...
+    content: str
+
+
+class TurnJournal:
+    """The messages of one turn, committed once to memory and the persistent store."""
+
+    def __init__(self, conversation: Any, user_input: str, store: Optional[Any] = None):
+        self.conversation = conversation
+        self.user_input = user_input
+        self.store = store
+        self.entries: List[JournalEntry] = []
+        self.committed = False
+        self.persisted = store is None
+        conversation.add_message(role="user", content=user_input, sender_provider="user")
+
+    def reply(self, sender: str, content: str) -> None:
+        """Note an answer (or command output) that the models may see later."""
+        self._note(JournalEntry("assistant", sender, content))
+
+    def error(self, sender: str, content: str) -> None:
+        """Note a failure shown to the user only."""
+        self._note(JournalEntry("error", sender, content))
+
+    def replies(self) -> List[Tuple[str, str]]:
+        """``(sender, content)`` of every entry, in the order they were noted."""
+        return [(entry.sender, entry.content) for entry in self.entries]
+
+    def commit(self) -> List[Tuple[str, str]]:
+        """Record the turn and return its replies. A journal commits only once."""
+        if self.committed:
+            raise RuntimeError("Turn already committed")
+        self.committed = True
+        for entry in self.entries:
+            self.conversation.add_message(
+                role=entry.role, content=entry.content, sender_provider=entry.sender
+            )
+        self.persist()
+        logger.debug(f"Committed turn with {len(self.entries)} reply(ies)")
+        return self.replies()
+
+    def persist(self) -> bool:
+        """Write the committed turn to the store unless already saved; returns whether it is."""
+        if not self.committed:
+            raise RuntimeError("Turn not committed yet")
+        if self.persisted or self.store is None:
+            return True
+        entries = [("user", self.user_input)] + [
+            (entry.sender, entry.content) for entry in self.entries if entry.role == "assistant"
+        ]
+        try:
+            self.store.extend(entries)
+        except HistoryStoreError as e:
+            logger.error(f"Turn kept in memory but not saved: {e}")
+            return False
+        self.persisted = True
+        return True
+
+    def _note(self, entry: JournalEntry) -> None:
+        if self.committed:
+            raise RuntimeError("Turn already committed")
+        self.entries.append(entry)
@@ -2,10 +2,11 @@
 # bandit: skip-file
 from enum import Enum, auto
 from dataclasses import dataclass
-from typing import Any, Optional, Tuple, List, TYPE_CHECKING
+from typing import Any, Optional, Sequence, Tuple, TYPE_CHECKING
 import re
 import os  # For os.path.basename
 import logging  # Added
+import threading
 
 from src.tools.base import ToolInput, ToolOutput  # Updated import
 from src.tools.file_system import FileManagerTool  # Updated import
@@ -47,7 +48,7 @@ class CommandHandler:
         self.file_tool = file_tool
 
     def parse(
-        self, user_input: str, chat_log_for_context: List[Tuple[str, str]]
+        self, user_input: str, chat_log_for_context: Sequence[Tuple[str, str]]
     ) -> Optional[Command]:
         """
         Parses user input to detect slash commands or natural language commands.
@@ -409,14 +410,21 @@ class CommandHandler:
                     return "📊 Metrics disabled – set `ENABLE_METRICS=1` to enable."
                 else:
                     response = "📊 Current Metrics:\n\n"
-                    for metric_name, data in metrics_snapshot.items():
+                    for metric_name, series in metrics_snapshot.items():
                         response += f"**{metric_name}:**\n"
-                        if data:
-                            for labels, value in data.items():
-                                label_str = ", ".join([f"{k}='{v}'" for k, v in labels.items()])
-                                response += f"  - {{}}{value}\n".format(f'{{{label_str}}} ' if label_str else '')
-                        else:
+                        if not series:
                             response += "  - 0\n"
+                        for labels, value in series:
+                            label_str = ", ".join(f"{k}='{v}'" for k, v in labels.items())
+                            prefix = f"{{{label_str}}} " if label_str else ""
+                            if isinstance(value, dict):  # Histogram summary
+                                value = (
+                                    f"count={value['count']} mean={value['mean']:.3g} "
+                                    f"p50={value['p50']:.3g} p95={value['p95']:.3g} p99={value['p99']:.3g}"
+                                )
+                            elif float(value).is_integer():
+                                value = int(value)
+                            response += f"  - {prefix}{value}\n"
                     return response
 
             elif parsed_command.command_type == CommandType.UNKNOWN:
@@ -459,3 +467,23 @@ class CommandHandler:
                 f"Unexpected error in CommandHandler.execute_command for command {parsed_command.command_type if parsed_command else 'N/A'}"
             )  # Changed to logger.exception
             return f"⚠️ An unexpected error occurred in CommandHandler: {e}"
+
+
+# ---------------------------------------------------------------------------
+# Process-wide instance
+# ---------------------------------------------------------------------------
+
+_shared_handler: Optional[CommandHandler] = None
+_shared_lock = threading.Lock()
+
+
+def get_command_handler() -> CommandHandler:
+    """Return the CommandHandler (and FileManagerTool) shared by every ChatSession.
+
+    Neither keeps per-session state; the session is passed to execute_command.
+    """
+    global _shared_handler
+    with _shared_lock:
+        if _shared_handler is None:
+            _shared_handler = CommandHandler(file_tool=FileManagerTool())
+        return _shared_handler
@@ -6,7 +6,7 @@ Provides a UI for chatting with OpenAI and Gemini models, and using file system
 import streamlit as st
 from src.core.chat_session import ChatSession
 import os
-from src.shared import history  # persistent history loading and clearing
+import uuid
 from src.shared import usage_logger as UL
 from src.shared import cost_monitor  # Import cost monitor module
 
@@ -14,7 +14,8 @@ from src.shared import cost_monitor  # Import cost monitor module
 # import google.generativeai as genai # No longer needed here directly
 from src import config  # Updated import
 import logging
-from typing import Tuple  # For type hints
+from typing import Any, Dict, List, Optional, Tuple  # For type hints
+from src.shared.history import HistoryStore, HistoryStoreError
 
 # --- Helper util for cost formatting (extracted for testability) ---
 def _fmt_cost(val):
@@ -26,6 +27,31 @@ def _fmt_cost(val):
         pass
     return "N/A"
 
+
+# --- Saved-history paging (extracted for testability) ---
+def _newest_page(saved: Optional[HistoryStore]) -> Tuple[List[dict], Optional[int]]:
+    """The newest page of saved messages and the record number it starts at.
+
+    The start is None when the offset index disagrees with the journal's tail
+    (e.g. another process crashed between writing the two).
+    """
+    if saved is None:
+        return [], 0
+    messages = saved.load_tail(config.HISTORY_PAGE_SIZE)
+    start = saved.count() - len(messages)
+    return messages, start if start >= 0 else None
+
+
+def _with_older_page(
+    saved: HistoryStore, messages: List[dict], start: Optional[int]
+) -> Tuple[List[dict], int]:
+    """*messages* (starting at record *start*) with the page before them prepended."""
+    if start is None:
+        # Unknown position: reload everything from the first record instead
+        return saved.load_range(0, saved.count()), 0
+    page_start = max(0, start - config.HISTORY_PAGE_SIZE)
+    return saved.load_range(page_start, start) + messages, page_start
+
 logger = logging.getLogger(__name__)
 
 # Page configuration
@@ -33,9 +59,19 @@ st.set_page_config(
     page_title="AI Chat Interface", page_icon="��", layout="wide"
 )
 
+
+def _session_id() -> str:
+    """The chat session named in the URL (``?session=...``), so a reload resumes it."""
+    session_id = st.query_params.get("session")
+    if not session_id:
+        session_id = uuid.uuid4().hex
+        st.query_params["session"] = session_id
+    return session_id
+
+
 # Initialize chat session in session_state if not already
 if "chat_session" not in st.session_state:
-    st.session_state.chat_session = ChatSession()
+    st.session_state.chat_session = ChatSession(session_id=_session_id())
     # Token counting states
     st.session_state.last_user_input_token_count = 0
     st.session_state.last_user_input_provider = "openai"  # Default, will be updated
@@ -47,8 +83,12 @@ if "chat_session" not in st.session_state:
     st.session_state.all_time_total_openai_tokens = 0
     st.session_state.all_time_total_gemini_tokens = 0
 
-# Load persistent history on app startup
-st.session_state.setdefault("messages", history.load())
+# Load the newest page of this session's saved history once per browser session;
+# older pages are fetched on demand (see _render_saved_history)
+if "messages" not in st.session_state:
+    st.session_state.messages, st.session_state.messages_start = _newest_page(
+        st.session_state.chat_session.persistent_history
+    )
 
 chat_session = st.session_state.chat_session
 
@@ -238,19 +278,10 @@ def _update_and_display_token_counts(chat_session: ChatSession):
             elif provider == "gemini":
                 user_gemini_tokens += count
 
-    agent_openai_tokens = 0
-    agent_gemini_tokens = 0
-    for sender, content in chat_session.chat_log:
-        if sender == "openai":
-            if chat_session.openai_manager and chat_session.openai_manager.available:
-                agent_openai_tokens += chat_session.openai_manager.count_tokens(content)
-            else:
-                agent_openai_tokens += len(content.split())
-        elif sender == "gemini":
-            if chat_session.gemini_manager and chat_session.gemini_manager.available:
-                agent_gemini_tokens += chat_session.gemini_manager.count_tokens(content)
-            else:
-                agent_gemini_tokens += len(content.split())
+    # Per-message counts cached by the context window: each rerun only counts
+    # new messages and never decompresses cold ones
+    agent_openai_tokens = chat_session.reply_tokens("openai")
+    agent_gemini_tokens = chat_session.reply_tokens("gemini")
 
     st.session_state.current_conversation_openai_tokens = (
         user_openai_tokens + agent_openai_tokens
@@ -300,13 +331,26 @@ def _render_token_counts_sidebar():
 def _render_clear_chat_button() -> bool:
     """Renders the Clear Chat button in the sidebar."""
     if st.sidebar.button("🗑 Clear Chat"):
-        history.reset()
+        try:
+            st.session_state.chat_session.persistent_history.reset()
+        except HistoryStoreError as e:
+            logger.error(f"Could not clear the saved chat history: {e}")
+            st.sidebar.error("Could not clear the saved history (it is busy); please try again.")
+            return False
         st.session_state["messages"] = []
+        st.session_state["messages_start"] = 0
         st.rerun()
         return True
     return False
 
 
+_AGENT_LABELS = {
+    "openai": "Agent (OpenAI)",
+    "gemini": "Agent (Gemini)",
+    "collab": "Agent (OpenAI & Gemini)",
+}
+
+
 def _render_chat_history(chat_session: ChatSession):
     """Renders the chat message history in the main area."""
     for sender, content in chat_session.chat_log:
@@ -325,6 +369,26 @@ def _render_chat_history(chat_session: ChatSession):
         #     st.markdown(f"**{sender.capitalize()}:**\\n{content}") # Generic sender
 
 
+def _render_saved_history(chat_session: ChatSession) -> None:
+    """Renders this session's persisted messages from earlier visits, one page at a time."""
+    messages = st.session_state.get("messages", [])
+    start: Optional[int] = st.session_state.get("messages_start", 0)
+    saved = chat_session.persistent_history
+    if not messages or saved is None:
+        return
+    total = f"{start + len(messages)}" if start is not None else "more"
+    with st.expander(f"Saved history ({len(messages)} of {total} messages)"):
+        if (start is None or start > 0) and st.button("Load older messages"):
+            st.session_state.messages, st.session_state.messages_start = _with_older_page(
+                saved, messages, start
+            )
+            st.rerun()
+        for entry in messages:
+            sender = entry.get("r")
+            label = "You" if sender == "user" else _AGENT_LABELS.get(sender, "Agent")
+            st.markdown(f"**{label}:** {entry.get('c', '')}")
+
+
 def _render_overwrite_confirmation(chat_session: ChatSession) -> bool:
     """Renders the overwrite confirmation button if a pending write exists. Returns True if confirmed."""
     if chat_session.pending_write_user_path:
@@ -392,11 +456,30 @@ def _render_input_form(
                     )
                 )
 
+                # Stream each sender's answer into its own placeholder so the first
+                # tokens show up immediately, and "both"/"collab" answers stay apart.
+                stream_area = st.container()
+                stream_placeholders: Dict[str, Any] = {}
+                streamed_text: Dict[str, str] = {}
+
+                def _render_delta(sender: str, delta: str) -> None:
+                    if sender not in stream_placeholders:
+                        stream_placeholders[sender] = stream_area.empty()
+                        streamed_text[sender] = ""
+                    streamed_text[sender] += delta
+                    label = _AGENT_LABELS.get(sender, "Agent")
+                    stream_placeholders[sender].markdown(
+                        f"**{label}:**\\n{streamed_text[sender]}▌"
+                    )
+
                 chat_session.process_user_message(
                     user_message,
                     model_choice=active_provider,
                     specific_model_name=selected_model_name_from_sidebar,
+                    on_delta=_render_delta,
                 )
+                for placeholder in stream_placeholders.values():
+                    placeholder.empty()
                 logger.debug(
                     "Finished processing user message, preparing to update token counts and rerun."
                 )
@@ -410,7 +493,7 @@ def main_gui():
 
     # Initialize chat session in session_state if not already present
     if "chat_session" not in st.session_state:
-        st.session_state.chat_session = ChatSession()
+        st.session_state.chat_session = ChatSession(session_id=_session_id())
         st.session_state.last_user_input_token_count = 0
         st.session_state.last_user_input_provider = "openai"
         st.session_state.current_user_message_tokens_log = []
@@ -451,6 +534,7 @@ def main_gui():
 
     # Main area rendering
     st.title("🤖 AI Chat Interface")
+    _render_saved_history(chat_session_instance)
     _render_chat_history(chat_session_instance)
 
     if _render_overwrite_confirmation(chat_session_instance):
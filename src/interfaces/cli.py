@@ -5,6 +5,16 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def _agent_label(sender: str) -> str:
+    if sender == "openai":
+        return "Agent (OpenAI)"
+    if sender == "gemini":
+        return "Agent (Gemini)"
+    if sender == "collab":
+        return "Agent (OpenAI & Gemini)"
+    return "Agent"
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Command-line chat interface for LLMs."
@@ -12,16 +22,29 @@ def main():
     parser.add_argument(
         "--model",
         type=str,
-        choices=["openai", "gemini", "both"],
+        choices=["openai", "gemini", "both", "collab"],
         default="openai",
-        help="Specify the LLM to chat with: 'openai', 'gemini', or 'both'. Default is openai.",
+        help=(
+            "Specify the LLM to chat with: 'openai', 'gemini', 'both' (two answers) "
+            "or 'collab' (one answer the models work out together). Default is openai."
+        ),
+    )
+    parser.add_argument(
+        "--session",
+        type=str,
+        default=None,
+        help=(
+            "Session id whose saved history to continue. Default is a new session; "
+            "'default' continues the history saved before sessions were kept apart."
+        ),
     )
     args = parser.parse_args()
 
     logger.info(
         f"Attempting to initialize chat with {args.model.upper()} model via CLI."
     )
-    chat_session = ChatSession()
+    chat_session = ChatSession(session_id=args.session)
+    logger.info(f"Chat session id: {chat_session.session_id}")
     if args.model == "openai" and not chat_session.openai_available:
         logger.error(
             "Cannot start chat: OpenAI model is not available. Please check API key and installation."
@@ -32,20 +55,13 @@ def main():
             "Cannot start chat: Gemini model is not available. Please check API key and installation."
         )
         return
-    if args.model == "both":
-        # TODO: Implement 'both' (A2A collaboration) model logic
-        # This will likely involve calling a method on chat_session or a dedicated collaboration module
-        # and ensuring both openai_manager and gemini_manager are available and their clients accessible.
+    if args.model in ("both", "collab"):
+        # Both providers answer every turn: side by side ("both") or together ("collab")
         if not chat_session.openai_available or not chat_session.gemini_available:
             logger.error(
-                "Cannot start chat: Both models must be available for 'both' mode (OpenAI or Gemini missing)."
+                f"Cannot start chat: Both models must be available for '{args.model}' mode (OpenAI or Gemini missing)."
             )
             return
-        logger.info("'both' model mode selected - A2A collaboration to be implemented.")
-        # For now, we can prevent it from running further or default to one model
-        # For this refactor, let's just acknowledge and prevent it from proceeding if selected.
-        # If you want to test, you might default it to 'openai' or 'gemini' for now.
-        # For a real implementation, ChatSession.process_user_message would need to handle model_choice="both"
 
     logger.info(
         f"Starting chat with {args.model.upper()}. Type 'exit' or 'quit' to end."
@@ -64,18 +80,27 @@ def main():
             if not user_input.strip():
                 continue
 
+            streamed_senders = {}
+
+            def _print_delta(sender: str, delta: str) -> None:
+                # Print tokens as they arrive instead of waiting for the full answer
+                if sender not in streamed_senders:
+                    if streamed_senders:
+                        print()
+                    print(f"{_agent_label(sender)}: ", end="")
+                    streamed_senders[sender] = ""
+                streamed_senders[sender] += delta
+                print(delta, end="", flush=True)
+
             responses = chat_session.process_user_message(
-                user_input, model_choice=args.model
+                user_input, model_choice=args.model, on_delta=_print_delta
             )
+            if streamed_senders:
+                print()
             for sender, message in responses:
-                if sender == "openai":
-                    print(f"Agent (OpenAI): {message}")
-                elif sender == "gemini":
-                    print(f"Agent (Gemini): {message}")
-                elif sender == "collab":
-                    print(f"Agent (OpenAI & Gemini): {message}")
-                else:
-                    print(f"Agent: {message}")
+                if streamed_senders.get(sender) == message:
+                    continue  # Already printed incrementally
+                print(f"{_agent_label(sender)}: {message}")
 
         except KeyboardInterrupt:
             logger.info("\nExiting chat due to interrupt.")
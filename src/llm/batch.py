@@ -0,0 +1,360 @@
+"""llm.batch
+
+Offline batch generation for bulk one-shot prompts.
+
+Input is JSONL, one request per line::
+
+    {"custom_id": "doc-1", "messages": [{"role": "user", "content": "..."}]}
+
+Output is JSONL, one result per request::
+
+    {"custom_id": "doc-1", "model": "gpt-4.1", "response": "...", "error": null}
+
+Two execution modes:
+
+* ``"concurrent"`` – requests go through the manager's ``agenerate_response``
+  with bounded concurrency. Pacing is left to the shared rate limiter, so
+  throughput is bounded by RPM/TPM rather than by serial round-trips.
+* ``"provider"`` – the OpenAI Batch API (upload, create the batch, poll,
+  download). It is cheaper, but results come back within the provider's
+  completion window. :class:`LocalBatchAPI` is an in-process stand-in with
+  the same surface.
+
+The output file doubles as the checkpoint: each result is appended as soon as it
+is known, and a rerun skips requests that already have a result. Failed
+requests are retried on rerun unless ``retry_errors=False``. In provider mode
+the batch id is kept in ``<output>.batch.json``, so a rerun resumes polling
+instead of resubmitting.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+PathLike = Union[str, Path]
+
+MODE_CONCURRENT = "concurrent"
+MODE_PROVIDER = "provider"
+
+_FSYNC_EVERY = 50
+_TERMINAL_BATCH_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+@dataclass
+class BatchSummary:
+    total: int = 0
+    skipped: int = 0  # Already done in a previous run
+    succeeded: int = 0
+    failed: int = 0
+    elapsed_sec: float = 0.0
+
+
+def read_requests(path: PathLike) -> Iterator[Tuple[str, List[Dict[str, str]]]]:
+    """Yield ``(custom_id, messages)`` from a JSONL request file."""
+    with open(path, encoding="utf-8") as fh:
+        for line_no, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = str(record.get("custom_id") or f"request-{line_no}")
+            messages = record.get("messages")
+            if messages is None and "prompt" in record:
+                messages = [{"role": "user", "content": record["prompt"]}]
+            yield custom_id, messages or []
+
+
+def _load_checkpoint(path: Path, retry_errors: bool) -> Dict[str, dict]:
+    """Return the results already written to *path* (last one per id wins)."""
+    done: Dict[str, dict] = {}
+    if not path.exists():
+        return done
+    with path.open(encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break  # Torn final line from an interrupted run
+            done[record["custom_id"]] = record
+    if retry_errors:
+        done = {cid: rec for cid, rec in done.items() if rec.get("error") is None}
+    return done
+
+
+class _ResultWriter:
+    """Appends result lines, fsyncing periodically; rewrites deduplicated on close."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._drop_torn_tail(path)
+        self._fh = path.open("a", encoding="utf-8")
+        self._pending_sync = 0
+
+    @staticmethod
+    def _drop_torn_tail(path: Path) -> None:
+        """Truncate a partial last line left by an interrupted run before appending."""
+        if not path.exists():
+            return
+        with path.open("rb+") as fh:
+            data = fh.read()
+            if data and not data.endswith(b"\n"):
+                fh.truncate(data.rfind(b"\n") + 1)
+
+    def write(self, record: dict) -> None:
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        self._pending_sync += 1
+        if self._pending_sync >= _FSYNC_EVERY:
+            os.fsync(self._fh.fileno())
+            self._pending_sync = 0
+
+    def close(self) -> None:
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+        # Retried requests leave superseded lines behind; keep the latest result per id
+        latest = _load_checkpoint(self.path, retry_errors=False)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            for record in latest.values():
+                fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp, self.path)
+
+
+def _result(custom_id: str, model: str, response: Optional[str], error: Optional[str]) -> dict:
+    return {"custom_id": custom_id, "model": model, "response": response, "error": error}
+
+
+def run_batch(
+    manager: Any,
+    input_path: PathLike,
+    output_path: PathLike,
+    mode: str = MODE_CONCURRENT,
+    concurrency: Optional[int] = None,
+    retry_errors: bool = True,
+    batch_api: Any = None,
+    poll_interval: float = 30.0,
+) -> BatchSummary:
+    """Generate a response for every request in *input_path*; see module docstring."""
+    if mode == MODE_PROVIDER:
+        api = batch_api if batch_api is not None else getattr(manager, "client", None)
+        if api is None or not hasattr(api, "batches"):
+            logger.warning("Provider batch endpoint unavailable; falling back to concurrent mode")
+        else:
+            return _run_provider_batch(
+                manager, api, Path(input_path), Path(output_path), retry_errors, poll_interval
+            )
+
+    async def _run() -> BatchSummary:
+        try:
+            return await arun_batch(
+                manager, input_path, output_path, concurrency=concurrency, retry_errors=retry_errors
+            )
+        finally:
+            aclose = getattr(manager, "aclose", None)
+            if aclose is not None:  # The async client is bound to this event loop
+                await aclose()
+
+    return asyncio.run(_run())
+
+
+async def arun_batch(
+    manager: Any,
+    input_path: PathLike,
+    output_path: PathLike,
+    concurrency: Optional[int] = None,
+    retry_errors: bool = True,
+) -> BatchSummary:
+    """Concurrent mode of :func:`run_batch` for callers already inside an event loop."""
+    if not manager.available:
+        raise RuntimeError(f"{type(manager).__name__} is not available")
+    concurrency = concurrency or config.LLM_BATCH_CONCURRENCY
+    output = Path(output_path)
+    done = _load_checkpoint(output, retry_errors)
+    writer = _ResultWriter(output)
+    summary = BatchSummary()
+    model = manager.get_model_name()
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+    start = time.monotonic()
+
+    async def _one(custom_id: str, messages: List[Dict[str, str]]) -> None:
+        try:
+            answer = await manager.agenerate_response(messages)
+            writer.write(_result(custom_id, model, answer, None))
+            summary.succeeded += 1
+        except Exception as e:  # One bad request must not sink the batch
+            logger.warning(f"Batch request {custom_id} failed: {e}")
+            writer.write(_result(custom_id, model, None, str(e)))
+            summary.failed += 1
+        finally:
+            slots.release()
+
+    try:
+        for custom_id, messages in read_requests(input_path):
+            summary.total += 1
+            if custom_id in done:
+                summary.skipped += 1
+                continue
+            await slots.acquire()  # Bounds in-flight requests (and memory) to *concurrency*
+            task = asyncio.ensure_future(_one(custom_id, messages))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        writer.close()
+    summary.elapsed_sec = time.monotonic() - start
+    logger.info(f"Batch finished: {summary}")
+    return summary
+
+
+# ---------------------------------------------------------------------------
+# Provider batch endpoint (OpenAI Batch API)
+# ---------------------------------------------------------------------------
+
+
+def _run_provider_batch(
+    manager: Any,
+    api: Any,
+    input_path: Path,
+    output: Path,
+    retry_errors: bool,
+    poll_interval: float,
+) -> BatchSummary:
+    start = time.monotonic()
+    model = manager.get_model_name()
+    done = _load_checkpoint(output, retry_errors)
+    summary = BatchSummary()
+    pending: List[Tuple[str, List[Dict[str, str]]]] = []
+    for custom_id, messages in read_requests(input_path):
+        summary.total += 1
+        if custom_id in done:
+            summary.skipped += 1
+        else:
+            pending.append((custom_id, messages))
+    if not pending:
+        return summary
+
+    state_path = output.with_name(output.name + ".batch.json")
+    batch_id = None
+    if state_path.exists():
+        batch_id = json.loads(state_path.read_text(encoding="utf-8")).get("batch_id")
+        logger.info(f"Resuming provider batch {batch_id}")
+    if batch_id is None:
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {"model": model, "messages": messages},
+                }
+            )
+            for custom_id, messages in pending
+        ]
+        upload = api.files.create(
+            file=("batch_input.jsonl", io.BytesIO("\n".join(lines).encode("utf-8"))),
+            purpose="batch",
+        )
+        batch = api.batches.create(
+            input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        batch_id = batch.id
+        state_path.parent.mkdir(parents=True, exist_ok=True)
+        state_path.write_text(json.dumps({"batch_id": batch_id}), encoding="utf-8")
+
+    batch = api.batches.retrieve(batch_id)
+    while batch.status not in _TERMINAL_BATCH_STATES:
+        time.sleep(poll_interval)
+        batch = api.batches.retrieve(batch_id)
+
+    writer = _ResultWriter(output)
+    try:
+        for file_id in (getattr(batch, "output_file_id", None), getattr(batch, "error_file_id", None)):
+            if not file_id:
+                continue
+            for line in api.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                body = (item.get("response") or {}).get("body") or {}
+                error = item.get("error") or (body.get("error") if body else None)
+                if error is None and body.get("choices"):
+                    answer = body["choices"][0]["message"]["content"]
+                    writer.write(_result(item["custom_id"], model, answer, None))
+                    summary.succeeded += 1
+                else:
+                    writer.write(_result(item["custom_id"], model, None, json.dumps(error)))
+                    summary.failed += 1
+    finally:
+        writer.close()
+    state_path.unlink(missing_ok=True)
+    if batch.status != "completed":
+        logger.warning(f"Provider batch {batch_id} ended with status {batch.status}")
+    summary.elapsed_sec = time.monotonic() - start
+    return summary
+
+
+class LocalBatchAPI:
+    """In-process stand-in for the OpenAI ``files``/``batches`` API surface.
+
+    Each uploaded batch is executed by *handler* (``messages -> answer``),
+    ``concurrency`` requests at a time, as soon as it is created.
+    """
+
+    def __init__(self, handler: Callable[[List[Dict[str, str]]], str], concurrency: int = 8) -> None:
+        self._handler = handler
+        self._concurrency = concurrency
+        self._files: Dict[str, str] = {}
+        self._batches: Dict[str, SimpleNamespace] = {}
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._batches.__getitem__)
+
+    def _create_file(self, file: Any, purpose: str) -> SimpleNamespace:
+        _name, stream = file
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        self._files[file_id] = stream.read().decode("utf-8")
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def _file_content(self, file_id: str) -> SimpleNamespace:
+        return SimpleNamespace(text=self._files[file_id])
+
+    def _run(self, line: str) -> dict:
+        item = json.loads(line)
+        try:
+            answer = self._handler(item["body"]["messages"])
+            body = {"choices": [{"message": {"role": "assistant", "content": answer}}]}
+            return {"custom_id": item["custom_id"], "response": {"status_code": 200, "body": body}, "error": None}
+        except Exception as e:
+            return {"custom_id": item["custom_id"], "response": None, "error": {"message": str(e)}}
+
+    def _create_batch(self, input_file_id: str, endpoint: str, completion_window: str) -> SimpleNamespace:
+        lines = [line for line in self._files[input_file_id].splitlines() if line.strip()]
+        with ThreadPoolExecutor(max_workers=self._concurrency) as pool:
+            results = list(pool.map(self._run, lines))
+        output_id = f"file-{uuid.uuid4().hex[:12]}"
+        self._files[output_id] = "\n".join(json.dumps(r) for r in results)
+        batch = SimpleNamespace(
+            id=f"batch-{uuid.uuid4().hex[:12]}",
+            status="completed",
+            endpoint=endpoint,
+            output_file_id=output_id,
+            error_file_id=None,
+        )
+        self._batches[batch.id] = batch
+        return batch
@@ -0,0 +1,80 @@
+"""llm.call_metrics
+
+Per-call latency, time-to-first-token, throughput and error metrics.
+
+The client managers start a :class:`CallTimer` once a request has its
+rate-limit slot, so the time spent queueing is not counted (that wait is
+``llm_queue_wait_seconds``). Then they:
+
+* call :meth:`CallTimer.first_token` on the first streamed delta,
+* call :meth:`CallTimer.finish` with the completion token count on success,
+* on failure, call :func:`record_error`. :func:`timed_call` does this for
+  any exception escaping its block.
+
+Observations go to the Prometheus histograms exported by MetricsManager,
+labelled by provider and model. A retried blocking call counts each attempt.
+A stream counts once, from opening to the last delta.
+"""
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from src.llm.resilience import is_transient
+from src.shared.metrics import MetricsManager
+
+
+class CallTimer:
+    """Times one provider call and reports it to MetricsManager when finished."""
+
+    def __init__(self, provider: str, model: str) -> None:
+        self.provider = provider
+        self.model = model
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+
+    def first_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+    def finish(self, output_tokens: int) -> float:
+        """Record the call as successful; returns its latency in seconds."""
+        now = time.perf_counter()
+        latency = now - self.started
+        mm = MetricsManager()
+        if not mm.enabled:
+            return latency
+        mm.llm_request_latency_seconds.labels(self.provider, self.model).observe(latency)
+        generating_since = self.started
+        if self.first_token_at is not None:
+            mm.llm_time_to_first_token_seconds.labels(self.provider, self.model).observe(
+                self.first_token_at - self.started
+            )
+            generating_since = self.first_token_at
+        generation = now - generating_since
+        if output_tokens > 0 and generation > 0:
+            mm.llm_output_tokens_per_second.labels(self.provider, self.model).observe(
+                output_tokens / generation
+            )
+        return latency
+
+
+def record_error(provider: str, model: str, exc: BaseException) -> None:
+    """Count a failed provider call as ``transient`` (retryable) or ``permanent``."""
+    transient = getattr(exc, "transient", None)  # LLMCallError already knows
+    if not isinstance(transient, bool):
+        transient = is_transient(exc)
+    kind = "transient" if transient else "permanent"
+    MetricsManager().llm_request_errors_total.labels(provider, model, kind).inc()
+
+
+@contextmanager
+def timed_call(provider: str, model: str) -> Iterator[CallTimer]:
+    """Yield a :class:`CallTimer`; exceptions leaving the block are counted as errors."""
+    timer = CallTimer(provider, model)
+    try:
+        yield timer
+    except Exception as e:
+        record_error(provider, model, e)
+        raise
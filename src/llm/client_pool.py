@@ -0,0 +1,109 @@
+"""llm.client_pool
+
+Process-wide pool of provider SDK clients shared by every client manager.
+
+Each ``ChatSession`` (and so each sub-agent spawned by MultiAgentTool or
+WorkflowTool) used to build its own ``OpenAI`` client. That meant a fresh
+HTTP connection pool and fresh TLS handshakes every time. It also called
+``genai.configure``, which drops the cached Gemini transport. Managers now get
+their clients from this pool instead:
+
+* ``("openai", None, key, base_url)`` -> one ``OpenAI`` client per credential
+  and endpoint. The model is chosen per request, so the client is model-agnostic.
+* ``("gemini", model, key, system_instruction)`` -> one ``GenerativeModel``
+  handle per model and system instruction.
+
+API keys are stored as fingerprints, never in clear text. The pool is an LRU
+bounded by ``LLM_CLIENT_POOL_MAX_ENTRIES``. Evicted clients are only
+dereferenced, not closed, because managers may still hold them. Async clients
+are bound to the event loop that created them, so they stay per manager.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from src import config
+
+
+def fingerprint(secret: Optional[str]) -> str:
+    """Short, non-reversible stand-in for an API key in pool keys."""
+    if not secret:
+        return ""
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16]
+
+
+class ClientPool:
+    """Thread-safe LRU of SDK clients built on first use by a factory."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._clients: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.hits += 1
+                return client
+            self.misses += 1
+            # Built under the lock so concurrent sessions never race to build duplicates
+            client = factory()
+            self._clients[key] = client
+            while self.max_entries > 0 and len(self._clients) > self.max_entries:
+                self._clients.popitem(last=False)
+            return client
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._clients), "hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self.hits = self.misses = 0
+        for client in clients:
+            close = getattr(client, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception:  # Best effort; the pool is being discarded
+                    pass
+
+
+_pool = ClientPool(config.LLM_CLIENT_POOL_MAX_ENTRIES)
+
+
+def shared_client(
+    provider: str,
+    model: Optional[str],
+    api_key: Optional[str],
+    factory: Callable[[], Any],
+    *extra: Hashable,
+) -> Any:
+    """Return the pooled client for ``(provider, model, api_key, *extra)``.
+
+    *factory* builds it on a miss. With ``LLM_CLIENT_POOL_ENABLED`` off,
+    every call builds a new client (the old per-session behaviour).
+    """
+    if not config.LLM_CLIENT_POOL_ENABLED:
+        return factory()
+    key: Tuple[Hashable, ...] = (provider, model, fingerprint(api_key)) + extra
+    return _pool.get(key, factory)
+
+
+def get_client_pool() -> ClientPool:
+    return _pool
+
+
+def reset_client_pool() -> None:
+    """Close and drop every pooled client (used by tests and benchmarks)."""
+    _pool.clear()
+    _pool.max_entries = config.LLM_CLIENT_POOL_MAX_ENTRIES
@@ -1,14 +1,17 @@
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Generator, Any, Tuple, Sequence
+import functools
 import logging
+import threading
 
 # Attempt to import API libraries
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
 
     OPENAI_SDK_AVAILABLE = True
 except ImportError:
     OPENAI_SDK_AVAILABLE = False
     OpenAI = None  # Define for type hinting even if not available
+    AsyncOpenAI = None  # type: ignore[misc,assignment]
 
 try:
     import tiktoken  # Added for OpenAI token counting
@@ -26,22 +29,159 @@ except ImportError:
     genai = None  # Define for type hinting
 
 from src.shared.usage_logger import UsageLogger
+from src.llm.response_cache import ResponseCache, get_response_cache
+from src.llm import batch
+from src.llm.call_metrics import timed_call
+from src.llm.client_pool import shared_client
+from src.llm.hedging import attempt_cancelled, on_cancel
+from src.llm.rate_limit import estimate_request_tokens, get_rate_limiter
+from src.llm.resilience import (
+    LLMCallError,
+    acall_with_retries,
+    call_with_retries,
+    get_circuit_breaker,
+    is_transient,
+)
+from src.llm.token_counting import (
+    MODE_BACKFILL,
+    MODE_ESTIMATE,
+    MODE_EXACT,
+    ExactCountBackfill,
+    GeminiTokenEstimator,
+    TokenCountMemo,
+)
+from src import config
 
 # Get a logger for this module
 logger = logging.getLogger(__name__)
 
+_gemini_configured_key: Optional[str] = None
+_gemini_configure_lock = threading.Lock()
+
+
+def _configure_gemini(api_key: str) -> None:
+    """Call ``genai.configure`` only when the key changes.
+
+    Reconfiguring drops the SDK's cached transport, so calling it for every
+    new session would throw away the pooled connection.
+    """
+    global _gemini_configured_key
+    with _gemini_configure_lock:
+        if config.LLM_CLIENT_POOL_ENABLED and _gemini_configured_key == api_key:
+            return
+        genai.configure(api_key=api_key)
+        _gemini_configured_key = api_key
+
+
 # Token accounting
 
 
+def _cache_lookup(
+    cache: Optional[ResponseCache],
+    provider: str,
+    model_name: str,
+    history: List[Dict[str, str]],
+) -> Tuple[Optional[str], Optional[str]]:
+    """Return ``(cache_key, cached_answer)``; both are None when caching is off."""
+    if cache is None:
+        return None, None
+    key = ResponseCache.make_key(provider, model_name, history)
+    hit = cache.get(key)
+    if hit is None:
+        return key, None
+    logger.debug(f"Response cache hit for {provider}/{model_name}")
+    UsageLogger.record_cache_hit(provider, hit.tokens)
+    return key, hit.answer
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding_for_model(model_name: str):
+    """Return (and cache) the tiktoken encoding for *model_name*."""
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        # Fallback for models not directly in tiktoken, e.g., potentially newer ones
+        # cl100k_base is a common encoding for gpt-3.5-turbo and gpt-4 based models
+        return tiktoken.get_encoding("cl100k_base")
+
+
+_token_count_memo = TokenCountMemo()
+
+
+def _abort_on_cancel(stream: Any) -> None:
+    """Let a losing hedged stream close *stream* (the open SDK response) right away."""
+    close = getattr(stream, "close", None)
+    if close is not None:
+        on_cancel(close)
+
+
+def _raise_stream_error(provider: str, exc: Exception) -> None:
+    """Record a mid-stream failure with the circuit breaker and raise LLMCallError."""
+    name = "OpenAI" if provider == "openai" else "Gemini"
+    if attempt_cancelled():
+        # The hedge closed this loser's response; not a provider failure
+        logger.debug(f"{name} stream closed after losing a hedge: {exc}")
+        raise LLMCallError(provider, f"{name} stream cancelled", transient=False) from exc
+    if is_transient(exc):
+        get_circuit_breaker(provider).record_failure()
+    logger.error(f"Error communicating with {name} mid-stream: {exc}", exc_info=True)
+    raise LLMCallError(
+        provider, f"Error communicating with {name}: {exc}", transient=is_transient(exc)
+    ) from exc
+
+
+def _completion_tokens(usage: Any, answer: Optional[str]) -> int:
+    """Output tokens from OpenAI or Gemini usage, else a ~4 chars/token estimate."""
+    for attr in ("completion_tokens", "candidates_token_count"):
+        value = getattr(usage, attr, None)
+        if isinstance(value, int):
+            return value
+    return len(answer) // 4 + 1 if answer else 0
+
+
+def _cache_store(
+    cache: Optional[ResponseCache], key: Optional[str], answer: str, tokens: int
+) -> None:
+    if cache is not None and key is not None and answer:
+        cache.put(key, answer, tokens)
+
+
 class OpenAIClientManager:
-    def __init__(self, api_key: Optional[str], default_model_name: str = "o3"):
+    def __init__(
+        self,
+        api_key: Optional[str],
+        default_model_name: str = "o3",
+        response_cache: Optional[ResponseCache] = None,
+        base_url: Optional[str] = None,
+    ):
         self.client: Optional["OpenAI"] = None
         self.model_name: str = default_model_name
         self._available: bool = False
+        self._api_key: Optional[str] = api_key  # Kept for the lazily built async client
+        self._async_client: Optional["AsyncOpenAI"] = None
+        # OpenAI-compatible endpoint override (e.g. src.llm.mock_backends.MockOpenAIServer)
+        self.base_url: Optional[str] = base_url or config.OPENAI_BASE_URL
+        # Opt-in response cache (None unless passed in or LLM_CACHE_ENABLED is set)
+        self.response_cache: Optional[ResponseCache] = (
+            response_cache if response_cache is not None else get_response_cache()
+        )
 
         if api_key and OPENAI_SDK_AVAILABLE:
             try:
-                self.client = OpenAI(api_key=api_key)
+                # Retries are handled by src.llm.resilience, not by the SDK
+                self.client = shared_client(
+                    "openai",
+                    None,  # The model is chosen per request
+                    api_key,
+                    lambda: OpenAI(
+                        api_key=api_key,
+                        base_url=self.base_url,
+                        max_retries=0,
+                        timeout=config.LLM_REQUEST_TIMEOUT_SEC,
+                    ),
+                    self.base_url,
+                    config.LLM_REQUEST_TIMEOUT_SEC,
+                )
                 self._available = True
             except Exception as e:
                 logger.error(f"Failed to initialize OpenAI client: {e}", exc_info=True)
@@ -69,82 +209,316 @@ class OpenAIClientManager:
             # OpenAI client typically doesn't need re-initialization for just a model name change
             # as the model is specified in each API call.
 
+    def _record_usage(
+        self, usage: Any, history: List[Dict[str, str]], answer: str
+    ) -> int:
+        """Report the tokens consumed by one completion to UsageLogger.
+
+        Leverages the OpenAI ``usage`` field if available; otherwise falls back
+        to estimating via tiktoken.  Returns the number of tokens recorded.
+        """
+        tokens_used = 0
+        try:
+            if usage is not None:
+                # Newer OpenAI SDK exposes prompt_tokens/completion_tokens/total_tokens
+                if hasattr(usage, "total_tokens") and usage.total_tokens:
+                    tokens_used = usage.total_tokens
+                elif hasattr(usage, "prompt_tokens") and hasattr(
+                    usage, "completion_tokens"
+                ):
+                    tokens_used = (usage.prompt_tokens or 0) + (
+                        usage.completion_tokens or 0
+                    )
+            else:
+                # Fallback: estimate using token counter helper
+                prompt_text = "\n".join(m.get("content", "") for m in history)
+                tokens_used = self.count_tokens(prompt_text)
+                tokens_used += self.count_tokens(answer)
+        except Exception as e_tok:
+            logger.debug(f"Unable to determine token usage: {e_tok}")
+            tokens_used = 0
+
+        if tokens_used:
+            UsageLogger.inc("openai", tokens_used)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        if isinstance(prompt_tokens, int):
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = getattr(details, "cached_tokens", None)
+            UsageLogger.record_prompt_tokens(
+                "openai", self.model_name, prompt_tokens, cached if isinstance(cached, int) else 0
+            )
+        return tokens_used
+
     def generate_response(self, history: List[Dict[str, str]]) -> str:
         if not self.available:
             return "⚠️ OpenAI model is not available (client not initialized or SDK missing)."
         if not self.client:  # Should be caught by self.available but as a safeguard
             return "⚠️ OpenAI client is None, though manager reported as available."
 
+        cache_key, cached = _cache_lookup(
+            self.response_cache, "openai", self.model_name, history
+        )
+        if cached is not None:
+            return cached
+
+        limiter = get_rate_limiter("openai", self.model_name)
+        estimated = estimate_request_tokens(history)
+
+        def _send():
+            with timed_call("openai", self.model_name) as timer:
+                response = self.client.chat.completions.create(
+                    model=self.model_name, messages=history
+                )
+                timer.finish(
+                    _completion_tokens(
+                        getattr(response, "usage", None), response.choices[0].message.content
+                    )
+                )
+                return response
+
         try:
-            response = self.client.chat.completions.create(
-                model=self.model_name, messages=history
-            )
-            # -------------------------------------------------------------
-            # Token accounting: leverage the OpenAI response.usage field if
-            # available; otherwise fall back to estimating via tiktoken.
-            # -------------------------------------------------------------
-            tokens_used = 0
+            # One reservation for the whole retry loop, settled once below
+            with limiter.acquire(estimated):
+                response = call_with_retries("openai", _send)
+        except LLMCallError as e:
+            logger.error(str(e), exc_info=True)
+            raise
+        answer = response.choices[0].message.content
+        tokens = self._record_usage(getattr(response, "usage", None), history, answer)
+        limiter.settle(estimated, tokens)
+        _cache_store(self.response_cache, cache_key, answer, tokens)
+        return answer
+
+    @property
+    def async_client(self) -> Optional["AsyncOpenAI"]:
+        """AsyncOpenAI client sharing this manager's credentials, built on first use."""
+        if self._async_client is None and self.available and AsyncOpenAI is not None:
             try:
-                if hasattr(response, "usage") and response.usage is not None:
-                    # Newer OpenAI SDK exposes prompt_tokens/completion_tokens/total_tokens
-                    usage_obj = response.usage  # type: ignore[attr-defined]
-                    if hasattr(usage_obj, "total_tokens") and usage_obj.total_tokens:
-                        tokens_used = usage_obj.total_tokens  # type: ignore[attr-defined]
-                    elif (
-                        hasattr(usage_obj, "prompt_tokens")
-                        and hasattr(usage_obj, "completion_tokens")
-                    ):
-                        tokens_used = (
-                            (usage_obj.prompt_tokens or 0)
-                            + (usage_obj.completion_tokens or 0)
-                        )
-                else:
-                    # Fallback: estimate using token counter helper
-                    prompt_text = "\n".join(m.get("content", "") for m in history)
-                    tokens_used = self.count_tokens(prompt_text)
-                    tokens_used += self.count_tokens(response.choices[0].message.content)
-            except Exception as e_tok:
-                logger.debug(f"Unable to determine token usage: {e_tok}")
-                tokens_used = 0
+                self._async_client = AsyncOpenAI(
+                    api_key=self._api_key,
+                    base_url=self.base_url,
+                    max_retries=0,
+                    timeout=config.LLM_REQUEST_TIMEOUT_SEC,
+                )
+            except Exception as e:
+                logger.error(f"Failed to initialize AsyncOpenAI client: {e}", exc_info=True)
+        return self._async_client
 
-            if tokens_used:
-                UsageLogger.inc("openai", tokens_used)
-            return response.choices[0].message.content
-        except Exception as e:
-            logger.error(f"Error communicating with OpenAI: {e}", exc_info=True)
-            return f"Error communicating with OpenAI: {e}"
+    async def aclose(self) -> None:
+        """Close the async client; call before the event loop that used it ends."""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+    async def agenerate_response(self, history: List[Dict[str, str]]) -> str:
+        """Asyncio counterpart of :meth:`generate_response`."""
+        if not self.available:
+            return "⚠️ OpenAI model is not available (client not initialized or SDK missing)."
+        client = self.async_client
+        if client is None:
+            return "⚠️ OpenAI async client could not be initialized."
+
+        cache_key, cached = _cache_lookup(
+            self.response_cache, "openai", self.model_name, history
+        )
+        if cached is not None:
+            return cached
+
+        limiter = get_rate_limiter("openai", self.model_name)
+        estimated = estimate_request_tokens(history)
+
+        async def _send():
+            with timed_call("openai", self.model_name) as timer:
+                response = await client.chat.completions.create(
+                    model=self.model_name, messages=history
+                )
+                timer.finish(
+                    _completion_tokens(
+                        getattr(response, "usage", None), response.choices[0].message.content
+                    )
+                )
+                return response
+
+        try:
+            # One reservation for the whole retry loop, settled once below
+            async with limiter.acquire_async(estimated):
+                response = await acall_with_retries("openai", _send)
+        except LLMCallError as e:
+            logger.error(str(e), exc_info=True)
+            raise
+        answer = response.choices[0].message.content
+        tokens = self._record_usage(getattr(response, "usage", None), history, answer)
+        limiter.settle(estimated, tokens)
+        _cache_store(self.response_cache, cache_key, answer, tokens)
+        return answer
+
+    def generate_batch(
+        self, input_path: str, output_path: str, mode: str = batch.MODE_CONCURRENT, **kwargs: Any
+    ) -> "batch.BatchSummary":
+        """Answer every request in a JSONL file; ``mode="provider"`` uses the OpenAI Batch API.
+
+        See :mod:`src.llm.batch` for the file formats and checkpointing.
+        """
+        return batch.run_batch(self, input_path, output_path, mode=mode, **kwargs)
+
+    def stream_response(self, history: List[Dict[str, str]]) -> Generator[str, None, int]:
+        """Yield the completion for *history* as a sequence of text deltas.
+
+        Usage is requested via ``stream_options`` and arrives on the final
+        chunk; it is reported to UsageLogger once the stream is exhausted and
+        returned as the generator's return value (tokens used).
+        """
+        if not self.available or not self.client:
+            yield "⚠️ OpenAI model is not available (client not initialized or SDK missing)."
+            return 0
+
+        cache_key, cached = _cache_lookup(
+            self.response_cache, "openai", self.model_name, history
+        )
+        if cached is not None:
+            yield cached
+            return 0
+
+        limiter = get_rate_limiter("openai", self.model_name)
+        estimated = estimate_request_tokens(history)
+        parts: List[str] = []
+        usage = None
+
+        def _open():
+            return self.client.chat.completions.create(
+                model=self.model_name,
+                messages=history,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+
+        # The concurrency slot is held for the whole stream
+        with limiter.acquire(estimated), timed_call("openai", self.model_name) as timer:
+            # Opening the stream is retried; a failure after deltas were
+            # yielded cannot be replayed and surfaces as LLMCallError.
+            stream = call_with_retries("openai", _open)
+            _abort_on_cancel(stream)
+            try:
+                for chunk in stream:
+                    if getattr(chunk, "usage", None) is not None:
+                        usage = chunk.usage
+                    if not getattr(chunk, "choices", None):
+                        continue  # The trailing usage chunk carries no choices
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        timer.first_token()
+                        parts.append(delta)
+                        yield delta
+            except Exception as e:
+                _raise_stream_error("openai", e)
+            timer.finish(_completion_tokens(usage, "".join(parts)))
+        answer = "".join(parts)
+        tokens = self._record_usage(usage, history, answer)
+        limiter.settle(estimated, tokens)
+        _cache_store(self.response_cache, cache_key, answer, tokens)
+        return tokens
 
     def count_tokens(self, text: str) -> int:
         """Counts tokens in a string using tiktoken for the current OpenAI model."""
         if not text:
             return 0
+        return self.count_tokens_many([text])[0]
+
+    def count_tokens_many(self, texts: Sequence[str]) -> List[int]:
+        """Counts tokens for each string in *texts* (same order).
+
+        Encodings are cached per model and per-text counts are memoized by
+        content, so only texts not seen before are encoded – in one
+        ``encode_batch`` call.
+        """
         if not self.available or not TIKTOKEN_AVAILABLE:
             # Fallback if client or tiktoken is not available
             logger.warning(
                 "OpenAI client or tiktoken not available for token counting. Using word count."
             )
-            return len(text.split())
+            return [len(t.split()) if t else 0 for t in texts]
 
         try:
             # self.model_name should be the string name like "gpt-4o-mini"
-            encoding = tiktoken.encoding_for_model(self.model_name)
-        except KeyError:
-            # Fallback for models not directly in tiktoken, e.g., potentially newer ones
-            # cl100k_base is a common encoding for gpt-3.5-turbo and gpt-4 based models
-            try:
-                encoding = tiktoken.get_encoding("cl100k_base")
-            except Exception as e_enc:
-                logger.warning(
-                    f"Error getting tiktoken encoding (cl100k_base) for {self.model_name}: {e_enc}. Using word count."
-                )
-                return len(text.split())
-        except Exception as e_model_name:
+            encoding = _encoding_for_model(self.model_name)
+        except Exception as e_enc:
             logger.warning(
-                f"Error getting tiktoken encoding for model {self.model_name}: {e_model_name}. Using word count."
+                f"Error getting tiktoken encoding for model {self.model_name}: {e_enc}. Using word count."
             )
-            return len(text.split())
+            return [len(t.split()) if t else 0 for t in texts]
+
+        counts: Dict[str, int] = {}
+        missing: List[str] = []
+        for text in dict.fromkeys(t for t in texts if t):
+            cached = _token_count_memo.get(encoding.name, text)
+            if cached is None:
+                missing.append(text)
+            else:
+                counts[text] = cached
+        if missing:
+            for text, tokens in zip(missing, encoding.encode_batch(missing)):
+                counts[text] = len(tokens)
+                _token_count_memo.put(encoding.name, text, len(tokens))
+        return [counts[text] if text else 0 for text in texts]
+
+
+class GeminiContents:
+    """Role-structured Gemini request kept in sync with an OpenAI-style history.
+
+    Leading ``system`` messages become the ``system_instruction``; ``user`` and
+    ``assistant`` messages become ``user``/``model`` contents (consecutive
+    messages of one role are merged, as Gemini expects alternating turns).
+
+    ``update`` only converts messages appended since the previous call when the
+    new history extends the old one, i.e. it starts and continues with the same
+    message objects (ContextWindow hands out the same dicts between folds).
+    Anything else triggers a rebuild.
+    """
+
+    def __init__(self) -> None:
+        self._source: List[Dict[str, str]] = []
+        self._system_parts: List[str] = []
+        self.contents: List[Dict[str, Any]] = []
+        self.chars = 0
+        self._lock = threading.Lock()
 
-        return len(encoding.encode(text))
+    @property
+    def system_instruction(self) -> Optional[str]:
+        return "\n\n".join(self._system_parts) or None
+
+    def update(
+        self, history: Sequence[Dict[str, str]]
+    ) -> Tuple[Optional[str], List[Dict[str, Any]], int]:
+        """Sync with *history*; return ``(system_instruction, contents, chars)`` snapshots."""
+        with self._lock:
+            seen = len(self._source)
+            extends = (
+                seen
+                and len(history) >= seen
+                and history[0] is self._source[0]
+                and history[seen - 1] is self._source[-1]
+            )
+            if not extends:
+                self._source, self._system_parts, self.contents, self.chars = [], [], [], 0
+                seen = 0
+            for message in history[seen:]:
+                self._append(message)
+                self._source.append(message)
+            return self.system_instruction, list(self.contents), self.chars
+
+    def _append(self, message: Dict[str, str]) -> None:
+        role, text = message["role"], message.get("content") or ""
+        self.chars += len(text)
+        if role == "system" and not self.contents:
+            self._system_parts.append(text)
+            return
+        gemini_role = "model" if role == "assistant" else "user"
+        if self.contents and self.contents[-1]["role"] == gemini_role:
+            # New dict so previously returned snapshots stay unchanged
+            last = self.contents[-1]
+            self.contents[-1] = {"role": gemini_role, "parts": [*last["parts"], text]}
+        else:
+            self.contents.append({"role": gemini_role, "parts": [text]})
 
 
 class GeminiClientManager:
@@ -152,16 +526,30 @@ class GeminiClientManager:
         self,
         api_key: Optional[str],
         default_model_name: str = "gemini-2.5-pro-preview-05-06",
+        response_cache: Optional[ResponseCache] = None,
+        token_count_mode: Optional[str] = None,
     ):
         self.client: Optional["genai.GenerativeModel"] = None
         self.model_name: str = default_model_name
         self._available: bool = False
         self._api_key: Optional[str] = api_key  # Store api_key for re-initialization
+        # Opt-in response cache (None unless passed in or LLM_CACHE_ENABLED is set)
+        self.response_cache: Optional[ResponseCache] = (
+            response_cache if response_cache is not None else get_response_cache()
+        )
+        # Token counting: "estimate", "exact" (RPC) or "backfill" (estimate now,
+        # exact count fetched in the background and used on later calls).
+        self.token_count_mode: str = token_count_mode or config.GEMINI_TOKEN_COUNT_MODE
+        self._estimator = GeminiTokenEstimator()
+        self._exact_counts = TokenCountMemo()
+        # Structured request state, appended to turn by turn
+        self._contents = GeminiContents()
+        self._backfill = ExactCountBackfill(self._exact_counts)
 
         if api_key and GOOGLE_SDK_AVAILABLE:
             try:
-                genai.configure(api_key=api_key)
-                self.client = genai.GenerativeModel(self.model_name)
+                _configure_gemini(api_key)
+                self.client = self._pooled_model()
                 self._available = True
             except Exception as e:
                 logger.error(
@@ -212,7 +600,7 @@ class GeminiClientManager:
         # Attempt to re-initialize
         try:
             # genai.configure should have been called already
-            self.client = genai.GenerativeModel(self.model_name)
+            self.client = self._pooled_model()
             self._available = True  # Mark as available again if re-init succeeds
             logger.info(f"Gemini client re-initialized to model: {self.model_name}")
             return True
@@ -225,23 +613,38 @@ class GeminiClientManager:
             self._available = False  # Mark as unavailable on failure
             return False
 
-    def _format_history_for_gemini(self, history: List[Dict[str, str]]) -> str:
-        prompt_parts = []
-        for message in history:
-            role = message["role"]
-            content = message["content"]
-            if role == "system":
-                # Gemini doesn't have a direct "system" role in the same way as OpenAI for its basic text API.
-                # Prepend system message content, or integrate it into the first user message if appropriate.
-                # For now, let's just add it as a preamble.
-                prompt_parts.append(f"System Information: {content}")
-            elif role == "user":
-                prompt_parts.append(f"User: {content}")
-            elif role == "assistant":
-                prompt_parts.append(f"Assistant: {content}")
-        # The final "Assistant:" turn is usually added by the calling code before sending to Gemini
-        # to prompt its response. Here we just concatenate the history.
-        return "\n\n".join(prompt_parts)
+    def _pooled_model(self, system_instruction: Optional[str] = None) -> Any:
+        """GenerativeModel for this model and *system_instruction*, shared process-wide."""
+
+        def build() -> Any:
+            if system_instruction:
+                return genai.GenerativeModel(self.model_name, system_instruction=system_instruction)
+            return genai.GenerativeModel(self.model_name)
+
+        return shared_client(
+            "gemini", self.model_name, self._api_key, build, system_instruction or None
+        )
+
+    def _model_for(self, system_instruction: Optional[str]) -> Any:
+        """Return a GenerativeModel carrying *system_instruction* (fixed at construction)."""
+        if not system_instruction:
+            return self.client
+        return self._pooled_model(system_instruction)
+
+    def _build_request(self, history: List[Dict[str, str]]) -> Tuple[Any, List[Dict[str, Any]], int]:
+        """Return ``(model, contents, prompt_chars)`` for *history*.
+
+        Clients other than a real ``GenerativeModel`` (e.g. test doubles) cannot
+        take a system instruction, so it is sent as a leading user turn instead.
+        """
+        system_instruction, contents, chars = self._contents.update(history)
+        if GOOGLE_SDK_AVAILABLE and isinstance(self.client, genai.GenerativeModel):
+            return self._model_for(system_instruction), contents or [
+                {"role": "user", "parts": [system_instruction or ""]}
+            ], chars
+        if system_instruction:
+            contents = [{"role": "user", "parts": [system_instruction]}] + contents
+        return self.client, contents, chars
 
     def generate_response(self, history: List[Dict[str, str]]) -> str:
         if not self.available:
@@ -249,89 +652,231 @@ class GeminiClientManager:
         if not self.client:
             return "⚠️ Gemini client is None, though manager reported as available."
 
-        # Construct the prompt from history
-        # Gemini's basic generate_content often takes a single string prompt.
-        # The history needs to be formatted appropriately.
-        # The ChatSession used to append "Assistant:" to the prompt. Let's ensure the manager gets the raw history.
-
-        prompt_string = self._format_history_for_gemini(history)
-        # Add the final "Assistant:" to cue the model, if this is standard practice for the version of SDK/API.
-        # Based on original ChatSession, it added "Assistant:" to a manually constructed prompt string.
-        # So, if the _format_history_for_gemini doesn't add a trailing Assistant part based on last role,
-        # it might be needed here or assumed to be part of the last user message content for the API.
-        # For now, assuming formatted_prompt is ready.
-        # The existing ChatSession logic for Gemini:
-        # prompt = ""
-        # for msg in self.gemini_history: ... prompt += f"Role: {content}\n"
-        # prompt += "Assistant:"
-        # So, the calling code (ChatSession) should ensure the history is appropriate,
-        # or this manager should fully take over prompt construction including the final cue.
-        # Let's refine _format_history_for_gemini to produce the full prompt string.
-
-        # Re-evaluating gemini prompt construction.
-        # The `genai.GenerativeModel(model_name)` can often handle chat history directly
-        # with `start_chat(history=...)` and then `send_message()`.
-        # Or, `generate_content` can take a list of `glm.Content` objects.
-        # Let's adapt to use the list of dicts more directly if the SDK supports it well.
-        # For now, sticking to reconstructing the string prompt as per original ChatSession logic for minimal change.
-
-        full_prompt = (
-            prompt_string + "\n\nAssistant:"
-        )  # Mimicking original ChatSession prompt construction
+        cache_key, cached = _cache_lookup(
+            self.response_cache, "gemini", self.model_name, history
+        )
+        if cached is not None:
+            return cached
+
+        model, contents, prompt_chars = self._build_request(history)
+        limiter = get_rate_limiter("gemini", self.model_name)
+        estimated = estimate_request_tokens(history)
+
+        def _send():
+            with timed_call("gemini", self.model_name) as timer:
+                response = model.generate_content(contents)
+                # Ensure response.text is the correct way to access content.
+                # Original code used response.text; it raises on blocked responses.
+                text = response.text
+                timer.finish(_completion_tokens(getattr(response, "usage_metadata", None), text))
+                return response, text
 
         try:
-            response = self.client.generate_content(full_prompt)
-            # Ensure response.text is the correct way to access content.
-            # Original code used response.text
-            # -------------------------------------------------------------
-            # Token accounting (Gemini) – use SDK-provided count if possible
-            # else estimate via word/token count helper.
-            # -------------------------------------------------------------
-            try:
-                tokens_used = 0
-                if hasattr(response, "usage_metadata") and getattr(
-                    response, "usage_metadata", None
-                ) is not None:
-                    usage_md = response.usage_metadata
-                    if hasattr(usage_md, "total_tokens") and usage_md.total_tokens:
-                        tokens_used = usage_md.total_tokens  # type: ignore[attr-defined]
-                if tokens_used == 0:
-                    # Estimate: prompt + response tokens
-                    tokens_used = self.count_tokens(full_prompt)
-                    tokens_used += self.count_tokens(response.text)
-                if tokens_used:
-                    UsageLogger.inc("gemini", tokens_used)
-            except Exception as e_tok:
-                logger.debug(f"Unable to determine Gemini token usage: {e_tok}")
-
-            return response.text
-        except Exception as e:
-            logger.error(f"Error communicating with Gemini: {e}", exc_info=True)
-            return f"Error communicating with Gemini: {e}"
+            # One reservation for the whole retry loop, settled once below
+            with limiter.acquire(estimated):
+                response, answer = call_with_retries("gemini", _send)
+        except LLMCallError as e:
+            logger.error(str(e), exc_info=True)
+            raise
+        tokens = self._record_usage(
+            getattr(response, "usage_metadata", None), prompt_chars, answer
+        )
+        limiter.settle(estimated, tokens)
+        _cache_store(self.response_cache, cache_key, answer, tokens)
+        return answer
+
+    async def agenerate_response(self, history: List[Dict[str, str]]) -> str:
+        """Asyncio counterpart of :meth:`generate_response` (``generate_content_async``)."""
+        if not self.available or not self.client:
+            return "⚠️ Gemini model is not available (client not initialized or SDK missing)."
 
-    def count_tokens(self, text: str) -> int:
-        """Counts tokens in a string using the Gemini client SDK method or a fallback."""
-        if not text:
+        cache_key, cached = _cache_lookup(
+            self.response_cache, "gemini", self.model_name, history
+        )
+        if cached is not None:
+            return cached
+
+        model, contents, prompt_chars = self._build_request(history)
+        limiter = get_rate_limiter("gemini", self.model_name)
+        estimated = estimate_request_tokens(history)
+
+        async def _send():
+            with timed_call("gemini", self.model_name) as timer:
+                response = await model.generate_content_async(contents)
+                text = response.text
+                timer.finish(_completion_tokens(getattr(response, "usage_metadata", None), text))
+                return response, text
+
+        try:
+            # One reservation for the whole retry loop, settled once below
+            async with limiter.acquire_async(estimated):
+                response, answer = await acall_with_retries("gemini", _send)
+        except LLMCallError as e:
+            logger.error(str(e), exc_info=True)
+            raise
+        tokens = self._record_usage(
+            getattr(response, "usage_metadata", None), prompt_chars, answer
+        )
+        limiter.settle(estimated, tokens)
+        _cache_store(self.response_cache, cache_key, answer, tokens)
+        return answer
+
+    def generate_batch(self, input_path: str, output_path: str, **kwargs: Any) -> "batch.BatchSummary":
+        """Answer every request in a JSONL file with bounded concurrency.
+
+        The Gemini SDK has no batch endpoint, so this always runs in
+        concurrent mode. See :mod:`src.llm.batch`.
+        """
+        kwargs.pop("mode", None)
+        return batch.run_batch(self, input_path, output_path, **kwargs)
+
+    def stream_response(self, history: List[Dict[str, str]]) -> Generator[str, None, int]:
+        """Yield the completion for *history* as a sequence of text deltas.
+
+        Gemini attaches ``usage_metadata`` to the streamed chunks; the last one
+        seen is reported to UsageLogger once the stream is exhausted and the
+        token count is returned as the generator's return value.
+        """
+        if not self.available or not self.client:
+            yield "⚠️ Gemini model is not available (client not initialized or SDK missing)."
+            return 0
+
+        cache_key, cached = _cache_lookup(
+            self.response_cache, "gemini", self.model_name, history
+        )
+        if cached is not None:
+            yield cached
             return 0
 
-        if self.available and self.client and hasattr(self.client, "count_tokens"):
+        model, contents, prompt_chars = self._build_request(history)
+        limiter = get_rate_limiter("gemini", self.model_name)
+        estimated = estimate_request_tokens(history)
+        parts: List[str] = []
+        usage_md = None
+        # The concurrency slot is held for the whole stream
+        with limiter.acquire(estimated), timed_call("gemini", self.model_name) as timer:
+            stream = call_with_retries(
+                "gemini", lambda: model.generate_content(contents, stream=True)
+            )
+            _abort_on_cancel(stream)
             try:
-                # Assuming self.client is the GenerativeModel instance
-                token_count_response = self.client.count_tokens(text)
-                return token_count_response.total_tokens
+                for chunk in stream:
+                    if getattr(chunk, "usage_metadata", None) is not None:
+                        usage_md = chunk.usage_metadata
+                    try:
+                        delta = chunk.text
+                    except ValueError:
+                        # Chunks without text parts (e.g. safety metadata only)
+                        continue
+                    if delta:
+                        timer.first_token()
+                        parts.append(delta)
+                        yield delta
             except Exception as e:
-                logger.warning(
-                    f"Error using Gemini SDK count_tokens for model {self.model_name}: {e}. Using word count."
-                )
-                return len(text.split())  # Fallback on error
-        else:
+                _raise_stream_error("gemini", e)
+            timer.finish(_completion_tokens(usage_md, "".join(parts)))
+        answer = "".join(parts)
+        tokens = self._record_usage(usage_md, prompt_chars, answer)
+        limiter.settle(estimated, tokens)
+        _cache_store(self.response_cache, cache_key, answer, tokens)
+        return tokens
+
+    def _record_usage(self, usage_md: Any, prompt_chars: int, answer: str) -> int:
+        """Token accounting (Gemini) – use SDK-provided count if possible
+        else estimate via word/token count helper.  Returns tokens recorded.
+        """
+        tokens_used = 0
+        try:
+            if usage_md is not None:
+                if hasattr(usage_md, "total_tokens") and usage_md.total_tokens:
+                    tokens_used = usage_md.total_tokens
+                elif (
+                    hasattr(usage_md, "total_token_count")
+                    and usage_md.total_token_count
+                ):
+                    tokens_used = usage_md.total_token_count
+                # Every real response doubles as a free calibration sample
+                prompt_tokens = getattr(usage_md, "prompt_token_count", 0)
+                if isinstance(prompt_tokens, int):
+                    self._estimator.calibrate(prompt_chars, prompt_tokens)
+                    cached = getattr(usage_md, "cached_content_token_count", None)
+                    UsageLogger.record_prompt_tokens(
+                        "gemini",
+                        self.model_name,
+                        prompt_tokens,
+                        cached if isinstance(cached, int) else 0,
+                    )
+            if tokens_used == 0:
+                # Estimate: prompt + response tokens
+                tokens_used = round(prompt_chars / self._estimator.chars_per_token)
+                tokens_used += self.count_tokens(answer, mode=MODE_ESTIMATE)
+            if tokens_used:
+                UsageLogger.inc("gemini", tokens_used)
+        except Exception as e_tok:
+            logger.debug(f"Unable to determine Gemini token usage: {e_tok}")
+        return tokens_used
+
+    def count_tokens(self, text: str, mode: Optional[str] = None) -> int:
+        """Counts tokens in a string; see :meth:`count_tokens_many` for *mode*."""
+        if not text:
+            return 0
+        return self.count_tokens_many([text], mode=mode)[0]
+
+    def count_tokens_many(
+        self, texts: Sequence[str], mode: Optional[str] = None
+    ) -> List[int]:
+        """Counts tokens for each string in *texts* (same order).
+
+        mode (defaults to ``self.token_count_mode``):
+            "estimate" – local calibrated estimate, no network.
+            "exact"    – ``GenerativeModel.count_tokens`` RPC per uncached text.
+            "backfill" – estimate now; exact counts are fetched on a background
+                         thread and returned by later calls once available.
+        Exact counts are memoized per model and text.
+        """
+        mode = mode or self.token_count_mode
+        if not (self.available and self.client and hasattr(self.client, "count_tokens")):
             # Fallback if client is not available or doesn't have count_tokens method
             if not self.available or not self.client:
                 logger.warning(
                     f"Warning: Gemini client for model {self.model_name} not available for token counting. Using word count."
                 )
-            elif not hasattr(self.client, "count_tokens"):
+            else:
                 logger.warning(
                     f"Warning: Gemini client for model {self.model_name} does not have count_tokens method. Using word count."
                 )
-            return len(text.split())
+            return [len(t.split()) if t else 0 for t in texts]
+
+        counts: List[int] = []
+        for text in texts:
+            if not text:
+                counts.append(0)
+                continue
+            exact = self._exact_counts.get(self.model_name, text)
+            if exact is not None:
+                counts.append(exact)
+            elif mode == MODE_EXACT:
+                counts.append(self._count_tokens_exact(text))
+            else:
+                if mode == MODE_BACKFILL:
+                    self._backfill.submit(
+                        self.model_name, text, self._count_tokens_exact
+                    )
+                elif mode != MODE_ESTIMATE:
+                    logger.warning(f"Unknown token count mode '{mode}'. Estimating.")
+                counts.append(self._estimator.estimate(text))
+        return counts
+
+    def _count_tokens_exact(self, text: str) -> int:
+        """One ``count_tokens`` RPC; memoizes the result and calibrates the estimator."""
+        try:
+            # Assuming self.client is the GenerativeModel instance
+            total = self.client.count_tokens(text).total_tokens
+        except Exception as e:
+            logger.warning(
+                f"Error using Gemini SDK count_tokens for model {self.model_name}: {e}. Using word count."
+            )
+            return len(text.split())  # Fallback on error
+        self._exact_counts.put(self.model_name, text, total)
+        self._estimator.calibrate(len(text), total)
+        return total
@@ -1,93 +1,543 @@
 """
-collaboration.py - Optional module to facilitate Agents-to-Agents collaboration between OpenAI and Gemini.
-If both models are available, this module orchestrates a dialogue loop and returns a combined answer.
+collaboration.py - Multi-agent, multi-round collaboration between LLM client managers.
+
+Every agent (a client manager using its own configured model) first drafts an
+answer independently. All drafts run in parallel. In each following round,
+every agent sees the other agents' latest answers and replies with a revised
+answer. Those revisions also run in parallel, and a round starts as soon as the
+previous one's last answer arrives.
+
+Rounds stop early once the answers converge. That happens when every pair of
+latest answers is at least ``convergence`` similar, or when no agent changed its
+answer. A simple question therefore finishes after one parallel drafting round.
+The final answer is the lead (first) agent's latest answer, which has already
+taken the others into account.
+
+The round logic (:meth:`Collaboration._rounds`) only produces requests and
+consumes results. :meth:`Collaboration.run` drives it with blocking calls on a
+thread pool and :meth:`Collaboration.arun` with ``agenerate_response``.
+
+:meth:`Collaboration.stream` drives it with ``stream_response`` and reports a
+live transcript through :class:`CollabEvent` callbacks. Rounds also overlap
+there. Once an agent has finished its draft and every peer still writing has
+produced ``LLM_COLLAB_SPECULATE_CHARS`` characters, its revision starts on the
+partial drafts. When the round completes, that speculative revision is kept if
+it saw at least ``LLM_COLLAB_SPECULATE_ACCEPT`` of each peer's final answer.
+Otherwise it is restarted with the full answers. It is cancelled outright if the
+round converged.
 """
 
+import difflib
 import logging
-from typing import Any
+import queue
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, Generator, List, Optional, Sequence, Tuple
 
-# Assuming OPENAI_API_KEY and GOOGLE_API_KEY are managed by the calling environment (e.g. via ChatSession using config.py)
-# Also assuming the client objects passed in are already initialized instances.
-# For type hinting, we might need to import the client types if they are not just 'Any'
-# from openai import OpenAI # Example for type hint
-# from google.generativeai.generative_models import GenerativeModel # Example for type hint
+from src import config
+from src.llm.fanout import afan_out_call, fan_out_call
+from src.llm.resilience import LLMCallError
 
 logger = logging.getLogger(__name__)
 
+Messages = List[Dict[str, str]]
 
-def run(user_message: str, openai_client: Any, gemini_client: Any) -> str:
-    """
-    Run a collaborative dialogue between OpenAI (Agent A) and Google Gemini (Agent B) on the given user_message.
-    Returns the final answer after agents' interaction.
-    openai_client: An initialized OpenAI client instance (e.g., from OpenAIClientManager.client).
-    gemini_client: An initialized Google Generative AI model client instance (e.g., from GeminiClientManager.client).
+REVISION_PROMPT = (
+    "Other assistants answered the same request. Their latest answers follow.\n\n"
+    "{peers}\n\n"
+    "Check their answers against yours. Keep what is correct, fix mistakes, and add "
+    "anything important that is missing. Reply with your improved final answer only."
+)
+
+# Appended to a peer draft that a speculative revision saw before it was finished
+DRAFT_MARKER = "\n[... this answer was still being written]"
+
+
+@dataclass
+class CollabAgent:
+    """One participant: a name (e.g. "openai") and the client manager that answers for it."""
+
+    name: str
+    manager: Any
+
+
+@dataclass
+class CollabTurn:
+    round: int  # 1 = independent drafts
+    agent: str
+    text: str
+    seconds: Optional[float] = None  # Streaming only: request start to last delta
+    ttft: Optional[float] = None  # Streaming only: request start to first delta
+    speculative: bool = False  # Started on partial peer drafts and kept
+
+
+@dataclass
+class CollaborationResult:
+    answer: str
+    rounds: int
+    converged: bool
+    transcript: List[CollabTurn] = field(default_factory=list)
+    # Wall time of each round, measured from the end of the previous one
+    round_seconds: List[float] = field(default_factory=list)
+    elapsed_sec: float = 0.0
+
+
+@dataclass
+class CollabEvent:
+    """One step of a streamed collaboration, as passed to ``on_event``.
+
+    ``kind`` is "start" (an agent's answer begins), "delta" (``text`` is the next
+    piece of it), "end" (``text`` holds the error if the agent failed) or
+    "round" (the round finished after ``seconds``; ``speculative`` of its
+    answers were started early).
     """
-    logger.info(
-        f"Starting A2A collaboration for user message: '{user_message[:50]}...'"
-    )
-    if openai_client is None or gemini_client is None:
-        logger.error(
-            "A2A collaboration error: Both OpenAI and Gemini clients must be provided."
-        )
-        return "Error: Both OpenAI and Gemini clients must be initialized for A2A collaboration."
 
-    question = user_message
-    openai_answer = ""
-    gemini_feedback = ""
+    kind: str
+    round: int
+    agent: Optional[str] = None
+    text: str = ""
+    seconds: Optional[float] = None
+    speculative: int = 0
 
-    # Round 1: Agent A (OpenAI) gives initial answer
-    try:
-        logger.debug("A2A Round 1: OpenAI generating initial answer.")
-        response = openai_client.chat.completions.create(
-            model="gpt-4.1",  # Consider making this configurable
-            messages=[{"role": "user", "content": question}],
-        )
-        openai_answer = response.choices[0].message.content
-        logger.debug(f"A2A Round 1: OpenAI initial answer: '{openai_answer[:100]}...'")
-    except Exception as e:
-        logger.error(f"A2A Error from OpenAI agent (Round 1): {e}", exc_info=True)
-        return f"Error from OpenAI agent: {e}"
-
-    # Round 2: Agent B (Gemini) provides critique or additional insight
-    try:
-        logger.debug("A2A Round 2: Gemini generating feedback.")
-        critique_prompt = (
-            f"User's question: {question}\n"
-            f"Agent A's answer: {openai_answer}\n"
-            "Agent B, provide your feedback or improvements to Agent A's answer."
+
+def format_event(event: CollabEvent) -> str:
+    """Render an event as plain transcript text (for terminals and chat views)."""
+    if event.kind == "start":
+        return f"\n[Round {event.round} · {event.agent}]\n"
+    if event.kind == "delta":
+        return event.text
+    if event.kind == "end":
+        return f"\n⚠️ {event.agent} dropped out: {event.text}\n" if event.text else "\n"
+    if event.kind == "round":
+        early = f", {event.speculative} revision(s) started early" if event.speculative else ""
+        return f"⏱ Round {event.round}: {event.seconds:.1f}s{early}\n"
+    return ""
+
+
+def similarity(a: str, b: str) -> float:
+    """Word-level similarity of two answers in [0, 1], ignoring case and whitespace."""
+    words_a = re.findall(r"\w+", a.lower())
+    words_b = re.findall(r"\w+", b.lower())
+    if not words_a and not words_b:
+        return 1.0
+    return difflib.SequenceMatcher(None, words_a, words_b, autojunk=False).ratio()
+
+
+def _min_pairwise(answers: Sequence[str]) -> float:
+    scores = [
+        similarity(a, b) for i, a in enumerate(answers) for b in answers[i + 1:]
+    ]
+    return min(scores) if scores else 1.0
+
+
+# Requests for one round: [(agent, messages)]; results: {agent name: answer or exception}
+_Round = List[Tuple[CollabAgent, Messages]]
+_RoundDriver = Generator[_Round, Dict[str, Any], CollaborationResult]
+
+
+class Collaboration:
+    """N agents, up to ``max_rounds`` rounds, with early exit on convergence."""
+
+    def __init__(
+        self,
+        agents: Sequence[CollabAgent],
+        max_rounds: Optional[int] = None,
+        convergence: Optional[float] = None,
+    ):
+        if not agents:
+            raise ValueError("Collaboration needs at least one agent")
+        self.agents = list(agents)
+        self.max_rounds = max(1, max_rounds or config.LLM_COLLAB_MAX_ROUNDS)
+        self.convergence = (
+            config.LLM_COLLAB_CONVERGENCE if convergence is None else convergence
         )
-        gemini_response = gemini_client.generate_content(critique_prompt)
-        gemini_feedback = gemini_response.text
-        logger.debug(f"A2A Round 2: Gemini feedback: '{gemini_feedback[:100]}...'")
-    except Exception as e:
-        logger.error(f"A2A Error from Gemini agent (Round 2): {e}", exc_info=True)
-        return f"Error from Gemini agent: {e}"
-
-    # Round 3: Agent A (OpenAI) refines answer based on Agent B's feedback
-    try:
-        logger.debug("A2A Round 3: OpenAI refining answer.")
-        refine_messages = [
-            {
-                "role": "system",
-                "content": "You are Agent A. Another agent (Agent B) has given feedback on your answer.",
-            },
-            {
-                "role": "user",
-                "content": f"Question: {question}\nYour original answer: {openai_answer}\nAgent B's feedback: {gemini_feedback}\nPlease provide an improved final answer.",
-            },
-        ]
-        final_response = openai_client.chat.completions.create(
-            model="gpt-4.1",  # Consider making this configurable
-            messages=refine_messages,
+
+    def run(self, messages: Messages) -> CollaborationResult:
+        """Collaborate on *messages* (a conversation ending with the user's request)."""
+        driver = self._rounds(messages)
+        requests = next(driver)
+        start = round_start = time.perf_counter()
+        round_seconds: List[float] = []
+        while True:
+            results = fan_out_call(
+                [
+                    (agent.name, partial(agent.manager.generate_response, msgs))
+                    for agent, msgs in requests
+                ]
+            )
+            round_seconds.append(time.perf_counter() - round_start)
+            round_start = time.perf_counter()
+            try:
+                requests = driver.send(results)
+            except StopIteration as stop:
+                return _timed(stop.value, round_seconds, start)
+
+    async def arun(self, messages: Messages) -> CollaborationResult:
+        """Asyncio counterpart of :meth:`run`."""
+        driver = self._rounds(messages)
+        requests = next(driver)
+        start = round_start = time.perf_counter()
+        round_seconds: List[float] = []
+        while True:
+            results = await afan_out_call(
+                [
+                    (agent.name, partial(agent.manager.agenerate_response, msgs))
+                    for agent, msgs in requests
+                ]
+            )
+            round_seconds.append(time.perf_counter() - round_start)
+            round_start = time.perf_counter()
+            try:
+                requests = driver.send(results)
+            except StopIteration as stop:
+                return _timed(stop.value, round_seconds, start)
+
+    def stream(
+        self, messages: Messages, on_event: Callable[[CollabEvent], None]
+    ) -> CollaborationResult:
+        """Like :meth:`run`, but stream every answer and overlap rounds speculatively.
+
+        *on_event* is only ever called from the calling thread. Answers of one
+        round are relayed one agent at a time, in order of their first delta, and
+        a round's answers are only relayed once the round before it completed.
+        """
+        return _StreamingRun(self, messages, on_event).run()
+
+    def _rounds(self, messages: Messages) -> _RoundDriver:
+        transcript: List[CollabTurn] = []
+        active = list(self.agents)
+        latest: Dict[str, str] = {}
+        converged = False
+        round_no = 0
+
+        while round_no < self.max_rounds and active:
+            round_no += 1
+            if round_no == 1:
+                requests = [(agent, messages) for agent in active]
+            else:
+                requests = [(agent, self._revision_messages(messages, agent, latest)) for agent in active]
+            logger.debug(f"Collaboration round {round_no}: {[a.name for a in active]}")
+            results = yield requests
+
+            previous = dict(latest)
+            survivors = []
+            first_error: Optional[Exception] = None
+            for agent in active:
+                result = results[agent.name]
+                if isinstance(result, LLMCallError):
+                    # A failing agent drops out; the others carry on without it
+                    logger.warning(f"Collaboration agent {agent.name} failed in round {round_no}: {result}")
+                    first_error = first_error or result
+                    continue
+                if isinstance(result, Exception):
+                    raise result
+                latest[agent.name] = result
+                transcript.append(CollabTurn(round_no, agent.name, result))
+                survivors.append(agent)
+            active = survivors
+            if not active:
+                if not latest:
+                    raise first_error  # type: ignore[misc]
+                break
+
+            if len(active) == 1:
+                break  # Nobody left to collaborate with
+            if _min_pairwise([latest[a.name] for a in active]) >= self.convergence:
+                converged = True
+                break
+            if previous and all(
+                a.name in previous and similarity(previous[a.name], latest[a.name]) >= self.convergence
+                for a in active
+            ):
+                converged = True  # Nobody changed their mind; further rounds would not help
+                break
+
+        # Prefer an agent that is still active, so the answer reflects the last round
+        lead = next((a for a in active), None) or next(
+            (a for a in self.agents if a.name in latest), None
         )
-        final_answer = final_response.choices[0].message.content
+        answer = latest[lead.name] if lead else ""
         logger.info(
-            f"A2A collaboration completed. Final answer: '{final_answer[:100]}...'"
+            f"Collaboration finished after {round_no} round(s) "
+            f"({'converged' if converged else 'round limit'}) with {len(active)} agent(s)"
         )
-    except Exception as e:
-        logger.error(
-            f"A2A Error during answer refinement (Round 3): {e}", exc_info=True
+        return CollaborationResult(answer, round_no, converged, transcript)
+
+    def _revision_messages(self, messages: Messages, agent: CollabAgent, latest: Dict[str, str]) -> Messages:
+        peers = "\n\n".join(
+            f"[{name}]\n{text}" for name, text in latest.items() if name != agent.name
+        )
+        return messages + [
+            {"role": "assistant", "content": latest[agent.name]},
+            {"role": "user", "content": REVISION_PROMPT.format(peers=peers)},
+        ]
+
+
+def _timed(result: CollaborationResult, round_seconds: List[float], start: float) -> CollaborationResult:
+    result.round_seconds = round_seconds
+    result.elapsed_sec = time.perf_counter() - start
+    return result
+
+
+_DONE = object()
+
+
+class _Job:
+    """One agent's streamed answer for one round (possibly started speculatively)."""
+
+    def __init__(self, round_no: int, agent: CollabAgent, basis: Dict[str, int]):
+        self.round = round_no
+        self.agent = agent
+        self.basis = basis  # Peer name -> characters of its draft seen when started
+        self.parts: List[str] = []
+        self.chars = 0
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.cancel = threading.Event()
+        self.started = time.perf_counter()
+        self.first_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+
+def _first_token_time(job: _Job) -> float:
+    return job.first_at if job.first_at is not None else float("inf")
+
+
+class _StreamingRun:
+    """State of one :meth:`Collaboration.stream` call.
+
+    Pump threads only put ``(job, delta, error)`` items on a queue. Every other
+    piece of state is owned by the calling thread.
+    """
+
+    def __init__(self, collaboration: Collaboration, messages: Messages, on_event: Callable[[CollabEvent], None]):
+        self.collaboration = collaboration
+        self.messages = messages
+        self.on_event = on_event
+        self.events: "queue.Queue" = queue.Queue()
+        self.jobs: Dict[int, Dict[str, _Job]] = {}  # Round -> agent name -> current job
+        self.driver = collaboration._rounds(messages)
+        self.round_no = 0
+        self.previous: Dict[str, Any] = {}  # Final results of the last completed round
+        self.round_seconds: List[float] = []
+        self.head: Optional[_Job] = None  # Job being relayed
+        self.forwarded = 0
+        self.relayed: set = set()
+
+    def run(self) -> CollaborationResult:
+        start = self.round_start = time.perf_counter()
+        try:
+            self._start_round(next(self.driver))
+            while True:
+                job, item, error = self.events.get()
+                if job.cancel.is_set():
+                    continue  # Superseded or no longer needed
+                if item is _DONE:
+                    job.done, job.error = True, error
+                    job.finished_at = time.perf_counter()
+                    job.first_at = job.first_at or job.finished_at
+                else:
+                    job.first_at = job.first_at or time.perf_counter()
+                    job.parts.append(item)
+                    job.chars += len(item)
+                self._relay()
+                while all(j.done for j in self.jobs[self.round_no].values()):
+                    result = self._settle()
+                    if result is not None:
+                        return _timed(result, self.round_seconds, start)
+                self._speculate()
+        finally:
+            for jobs in self.jobs.values():
+                for job in jobs.values():
+                    job.cancel.set()
+
+    def _launch(self, round_no: int, agent: CollabAgent, messages: Messages, basis: Dict[str, int]) -> _Job:
+        job = _Job(round_no, agent, basis)
+        threading.Thread(
+            target=self._pump, args=(job, messages), name=f"llm-collab-{agent.name}-r{round_no}", daemon=True
+        ).start()
+        return job
+
+    def _pump(self, job: _Job, messages: Messages) -> None:
+        error: Optional[Exception] = None
+        stream = None
+        try:
+            stream = job.agent.manager.stream_response(messages)
+            for delta in stream:
+                if job.cancel.is_set():
+                    break
+                self.events.put((job, delta, None))
+        except Exception as e:
+            error = e
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()  # Releases the connection and rate-limit slot early
+            self.events.put((job, _DONE, error))
+
+    def _start_round(self, requests: "_Round") -> None:
+        self.round_no += 1
+        early = self.jobs.pop(self.round_no, {})
+        current: Dict[str, _Job] = {}
+        for agent, messages in requests:
+            job = early.pop(agent.name, None)
+            if job is not None and self._accept(job):
+                current[agent.name] = job
+                continue
+            if job is not None:
+                job.cancel.set()
+                logger.debug(f"Restarting speculative round {self.round_no} revision of {agent.name}")
+            current[agent.name] = self._launch(self.round_no, agent, messages, {})
+        for job in early.values():
+            job.cancel.set()  # Agent dropped out
+        self.jobs[self.round_no] = current
+        self.head, self.forwarded, self.relayed = None, 0, set()
+        self._relay()  # Flush what speculative jobs already produced
+
+    def _accept(self, job: _Job) -> bool:
+        """Whether a speculative revision saw enough of every peer's final answer."""
+        if job.done and job.error is not None:
+            return False
+        threshold = config.LLM_COLLAB_SPECULATE_ACCEPT
+        for peer, seen in job.basis.items():
+            final = self.previous.get(peer)
+            if not isinstance(final, str) or seen < threshold * len(final):
+                return False
+        return True
+
+    def _settle(self) -> Optional[CollaborationResult]:
+        """Feed the completed round to the round logic; start the next or finish."""
+        jobs = self.jobs[self.round_no]
+        results = {name: job.error if job.error is not None else job.text for name, job in jobs.items()}
+        now = time.perf_counter()
+        self.round_seconds.append(now - self.round_start)
+        self.round_start = now
+        self.on_event(
+            CollabEvent(
+                "round",
+                self.round_no,
+                seconds=self.round_seconds[-1],
+                speculative=sum(1 for job in jobs.values() if job.basis),
+            )
         )
-        return f"Error during answer refinement: {e}"
+        self.previous = results
+        try:
+            requests = self.driver.send(results)
+        except StopIteration as stop:
+            return self._annotate(stop.value)
+        self._start_round(requests)
+        return None
+
+    def _annotate(self, result: CollaborationResult) -> CollaborationResult:
+        for turn in result.transcript:
+            job = self.jobs[turn.round][turn.agent]
+            turn.seconds = job.finished_at - job.started if job.finished_at else None
+            turn.ttft = job.first_at - job.started if job.first_at else None
+            turn.speculative = bool(job.basis)
+        return result
+
+    def _relay(self) -> None:
+        """Forward the current round's answers, one agent at a time."""
+        jobs = self.jobs[self.round_no]
+        while True:
+            if self.head is None:
+                waiting = [
+                    job for name, job in jobs.items()
+                    if name not in self.relayed and job.first_at is not None
+                ]
+                if not waiting:
+                    return
+                self.head, self.forwarded = min(waiting, key=_first_token_time), 0
+                self.on_event(CollabEvent("start", self.round_no, self.head.agent.name))
+            head = self.head
+            for delta in head.parts[self.forwarded:]:
+                self.on_event(CollabEvent("delta", self.round_no, head.agent.name, delta))
+            self.forwarded = len(head.parts)
+            if not head.done:
+                return
+            error = str(head.error) if head.error is not None else ""
+            self.on_event(CollabEvent("end", self.round_no, head.agent.name, error))
+            self.relayed.add(head.agent.name)
+            self.head = None
+
+    def _speculate(self) -> None:
+        """Start next-round revisions for agents whose peers are far enough along."""
+        if self.round_no >= self.collaboration.max_rounds:
+            return
+        min_chars = config.LLM_COLLAB_SPECULATE_CHARS
+        if min_chars <= 0:
+            return
+        current = self.jobs[self.round_no]
+        upcoming = self.jobs.setdefault(self.round_no + 1, {})
+        for name, job in current.items():
+            if name in upcoming or not job.done or job.error is not None:
+                continue
+            latest, basis = {name: job.text}, {}
+            for peer, peer_job in current.items():
+                if peer == name or (peer_job.done and peer_job.error is not None):
+                    continue
+                if peer_job.done:
+                    latest[peer] = peer_job.text
+                elif peer_job.chars >= min_chars:
+                    latest[peer] = peer_job.text + DRAFT_MARKER
+                    basis[peer] = peer_job.chars
+                else:
+                    break
+            else:
+                if basis:
+                    logger.debug(f"Starting round {self.round_no + 1} revision of {name} on partial drafts")
+                    messages = self.collaboration._revision_messages(self.messages, job.agent, latest)
+                    upcoming[name] = self._launch(self.round_no + 1, job.agent, messages, basis)
+
+
+class _SDKAgent:
+    """Adapts a raw SDK client (the form :func:`run` took originally) to the manager interface."""
+
+    def __init__(self, client: Any, model: str) -> None:
+        self.client = client
+        self.model = model
 
-    return final_answer
+    def get_model_name(self) -> str:
+        return self.model
+
+    def generate_response(self, messages: Messages) -> str:
+        if hasattr(self.client, "chat"):  # openai.OpenAI
+            response = self.client.chat.completions.create(model=self.model, messages=messages)
+            return response.choices[0].message.content or ""
+        prompt = "\n\n".join(m["content"] for m in messages)  # genai.GenerativeModel
+        return self.client.generate_content(prompt).text
+
+
+def _as_manager(client: Any, model: str) -> Any:
+    return client if hasattr(client, "generate_response") else _SDKAgent(client, model)
+
+
+def run(
+    user_message: str,
+    openai_client: Any,
+    gemini_client: Any,
+    max_rounds: Optional[int] = None,
+) -> str:
+    """
+    Run a collaboration between OpenAI (the lead agent) and Gemini on user_message.
+    Returns the final answer after the agents' interaction.
+    Either client may be a client manager (OpenAIClientManager/GeminiClientManager,
+    using its configured model) or an initialized SDK client, as before.
+    """
+    if openai_client is None or gemini_client is None:
+        logger.error("A2A collaboration error: Both OpenAI and Gemini clients must be provided.")
+        return "Error: Both OpenAI and Gemini clients must be initialized for A2A collaboration."
+    agents = [
+        CollabAgent("openai", _as_manager(openai_client, config.DEFAULT_OPENAI_MODEL)),
+        CollabAgent("gemini", _as_manager(gemini_client, config.DEFAULT_GEMINI_MODEL)),
+    ]
+    result = Collaboration(agents, max_rounds=max_rounds).run(
+        [{"role": "user", "content": user_message}]
+    )
+    return result.answer
@@ -0,0 +1,112 @@
+"""llm.fanout
+
+Ask several providers the same question at once.
+
+:func:`fan_out_call` runs blocking calls on a thread pool. :func:`afan_out_call`
+gathers coroutines. Either way a turn takes max(latencies) rather than their sum.
+
+:func:`fan_out_stream` runs the streams concurrently but relays one answer at a
+time. The first provider to produce a token is forwarded live. The others are
+buffered and flushed, in order of their first token, as each earlier answer
+completes. Display code therefore never sees interleaved answers.
+
+Results map each provider to its answer, or to the exception its call raised.
+One provider failing never discards another provider's answer.
+"""
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Iterator, List, Sequence, Tuple, TypeVar, Union
+
+from src.llm.hedging import Attempt
+
+T = TypeVar("T")
+
+Results = Dict[str, Union[T, Exception]]
+
+_DONE = object()
+
+
+def fan_out_call(attempts: Sequence[Attempt]) -> Results:
+    """Run every ``(provider, fn)`` concurrently; return ``{provider: result or exception}``."""
+    if not attempts:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(attempts), thread_name_prefix="llm-fanout") as pool:
+        futures = {provider: pool.submit(fn) for provider, fn in attempts}
+    results: Results = {}
+    for provider, future in futures.items():
+        error = future.exception()
+        results[provider] = error if error is not None else future.result()
+    return results
+
+
+async def afan_out_call(attempts: Sequence[Tuple[str, Callable[[], Awaitable[T]]]]) -> Results:
+    """Asyncio counterpart of :func:`fan_out_call`."""
+    outcomes = await asyncio.gather(*(fn() for _provider, fn in attempts), return_exceptions=True)
+    results: Results = {}
+    for (provider, _fn), outcome in zip(attempts, outcomes):
+        if isinstance(outcome, BaseException) and not isinstance(outcome, Exception):
+            raise outcome  # Cancellation and interpreter exits are not per-provider failures
+        results[provider] = outcome
+    return results
+
+
+def fan_out_stream(
+    attempts: Sequence[Tuple[str, Callable[[], Iterator[str]]]],
+    on_delta: Callable[[str, str], None],
+) -> Results:
+    """Stream every provider concurrently, relaying deltas one answer at a time.
+
+    *on_delta* is only ever called from the calling thread. Returns
+    ``{provider: full answer or exception}``.
+    """
+    events: "queue.Queue" = queue.Queue()
+    parts: Dict[str, List[str]] = {provider: [] for provider, _fn in attempts}
+    errors: Dict[str, Exception] = {}
+
+    def _pump(provider: str, make_stream: Callable[[], Iterator[str]]) -> None:
+        try:
+            for delta in make_stream():
+                events.put((provider, delta))
+        except Exception as e:
+            errors[provider] = e
+        finally:
+            events.put((provider, _DONE))
+
+    for provider, make_stream in attempts:
+        threading.Thread(
+            target=_pump, args=(provider, make_stream), name=f"llm-fanout-{provider}", daemon=True
+        ).start()
+
+    order: List[str] = []  # Providers in order of their first delta
+    forwarded: Dict[str, int] = {}
+    finished = set()
+    running = len(attempts)
+    while running:
+        provider, item = events.get()
+        if item is _DONE:
+            running -= 1
+            finished.add(provider)
+        else:
+            if provider not in forwarded:
+                order.append(provider)
+                forwarded[provider] = 0
+            parts[provider].append(item)
+        # Relay the head answer; once it is complete, flush the next one's backlog
+        while order:
+            head = order[0]
+            backlog = parts[head][forwarded[head]:]
+            for delta in backlog:
+                on_delta(head, delta)
+            forwarded[head] += len(backlog)
+            if head not in finished:
+                break
+            order.pop(0)
+
+    return {
+        provider: errors[provider] if provider in errors else "".join(parts[provider])
+        for provider, _fn in attempts
+    }
@@ -0,0 +1,333 @@
+"""llm.hedging
+
+Hedged requests across providers.
+
+The primary provider is called first. If it has not answered (or, for streams,
+produced its first token) within its observed latency percentile, the same
+request is also sent to the secondary provider. The first successful answer
+wins and the other call is cancelled. A primary that fails outright hands over
+to the secondary immediately (failover).
+
+Latencies are tracked per provider in a small rolling window. Until enough
+samples exist, ``config.LLM_HEDGE_DEFAULT_DELAY_SEC`` is used.
+
+A streaming loser is usually blocked reading its HTTP response, so a stream
+registers how to abort that response with :func:`on_cancel`, and
+:func:`hedged_stream` calls it as soon as the winner is chosen.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# (provider, zero-argument callable) pairs handed to the hedging helpers
+Attempt = Tuple[str, Callable[[], T]]
+
+
+class LatencyTracker:
+    """Rolling window of call latencies per key (e.g. ``"openai"`` or ``"openai:ttft"``)."""
+
+    def __init__(self, window: int = 200) -> None:
+        self._window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self._window)
+            samples.append(seconds)
+
+    def percentile(self, key: str, pct: float, min_samples: int = 1) -> Optional[float]:
+        """Nearest-rank percentile, or None with fewer than *min_samples* samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if not samples or len(samples) < min_samples:
+            return None
+        rank = max(1, math.ceil(pct / 100.0 * len(samples)))
+        return samples[rank - 1]
+
+    def hedge_delay(self, key: str) -> float:
+        """Seconds to wait on *key* before sending the hedge."""
+        delay = self.percentile(
+            key, config.LLM_HEDGE_PERCENTILE, min_samples=config.LLM_HEDGE_MIN_SAMPLES
+        )
+        if delay is None:
+            delay = config.LLM_HEDGE_DEFAULT_DELAY_SEC
+        return max(delay, config.LLM_HEDGE_MIN_DELAY_SEC)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+_tracker = LatencyTracker()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Return the process-wide latency tracker used for hedge delays."""
+    return _tracker
+
+
+def hedged_call(
+    primary: Attempt,
+    secondary: Attempt,
+    delay: Optional[float] = None,
+    tracker: Optional[LatencyTracker] = None,
+) -> Tuple[str, T]:
+    """Run *primary*, hedging with *secondary* after *delay*; return ``(provider, result)``.
+
+    Blocking calls cannot be interrupted, so the losing call is abandoned: its
+    result is discarded and its worker thread exits when the provider returns.
+    """
+    tracker = tracker or _tracker
+    if delay is None:
+        delay = tracker.hedge_delay(primary[0])
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="llm-hedge")
+    started: Dict[Future, Tuple[str, float]] = {}
+
+    def _start(attempt: Attempt) -> None:
+        started[executor.submit(attempt[1])] = (attempt[0], time.monotonic())
+
+    try:
+        _start(primary)
+        done, _pending = wait(started, timeout=delay)
+        if not done:
+            logger.info(f"{primary[0]} slower than {delay:.2f}s; hedging with {secondary[0]}")
+            _start(secondary)
+        first_error: Optional[BaseException] = None
+        pending = set(started)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider, t0 = started[future]
+                error = future.exception()
+                if error is None:
+                    tracker.observe(provider, time.monotonic() - t0)
+                    for other in pending:
+                        other.cancel()
+                    return provider, future.result()
+                logger.warning(f"Hedged call to {provider} failed: {error}")
+                first_error = first_error or error
+            if not pending and len(started) == 1:
+                _start(secondary)  # Primary failed before the hedge fired: fail over
+                pending = {f for f in started if not f.done()}
+        raise first_error  # type: ignore[misc]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def ahedged_call(
+    primary: Tuple[str, Callable[[], Awaitable[T]]],
+    secondary: Tuple[str, Callable[[], Awaitable[T]]],
+    delay: Optional[float] = None,
+    tracker: Optional[LatencyTracker] = None,
+) -> Tuple[str, T]:
+    """Asyncio counterpart of :func:`hedged_call`; the losing task is cancelled."""
+    tracker = tracker or _tracker
+    if delay is None:
+        delay = tracker.hedge_delay(primary[0])
+    started: Dict[asyncio.Task, Tuple[str, float]] = {}
+
+    def _start(attempt) -> None:
+        started[asyncio.ensure_future(attempt[1]())] = (attempt[0], time.monotonic())
+
+    _start(primary)
+    try:
+        done, _pending = await asyncio.wait(set(started), timeout=delay)
+        if not done:
+            logger.info(f"{primary[0]} slower than {delay:.2f}s; hedging with {secondary[0]}")
+            _start(secondary)
+        first_error: Optional[BaseException] = None
+        pending = set(started)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                provider, t0 = started[task]
+                error = task.exception()
+                if error is None:
+                    tracker.observe(provider, time.monotonic() - t0)
+                    return provider, task.result()
+                logger.warning(f"Hedged call to {provider} failed: {error}")
+                first_error = first_error or error
+            if not pending and len(started) == 1:
+                _start(secondary)
+                pending = {t for t in started if not t.done()}
+        raise first_error  # type: ignore[misc]
+    finally:
+        for task in started:
+            if not task.done():
+                task.cancel()
+
+
+_DONE = object()
+
+
+class _Cancellation:
+    """Cancel flag of one hedged stream attempt, plus callbacks that abort its I/O."""
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def add(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        _run_abort(callback)  # Cancelled while the stream was opening
+
+    def set(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            _run_abort(callback)
+
+
+def _run_abort(callback: Callable[[], None]) -> None:
+    try:
+        callback()
+    except Exception as e:
+        logger.debug(f"Aborting a cancelled hedged stream failed: {e}")
+
+
+_attempt = threading.local()
+
+
+def on_cancel(callback: Callable[[], None]) -> None:
+    """Call *callback* from another thread if the current hedged stream attempt loses.
+
+    Streams call this once their provider response is open, passing something
+    that closes it (e.g. the SDK stream's ``close``). Outside a hedged stream
+    it does nothing.
+    """
+    cancellation = getattr(_attempt, "cancellation", None)
+    if cancellation is not None:
+        cancellation.add(callback)
+
+
+def attempt_cancelled() -> bool:
+    """Whether the current hedged stream attempt has lost (always False outside one)."""
+    cancellation = getattr(_attempt, "cancellation", None)
+    return cancellation is not None and cancellation.is_set()
+
+
+def _pump(
+    provider: str,
+    make_stream: Callable[[], Iterator[str]],
+    events: "queue.Queue",
+    cancelled: _Cancellation,
+) -> None:
+    """Forward one provider's deltas onto *events* until done or cancelled."""
+    stream = None
+    _attempt.cancellation = cancelled
+    try:
+        stream = make_stream()
+        for delta in stream:
+            if cancelled.is_set():
+                break
+            events.put((provider, delta, None))
+        events.put((provider, _DONE, None))
+    except Exception as e:
+        events.put((provider, _DONE, e))
+    finally:
+        _attempt.cancellation = None
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()  # Releases the limiter slot / HTTP stream of a cancelled loser
+
+
+def hedged_stream(
+    primary: Attempt,
+    secondary: Attempt,
+    delay: Optional[float] = None,
+    tracker: Optional[LatencyTracker] = None,
+) -> Iterator[Tuple[str, str]]:
+    """Stream ``(provider, delta)`` pairs from whichever provider produces a token first.
+
+    The hedge fires when *primary* has not yielded its first delta within
+    *delay* (default: the primary's time-to-first-token percentile). Once a
+    winner emits its first delta the other stream is cancelled, and whatever it
+    registered with :func:`on_cancel` is called right away. Errors after the
+    winner started streaming are raised to the caller.
+    """
+    tracker = tracker or _tracker
+    if delay is None:
+        delay = tracker.hedge_delay(f"{primary[0]}:ttft")
+    events: "queue.Queue" = queue.Queue()
+    cancels: Dict[str, _Cancellation] = {}
+    starts: Dict[str, float] = {}
+
+    def _start(attempt: Attempt) -> None:
+        cancels[attempt[0]] = _Cancellation()
+        starts[attempt[0]] = time.monotonic()
+        threading.Thread(
+            target=_pump,
+            args=(attempt[0], attempt[1], events, cancels[attempt[0]]),
+            name=f"llm-hedge-{attempt[0]}",
+            daemon=True,
+        ).start()
+
+    _start(primary)
+    winner: Optional[str] = None
+    first_error: Optional[BaseException] = None
+    running = 1
+    try:
+        while True:
+            timeout = delay if winner is None and len(starts) == 1 else None  # Only before the first token
+            try:
+                provider, item, error = events.get(timeout=timeout)
+            except queue.Empty:
+                logger.info(f"{primary[0]} first token slower than {delay:.2f}s; hedging with {secondary[0]}")
+                _start(secondary)
+                running += 1
+                continue
+            if winner is None:
+                if error is not None:
+                    logger.warning(f"Hedged stream from {provider} failed: {error}")
+                    first_error = first_error or error
+                    running -= 1
+                    if len(starts) == 1:
+                        _start(secondary)  # Fail over straight away
+                        running += 1
+                    elif running == 0:
+                        raise first_error
+                    continue
+                winner = provider
+                tracker.observe(f"{provider}:ttft", time.monotonic() - starts[provider])
+                for other, event in cancels.items():
+                    if other != winner:
+                        event.set()
+                if item is _DONE:
+                    return  # Winner finished without producing any text
+            if provider != winner:
+                continue  # Late output from the cancelled loser
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield provider, item
+    finally:
+        for event in cancels.values():
+            event.set()
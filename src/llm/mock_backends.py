@@ -0,0 +1,338 @@
+"""llm.mock_backends
+
+Deterministic stand-ins for the LLM providers, for offline benchmarks and tests.
+
+* :class:`MockOpenAIServer` – an OpenAI-compatible ``/v1/chat/completions``
+  HTTP server (JSON and SSE streaming, including the ``include_usage`` chunk).
+  Point a manager at it with ``OpenAIClientManager(api_key="mock",
+  base_url=server.base_url)`` or by setting ``OPENAI_BASE_URL``.
+* :class:`MockGenerativeModel` – a drop-in for ``genai.GenerativeModel``
+  (``generate_content``, ``generate_content_async``, ``count_tokens``);
+  :func:`use_mock_gemini` installs one on a :class:`GeminiClientManager`.
+
+Both are driven by a :class:`MockBehavior`. It sets time-to-first-token, token
+throughput, the error rate and the status code of failures, and the scripted
+replies (a list that is cycled, or a callable taking the prompt text).
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Union
+
+_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+Replies = Union[Sequence[str], Callable[[str], str]]
+
+
+@dataclass
+class MockBehavior:
+    ttft_sec: float = 0.05
+    tokens_per_sec: float = 200.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    replies: Replies = ("This is a scripted reply from the mock backend.",)
+    seed: Optional[int] = None
+    _rng: random.Random = field(init=False, repr=False)
+    _index: int = field(default=0, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._rng = random.Random(self.seed)  # nosec B311 - simulation only
+
+    def next_reply(self, prompt_text: str) -> str:
+        if callable(self.replies):
+            return self.replies(prompt_text)
+        with self._lock:
+            reply = self.replies[self._index % len(self.replies)]
+            self._index += 1
+        return reply
+
+    def should_fail(self) -> bool:
+        if self.error_rate <= 0:
+            return False
+        with self._lock:
+            return self._rng.random() < self.error_rate
+
+    @property
+    def token_interval(self) -> float:
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Split *text* into word-ish tokens that concatenate back to *text*."""
+        return _TOKEN_RE.findall(text) or [""]
+
+    def timeline(self, reply: str) -> Iterator[str]:
+        """Yield the tokens of *reply*, sleeping to honour TTFT and throughput."""
+        tokens = self.tokenize(reply)
+        time.sleep(self.ttft_sec)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.token_interval)
+            yield token
+
+    def total_latency(self, reply: str) -> float:
+        return self.ttft_sec + (len(self.tokenize(reply)) - 1) * self.token_interval
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1 if text else 0
+
+
+# ---------------------------------------------------------------------------
+# OpenAI-compatible HTTP server
+# ---------------------------------------------------------------------------
+
+
+class _OpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; with Nagle on, keep-alive
+    # connections stall ~40 ms per response on delayed ACKs.
+    disable_nagle_algorithm = True
+    server: "_MockHTTPServer"
+
+    def log_message(self, *_args: Any) -> None:  # Keep benchmark output clean
+        pass
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server API
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        behavior = self.server.behavior
+        self.server.record_request(request)
+        if behavior.should_fail():
+            self._send_json(
+                behavior.error_status,
+                {"error": {"message": "mock backend failure", "type": "server_error"}},
+                headers={"retry-after": "0"} if behavior.error_status == 429 else None,
+            )
+            return
+
+        prompt_text = "\n".join(str(m.get("content") or "") for m in request.get("messages", []))
+        reply = behavior.next_reply(prompt_text)
+        model = request.get("model", "mock-model")
+        prompt_tokens = _estimate_tokens(prompt_text)
+        completion_tokens = len(behavior.tokenize(reply))
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": model}
+
+        if not request.get("stream"):
+            time.sleep(behavior.total_latency(reply))
+            self._send_json(
+                200,
+                dict(
+                    base,
+                    object="chat.completion",
+                    choices=[
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": reply},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    usage=usage,
+                ),
+            )
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def _event(payload: Any) -> None:
+            data = payload if isinstance(payload, str) else json.dumps(payload)
+            self.wfile.write(f"data: {data}\n\n".encode())
+            self.wfile.flush()
+
+        chunk = dict(base, object="chat.completion.chunk")
+        for token in behavior.timeline(reply):
+            _event(dict(chunk, choices=[{"index": 0, "delta": {"content": token}, "finish_reason": None}]))
+        _event(dict(chunk, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            _event(dict(chunk, choices=[], usage=usage))
+        _event("[DONE]")
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # The default backlog of 5 stalls concurrent benchmarks
+
+    def __init__(self, address, behavior: MockBehavior) -> None:
+        super().__init__(address, _OpenAIHandler)
+        self.behavior = behavior
+        self.requests: List[dict] = []
+        self._requests_lock = threading.Lock()
+
+    def record_request(self, request: dict) -> None:
+        with self._requests_lock:
+            self.requests.append(request)
+
+
+class MockOpenAIServer:
+    """Serve an OpenAI-compatible chat completions API on localhost."""
+
+    def __init__(self, behavior: Optional[MockBehavior] = None, host: str = "127.0.0.1", port: int = 0):
+        self.behavior = behavior or MockBehavior()
+        self._address = (host, port)
+        self._server: Optional[_MockHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("MockOpenAIServer is not running")
+        host, port = self._server.server_address[:2]
+        if isinstance(host, bytes):
+            host = host.decode("ascii")
+        return f"http://{host}:{port}/v1"
+
+    @property
+    def requests(self) -> List[dict]:
+        """Request bodies received so far (for assertions)."""
+        return list(self._server.requests) if self._server else []
+
+    def start(self) -> "MockOpenAIServer":
+        self._server = _MockHTTPServer(self._address, self.behavior)
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mock-openai-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *_exc: Any) -> None:
+        self.stop()
+
+
+# ---------------------------------------------------------------------------
+# Gemini GenerativeModel stand-in
+# ---------------------------------------------------------------------------
+
+try:
+    from google.api_core import exceptions as _google_exceptions
+except ImportError:  # pragma: no cover - google SDK not installed
+    _google_exceptions = None  # type: ignore[assignment]
+
+
+class ServiceUnavailable(Exception):
+    """Fallback transient error when google.api_core is not installed."""
+
+    code = 503
+
+
+def _gemini_error(status: int) -> Exception:
+    if _google_exceptions is not None:
+        return _google_exceptions.from_http_status(status, "mock backend failure")
+    error = ServiceUnavailable("mock backend failure")
+    error.code = status
+    return error
+
+
+def _contents_text(contents: Any) -> str:
+    if isinstance(contents, str):
+        return contents
+    texts: List[str] = []
+    for item in contents or []:
+        if isinstance(item, dict):
+            texts.extend(str(part) for part in item.get("parts", []))
+        else:
+            texts.append(str(item))
+    return "\n".join(texts)
+
+
+class _MockGeminiResponse:
+    def __init__(self, text: str, usage_metadata: Any) -> None:
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class MockGenerativeModel:
+    """Offline ``genai.GenerativeModel`` replacement driven by a :class:`MockBehavior`."""
+
+    def __init__(
+        self,
+        model_name: str = "gemini-mock",
+        behavior: Optional[MockBehavior] = None,
+        system_instruction: Optional[str] = None,
+    ) -> None:
+        self.model_name = model_name
+        self.behavior = behavior or MockBehavior()
+        self.system_instruction = system_instruction
+        self.calls: List[Any] = []
+
+    def _usage(self, prompt_text: str, reply: str) -> SimpleNamespace:
+        prompt_tokens = _estimate_tokens(prompt_text)
+        completion_tokens = len(self.behavior.tokenize(reply))
+        return SimpleNamespace(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=completion_tokens,
+            total_token_count=prompt_tokens + completion_tokens,
+            cached_content_token_count=0,
+        )
+
+    def _prepare(self, contents: Any):
+        self.calls.append(contents)
+        if self.behavior.should_fail():
+            raise _gemini_error(self.behavior.error_status)
+        prompt_text = _contents_text(contents)
+        return prompt_text, self.behavior.next_reply(prompt_text)
+
+    def generate_content(self, contents: Any, stream: bool = False):
+        prompt_text, reply = self._prepare(contents)
+        usage = self._usage(prompt_text, reply)
+        if stream:
+            return (_MockGeminiResponse(token, usage) for token in self.behavior.timeline(reply))
+        time.sleep(self.behavior.total_latency(reply))
+        return _MockGeminiResponse(reply, usage)
+
+    async def generate_content_async(self, contents: Any):
+        prompt_text, reply = self._prepare(contents)
+        await asyncio.sleep(self.behavior.total_latency(reply))
+        return _MockGeminiResponse(reply, self._usage(prompt_text, reply))
+
+    def count_tokens(self, contents: Any) -> SimpleNamespace:
+        return SimpleNamespace(total_tokens=_estimate_tokens(_contents_text(contents)))
+
+
+def use_mock_gemini(manager: Any, behavior: Optional[MockBehavior] = None) -> MockGenerativeModel:
+    """Install a :class:`MockGenerativeModel` on a GeminiClientManager and mark it available."""
+    model = MockGenerativeModel(manager.get_model_name(), behavior)
+    manager.client = model
+    manager._available = True
+    return model
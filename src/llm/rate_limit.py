@@ -0,0 +1,246 @@
+"""llm.rate_limit
+
+Process-wide request governor shared by every LLM client manager.
+
+Each (provider, model) pair gets a :class:`ProviderLimiter` combining
+
+* a requests-per-minute token bucket,
+* a tokens-per-minute token bucket (debited with an estimate up front and
+  settled against the real usage once the response arrives), and
+* a concurrency cap on in-flight requests.
+
+Callers that would exceed a limit wait their turn instead of hammering the
+provider into 429s; the time spent waiting is exported as the
+``llm_queue_wait_seconds`` histogram.  Limits come from ``src/config.py``;
+a value of 0 disables that particular limit.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from src import config
+from src.shared.metrics import MetricsManager
+
+
+class TokenBucket:
+    """Continuously refilling bucket; ``reserve`` debits now and returns the wait.
+
+    Debiting immediately (even into the negative) gives callers FIFO order:
+    each reservation waits for the deficit accumulated before it.
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = capacity if capacity is not None else per_minute
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def debit_for(self, amount: float) -> float:
+        """What ``reserve(amount)`` takes: oversized requests wait for a full bucket."""
+        return min(amount, self.capacity)
+
+    def reserve(self, amount: float) -> float:
+        """Debit *amount* and return the seconds to wait before proceeding."""
+        amount = self.debit_for(amount)
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level -= amount
+            if self._level >= 0:
+                return 0.0
+            return -self._level / self.rate
+
+    def adjust(self, delta: float) -> None:
+        """Credit (positive) or debit (negative) the bucket without waiting."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._level = min(self.capacity, self._level + delta)
+
+
+class ConcurrencyLimit:
+    """Counting semaphore shared by threads and asyncio tasks on any event loop.
+
+    Waiters are served FIFO and a released slot is handed straight to the
+    next one; async waiters are woken through their own loop rather than
+    polling.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._in_use = 0
+        self._waiters: Deque[Union[threading.Event, "asyncio.Future[None]"]] = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            if self._in_use < self.limit and not self._waiters:
+                self._in_use += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def acquire_async(self) -> None:
+        with self._lock:
+            if self._in_use < self.limit and not self._waiters:
+                self._in_use += 1
+                return
+            waiter: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            # Granted before the cancellation landed: give the slot back. A grant
+            # still in flight sees the cancelled future and passes it on itself.
+            if not queued and waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            if not self._waiters:
+                self._in_use -= 1
+                return
+            waiter = self._waiters.popleft()  # The slot moves to it; _in_use is unchanged
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+            return
+        try:
+            waiter.get_loop().call_soon_threadsafe(self._grant, waiter)
+        except RuntimeError:  # Its loop is closed
+            self.release()
+
+    def _grant(self, waiter: "asyncio.Future[None]") -> None:
+        if waiter.cancelled():
+            self.release()
+        else:
+            waiter.set_result(None)
+
+
+class ProviderLimiter:
+    """RPM/TPM buckets plus a concurrency cap for one (provider, model)."""
+
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        rpm: int = 0,
+        tpm: int = 0,
+        max_concurrency: int = 0,
+    ) -> None:
+        self.provider = provider
+        self.model = model
+        self._requests = TokenBucket(rpm) if rpm > 0 else None
+        self._tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._slots = ConcurrencyLimit(max_concurrency) if max_concurrency > 0 else None
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens is not None and estimated_tokens > 0:
+            wait = max(wait, self._tokens.reserve(estimated_tokens))
+        return wait
+
+    def _refund(self, estimated_tokens: int) -> None:
+        """Give back a reservation whose request was never sent."""
+        if self._requests is not None:
+            self._requests.adjust(1)
+        if self._tokens is not None and estimated_tokens > 0:
+            self._tokens.adjust(self._tokens.debit_for(estimated_tokens))
+
+    def _observe_wait(self, seconds: float) -> None:
+        MetricsManager().llm_queue_wait_seconds.labels(
+            provider=self.provider, model=self.model
+        ).observe(seconds)
+
+    @contextmanager
+    def acquire(self, estimated_tokens: int = 0) -> Iterator[None]:
+        """Block until the request may be sent; hold a concurrency slot while inside."""
+        start = time.monotonic()
+        wait = self._reserve(estimated_tokens)
+        try:
+            if wait > 0:
+                time.sleep(wait)
+            if self._slots is not None:
+                self._slots.acquire()
+        except BaseException:
+            self._refund(estimated_tokens)
+            raise
+        self._observe_wait(time.monotonic() - start)
+        try:
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    @asynccontextmanager
+    async def acquire_async(self, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        """Asyncio counterpart of :meth:`acquire` that never blocks the event loop."""
+        start = time.monotonic()
+        wait = self._reserve(estimated_tokens)
+        try:
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if self._slots is not None:
+                await self._slots.acquire_async()
+        except BaseException:  # Cancelled while queued: the request is never sent
+            self._refund(estimated_tokens)
+            raise
+        self._observe_wait(time.monotonic() - start)
+        try:
+            yield
+        finally:
+            if self._slots is not None:
+                self._slots.release()
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Correct the TPM bucket once the real token usage is known."""
+        if self._tokens is not None and actual_tokens > 0:
+            self._tokens.adjust(self._tokens.debit_for(estimated_tokens) - actual_tokens)
+
+
+def estimate_request_tokens(messages: List[Dict[str, str]]) -> int:
+    """Cheap pre-flight token estimate (~4 chars/token) used for TPM reservations."""
+    return sum(len(m.get("content") or "") for m in messages) // 4 + 1
+
+
+_limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str, model: str) -> ProviderLimiter:
+    """Return the process-wide limiter for (*provider*, *model*)."""
+    key = (provider, model)
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limits = config.LLM_RATE_LIMITS.get(provider, {})
+            limiter = ProviderLimiter(
+                provider,
+                model,
+                rpm=limits.get("rpm", 0),
+                tpm=limits.get("tpm", 0),
+                max_concurrency=limits.get("max_concurrency", 0),
+            )
+            _limiters[key] = limiter
+        return limiter
+
+
+def reset_rate_limiters() -> None:
+    """Drop all limiters so new config values take effect (used by tests)."""
+    with _limiters_lock:
+        _limiters.clear()
@@ -0,0 +1,257 @@
+"""llm.resilience
+
+Retry and circuit-breaker helpers for provider calls.
+
+* Transient failures (timeouts, connection errors, 408/409/429/5xx) are retried
+  with exponential backoff and full jitter, honouring ``Retry-After``.
+* A per-provider :class:`CircuitBreaker` opens after consecutive transient
+  failures so callers fail fast while a provider is down, then lets a single
+  probe through once ``reset_timeout`` has passed.
+* Final failures surface as :class:`LLMCallError` instead of an error string
+  that could be mistaken for an answer.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from src import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_PROVIDER_NAMES = {"openai": "OpenAI", "gemini": "Gemini"}
+_TRANSIENT_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# SDK exception class names that indicate a retryable condition. Matching by
+# name keeps this module importable without either provider SDK installed.
+_TRANSIENT_NAMES = {
+    # openai
+    "APITimeoutError",
+    "APIConnectionError",
+    "RateLimitError",
+    "InternalServerError",  # also google.api_core
+    # google.api_core
+    "ResourceExhausted",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "TooManyRequests",
+}
+
+
+class LLMCallError(Exception):
+    """A provider call failed after retries (or was rejected by the breaker)."""
+
+    def __init__(self, provider: str, message: str, transient: bool = False):
+        super().__init__(message)
+        self.provider = provider
+        self.transient = transient
+
+
+class CircuitOpenError(LLMCallError):
+    """Raised without contacting the provider while its circuit is open."""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(
+            provider,
+            f"{_PROVIDER_NAMES.get(provider, provider)} is temporarily unavailable "
+            f"(circuit open, retry in {retry_in:.0f}s)",
+            transient=True,
+        )
+        self.retry_in = retry_in
+
+
+def is_transient(exc: BaseException) -> bool:
+    """Return True if *exc* is worth retrying."""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    if type(exc).__name__ in _TRANSIENT_NAMES:
+        return True
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    return isinstance(status, int) and status in _TRANSIENT_STATUS
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Extract a ``Retry-After`` hint (seconds) from an SDK exception, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None  # HTTP-date form is not worth parsing here
+    return None
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+
+    @classmethod
+    def from_config(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=config.LLM_RETRY_MAX_ATTEMPTS,
+            base_delay=config.LLM_RETRY_BASE_DELAY,
+            max_delay=config.LLM_RETRY_MAX_DELAY,
+        )
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Backoff before retry number *attempt* (0-based), with full jitter."""
+        if retry_after is not None:
+            return min(max(retry_after, 0.0), self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))  # nosec B311 - jitter, not crypto
+
+
+class CircuitBreaker:
+    """Closed → open after *failure_threshold* transient failures → half-open probe."""
+
+    def __init__(self, provider: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may proceed."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed >= self.reset_timeout and not self._probe_in_flight:
+                self._probe_in_flight = True  # Let exactly one probe through
+                return
+            raise CircuitOpenError(self.provider, max(self.reset_timeout - elapsed, 0.0))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Circuit for {self.provider} opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Return the process-wide circuit breaker for *provider*."""
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                provider,
+                failure_threshold=config.LLM_CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=config.LLM_CIRCUIT_RESET_SEC,
+            )
+            _breakers[provider] = breaker
+        return breaker
+
+
+def reset_circuit_breakers() -> None:
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def _handle_failure(
+    provider: str,
+    exc: Exception,
+    attempt: int,
+    policy: RetryPolicy,
+    breaker: CircuitBreaker,
+) -> float:
+    """Record *exc*; return the delay before the next attempt or raise LLMCallError."""
+    if isinstance(exc, LLMCallError):
+        raise exc
+    transient = is_transient(exc)
+    name = _PROVIDER_NAMES.get(provider, provider)
+    if not transient:
+        # The provider answered (e.g. 400 bad request) – it is up, don't trip the breaker.
+        breaker.record_success()
+        raise LLMCallError(provider, f"Error communicating with {name}: {exc}") from exc
+    breaker.record_failure()
+    if attempt + 1 >= policy.max_attempts or breaker.state == "open":
+        raise LLMCallError(
+            provider, f"Error communicating with {name}: {exc}", transient=True
+        ) from exc
+    delay = policy.delay(attempt, retry_after_seconds(exc))
+    logger.warning(
+        f"Transient {name} error (attempt {attempt + 1}/{policy.max_attempts}): {exc}. Retrying in {delay:.2f}s"
+    )
+    return delay
+
+
+def call_with_retries(
+    provider: str,
+    fn: Callable[[], T],
+    policy: Optional[RetryPolicy] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    sleep: Callable[[float], Any] = time.sleep,
+) -> T:
+    """Run *fn* with retries/backoff under *provider*'s circuit breaker."""
+    policy = policy or RetryPolicy.from_config()
+    breaker = breaker or get_circuit_breaker(provider)
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = fn()
+        except Exception as exc:
+            sleep(_handle_failure(provider, exc, attempt, policy, breaker))
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+async def acall_with_retries(
+    provider: str,
+    fn: Callable[[], Awaitable[T]],
+    policy: Optional[RetryPolicy] = None,
+    breaker: Optional[CircuitBreaker] = None,
+) -> T:
+    """Asyncio counterpart of :func:`call_with_retries`."""
+    policy = policy or RetryPolicy.from_config()
+    breaker = breaker or get_circuit_breaker(provider)
+    attempt = 0
+    while True:
+        breaker.before_call()
+        try:
+            result = await fn()
+        except Exception as exc:
+            await asyncio.sleep(_handle_failure(provider, exc, attempt, policy, breaker))
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
@@ -0,0 +1,285 @@
+"""llm.response_cache
+
+Content-addressed cache for LLM completions.
+
+Entries are keyed on ``(provider, model, normalized messages)`` and live in two
+tiers: a small in-memory LRU in front of a persistent SQLite table under
+``agent_workspace/``.  Both tiers honour a TTL; the disk tier is additionally
+bounded by total payload size and evicts least-recently-used rows first.
+
+The disk tier keeps a running total of its payload size, so a ``put`` only
+scans rows (via the ``accessed_at`` index) when it has to evict.  Hits record
+their access time in memory, and the times are written in batches of
+``ACCESS_FLUSH_EVERY`` (and before any eviction) instead of one UPDATE and
+commit per hit.
+
+The cache is opt-in (``LLM_CACHE_ENABLED=1``); see :func:`get_response_cache`.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import pathlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from src import config
+from src.shared.metrics import MetricsManager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_PATH = pathlib.Path("agent_workspace/llm_cache.sqlite3")
+# Pending access times are written to disk once this many have accumulated
+ACCESS_FLUSH_EVERY = 64
+# Rows fetched per step while evicting least-recently-used entries
+_EVICT_BATCH = 64
+
+
+@dataclass
+class CachedResponse:
+    answer: str
+    tokens: int  # Tokens the original call consumed (i.e. saved on every hit)
+
+
+class ResponseCache:
+    """Two-tier (memory LRU + SQLite) response cache with TTL and size eviction."""
+
+    def __init__(
+        self,
+        path: pathlib.Path | str | None = DEFAULT_DB_PATH,
+        ttl_sec: float = 24 * 3600,
+        max_memory_entries: int = 256,
+        max_disk_bytes: int = 50 * 1024 * 1024,
+    ) -> None:
+        self.ttl_sec = ttl_sec
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, tuple[float, CachedResponse]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0  # Running SUM(size) of the disk tier
+        self._pending_access: Dict[str, float] = {}  # key -> accessed_at, not yet written
+        if path is not None:
+            self.path = pathlib.Path(path)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, answer TEXT NOT NULL, tokens INTEGER NOT NULL,"
+                " size INTEGER NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)"
+            )
+            self._db.commit()
+            self._disk_bytes = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()[0]
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def make_key(provider: str, model: str, messages: List[Dict[str, str]]) -> str:
+        """Return a stable digest for a request.
+
+        Only ``role`` and ``content`` take part in the key; line endings and
+        surrounding whitespace are normalised so cosmetic differences still hit.
+        """
+        normalized = [
+            [m.get("role", ""), (m.get("content") or "").replace("\r\n", "\n").strip()]
+            for m in messages
+        ]
+        payload = json.dumps(
+            [provider, model, normalized], ensure_ascii=False, separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """Return the cached response for *key* or None, updating hit/miss counters."""
+        now = time.time()
+        entry: Optional[CachedResponse] = None
+        with self._lock:
+            mem = self._memory.get(key)
+            if mem is not None:
+                expires_at, cached = mem
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    entry = cached
+                else:
+                    del self._memory[key]
+            if entry is None and self._db is not None:
+                found = self._get_from_disk(self._db, key, now)
+                if found is not None:
+                    entry, expires_at = found
+                    # Keep the row's expiry; a read must not extend the TTL
+                    self._remember(key, entry, expires_at)
+            if entry is not None and self._db is not None:
+                self._note_access(self._db, key, now)
+
+            mm = MetricsManager()
+            if entry is not None:
+                self.hits += 1
+                mm.llm_cache_hits_total.inc()
+            else:
+                self.misses += 1
+                mm.llm_cache_misses_total.inc()
+        return entry
+
+    def put(self, key: str, answer: str, tokens: int = 0) -> None:
+        """Store *answer* under *key* in both tiers."""
+        entry = CachedResponse(answer=answer, tokens=tokens)
+        now = time.time()
+        expires_at = now + self.ttl_sec
+        with self._lock:
+            self._remember(key, entry, expires_at)
+            db = self._db
+            if db is not None:
+                try:
+                    size = len(answer.encode("utf-8"))
+                    replaced = db.execute(
+                        "SELECT size FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                    db.execute(
+                        "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, answer, tokens, size, expires_at, now),
+                    )
+                    self._pending_access.pop(key, None)
+                    self._disk_bytes += size - (replaced[0] if replaced else 0)
+                    if self._disk_bytes > self.max_disk_bytes:
+                        self._evict_disk(db, now)
+                    db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Response cache write failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._pending_access.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+                self._disk_bytes = 0
+
+    def flush(self) -> None:
+        """Write pending access times to disk."""
+        with self._lock:
+            if self._db is not None:
+                self._flush_access(self._db)
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            disk_entries = 0
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "disk_bytes": self._disk_bytes,
+            }
+
+    # ------------------------------------------------------------------
+    def _remember(self, key: str, entry: CachedResponse, expires_at: float) -> None:
+        self._memory[key] = (expires_at, entry)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _get_from_disk(
+        self, db: sqlite3.Connection, key: str, now: float
+    ) -> Optional[Tuple[CachedResponse, float]]:
+        """Return ``(entry, expires_at)`` for an unexpired row, else None."""
+        try:
+            row = db.execute(
+                "SELECT answer, tokens, size, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            answer, tokens, size, expires_at = row
+            if expires_at <= now:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                db.commit()
+                self._disk_bytes -= size
+                self._pending_access.pop(key, None)
+                return None
+            return CachedResponse(answer=answer, tokens=tokens), expires_at
+        except sqlite3.Error as e:
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+
+    def _note_access(self, db: sqlite3.Connection, key: str, now: float) -> None:
+        self._pending_access[key] = now
+        if len(self._pending_access) >= ACCESS_FLUSH_EVERY:
+            try:
+                self._flush_access(db)
+                db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Response cache access-time write failed: {e}")
+
+    def _flush_access(self, db: sqlite3.Connection) -> None:
+        if self._pending_access:
+            db.executemany(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                [(at, key) for key, at in self._pending_access.items()],
+            )
+            self._pending_access.clear()
+
+    def _evict_disk(self, db: sqlite3.Connection, now: float) -> None:
+        """Drop expired rows, then least-recently-used rows beyond max_disk_bytes."""
+        expired = db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses WHERE expires_at <= ?", (now,)
+        ).fetchone()[0]
+        if expired:
+            db.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            self._disk_bytes -= expired
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        self._flush_access(db)  # Evict by up-to-date access times
+        while self._disk_bytes > self.max_disk_bytes:
+            rows = db.execute(
+                "SELECT key, size FROM responses ORDER BY accessed_at ASC LIMIT ?",
+                (_EVICT_BATCH,),
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._memory.pop(key, None)
+                self._disk_bytes -= size
+
+
+# ---------------------------------------------------------------------------
+# Process-wide instance
+# ---------------------------------------------------------------------------
+
+_shared_cache: Optional[ResponseCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the shared cache if ``LLM_CACHE_ENABLED`` is set, else None."""
+    global _shared_cache
+    if not config.LLM_CACHE_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ResponseCache(
+                path=config.LLM_CACHE_PATH,
+                ttl_sec=config.LLM_CACHE_TTL_SEC,
+                max_memory_entries=config.LLM_CACHE_MEMORY_ENTRIES,
+                max_disk_bytes=config.LLM_CACHE_MAX_DISK_MB * 1024 * 1024,
+            )
+        return _shared_cache
@@ -0,0 +1,147 @@
+"""llm.token_counting
+
+Helpers for cheap token counting on the UI render path.
+
+* :class:`TokenCountMemo` – bounded LRU of counts keyed by (namespace, text digest).
+* :class:`GeminiTokenEstimator` – offline chars-per-token estimator that is
+  calibrated from exact counts and from provider usage metadata.
+* :class:`ExactCountBackfill` – single daemon worker that computes exact counts
+  off the render path and stores them in a memo.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import queue
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Token counting modes accepted by GeminiClientManager.count_tokens
+MODE_ESTIMATE = "estimate"
+MODE_EXACT = "exact"
+MODE_BACKFILL = "backfill"  # estimate now, exact count refreshed in the background
+TOKEN_COUNT_MODES = (MODE_ESTIMATE, MODE_EXACT, MODE_BACKFILL)
+
+
+class TokenCountMemo:
+    """Bounded LRU of token counts keyed by (namespace, digest of the text).
+
+    *namespace* is whatever determines the tokenizer – a tiktoken encoding
+    name or a Gemini model name.  Only a 16-byte digest of each text is kept,
+    so the memo does not hold message bodies alive (they may be compressed
+    in the conversation history; see src/core/message_store.py).
+    """
+
+    def __init__(self, max_entries: int = 8192):
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(namespace: str, text: str) -> Tuple[str, bytes]:
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        return namespace, digest
+
+    def get(self, namespace: str, text: str) -> Optional[int]:
+        key = self._key(namespace, text)
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+            return count
+
+    def put(self, namespace: str, text: str, count: int) -> None:
+        key = self._key(namespace, text)
+        with self._lock:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+class GeminiTokenEstimator:
+    """Estimate Gemini token counts locally from text length.
+
+    Starts from the commonly quoted ~4 characters per token and converges on
+    the observed ratio as exact samples are fed in via :meth:`calibrate`.
+    """
+
+    DEFAULT_CHARS_PER_TOKEN = 4.0
+    # Samples below this many tokens are too noisy to move the ratio much.
+    _MIN_CALIBRATION_TOKENS = 200
+
+    def __init__(self) -> None:
+        self._chars = 0
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    @property
+    def chars_per_token(self) -> float:
+        with self._lock:
+            if self._tokens < self._MIN_CALIBRATION_TOKENS:
+                return self.DEFAULT_CHARS_PER_TOKEN
+            return self._chars / self._tokens
+
+    def estimate(self, text: str) -> int:
+        if not text:
+            return 0
+        return max(1, round(len(text) / self.chars_per_token))
+
+    def calibrate(self, text_length: int, exact_tokens: int) -> None:
+        """Feed one exact observation (*text_length* chars == *exact_tokens*)."""
+        if text_length <= 0 or exact_tokens <= 0:
+            return
+        with self._lock:
+            self._chars += text_length
+            self._tokens += exact_tokens
+
+
+class ExactCountBackfill:
+    """Computes exact token counts on a background daemon thread.
+
+    ``submit`` never blocks; duplicate requests for a text that is already
+    queued are dropped.  Results are written to *memo* under *namespace*.
+    """
+
+    def __init__(self, memo: TokenCountMemo) -> None:
+        self.memo = memo
+        self._queue: "queue.Queue[Tuple[str, str, Callable[[str], int]]]" = queue.Queue()
+        self._pending: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, namespace: str, text: str, count_fn: Callable[[str], int]) -> None:
+        key = (namespace, text)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, daemon=True, name="token_count_backfill"
+                )
+                self._thread.start()
+        self._queue.put((namespace, text, count_fn))
+
+    def wait_idle(self) -> None:
+        """Block until every submitted text has been processed (for tests/benchmarks)."""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            namespace, text, count_fn = self._queue.get()
+            try:
+                self.memo.put(namespace, text, count_fn(text))
+            except Exception as e:  # Keep estimating; the next submit retries
+                logger.debug(f"Background token count failed for {namespace}: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard((namespace, text))
+                self._queue.task_done()
@@ -1,17 +1,584 @@
+"""
+history.py - Persistent chat history as an append-only JSONL journal.
+
+Every message is one ``{"r": role, "c": content}`` line in ``HIST_PATH``.
+Appending writes only the new lines through a file handle kept open between
+calls, so persisting a turn costs O(size of the turn) instead of rewriting the
+whole conversation.
+
+Durability follows ``config.HISTORY_FSYNC``:
+
+* ``"always"`` fsyncs after every append.
+* ``"interval"`` (the default) fsyncs at most every
+  ``HISTORY_FSYNC_INTERVAL_SEC``.
+* ``"never"`` leaves it to the OS.
+
+Lines are flushed on every append either way, so readers in this or another
+process see them immediately.
+
+A crash can leave a torn last line. :func:`load` ignores it, and the next
+append truncates it first. Every ``HISTORY_COMPACT_EVERY`` appends the journal
+is compacted (rewritten atomically) if it holds corrupt lines or more than
+``HISTORY_MAX_ENTRIES`` messages.
+
+Reading does not need to parse the whole file. :func:`load_tail` returns the
+newest records by scanning backwards from the end of the file. The sidecar
+``<HIST_PATH>.idx`` holds the byte offset of every record as a fixed-width
+integer, so :func:`load_range` can fetch any page of older records with two
+seeks. Either way the cost depends on the page size, not the history length.
+The index is only a cache. If a crash or an outside edit leaves it out of step
+with the journal, it is rebuilt the next time it is read.
+
+Each chat session has its own journal. :func:`for_session` returns the
+:class:`HistoryStore` for ``sessions/<session id>.jsonl`` next to ``HIST_PATH``,
+so concurrent sessions never touch a shared file. Appends and compaction
+still take a cross-process file lock on their journal. Two processes that
+resume the same session therefore interleave whole turns rather than
+corrupting each other's lines. A store operation that cannot take that lock
+in time, or that hits an I/O error, raises :class:`HistoryStoreError`.
+
+An open journal holds two file handles (journal and index). Only the
+``HISTORY_OPEN_STORES`` most recently used stores keep theirs open; the rest
+are closed and reopen on their next use.
+
+The module-level functions (:func:`load`, :func:`append`, :func:`reset`, ...)
+operate on the store at ``HIST_PATH`` itself. Tests point ``HIST_PATH``
+elsewhere, and the stores follow the change. Histories written by older
+versions as a single JSON array are still read and are converted to JSONL on
+the next append, whatever the store's path. The history kept at ``HIST_PATH``
+before sessions had their own journals is taken over by the session named
+``"default"`` (``DEFAULT_SESSION``).
+"""
+import atexit
 import json
+import logging
+import os
 import pathlib
-HIST_PATH = pathlib.Path("agent_workspace/chat_history.json")
+import re
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from src import config
+from src.shared.lock_utils import ContextBusLockTimeout, file_lock
+
+logger = logging.getLogger(__name__)
+
+HIST_PATH = pathlib.Path("agent_workspace/chat_history.jsonl")
+
+_TAIL_CHUNK = 64 * 1024
+_OFFSET = struct.Struct("<Q")  # One index entry: a record's byte offset in the journal
+
+
+def _legacy_path(path: pathlib.Path, sources: Sequence[pathlib.Path] = ()) -> Optional[pathlib.Path]:
+    """The older history file to migrate into *path*, if there is one.
+
+    That is the pre-JSONL file next to *path*, or else the first existing file
+    among *sources* (see :func:`for_session`).
+    """
+    for legacy in (path.with_suffix(".json"), *sources):
+        if legacy != path and legacy.exists():
+            return legacy
+    return None
+
+
+def _index_path(path: pathlib.Path) -> pathlib.Path:
+    return path.with_suffix(path.suffix + ".idx")
+
+
+def _parse(data: bytes, path: pathlib.Path) -> Tuple[list, int]:
+    """Return (entries, corrupt line count) for a journal's contents."""
+    if data.lstrip().startswith(b"["):
+        return json.loads(data), 0  # Legacy single-array file
+    lines = data.split(b"\n")
+    # Without a trailing newline the last line is the torn tail of an interrupted
+    # append; it is dropped on the next one
+    return _parse_lines(lines[:-1], path)
+
+
+def _parse_lines(lines: List[bytes], path: pathlib.Path) -> Tuple[list, int]:
+    entries, corrupt = [], 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            entries.append(json.loads(line))
+        except json.JSONDecodeError:
+            corrupt += 1
+            logger.warning(f"Skipping a corrupt line in {path}")
+    return entries, corrupt
+
+
+def _write_atomically(path: pathlib.Path, entries: Iterable[dict]) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        for entry in entries:
+            fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, path)
+
+
+def _line_offsets(path: pathlib.Path) -> List[int]:
+    """Byte offset of every complete, non-empty line of *path*."""
+    offsets: List[int] = []
+    position, line_start = 0, 0
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            newline = chunk.find(b"\n")
+            while newline >= 0:
+                end = position + newline
+                if end > line_start:
+                    offsets.append(line_start)
+                line_start = end + 1
+                newline = chunk.find(b"\n", newline + 1)
+            position += len(chunk)
+    return offsets
+
+
+def _drop_torn_tail(path: pathlib.Path) -> None:
+    """Truncate a partial last line, reading backwards only as far as the last newline."""
+    with path.open("rb+") as fh:
+        end = fh.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        fh.seek(end - 1)
+        if fh.read(1) == b"\n":
+            return
+        pos = end
+        while pos > 0:
+            start = max(0, pos - _TAIL_CHUNK)
+            fh.seek(start)
+            newline = fh.read(pos - start).rfind(b"\n")
+            if newline >= 0:
+                fh.truncate(start + newline + 1)
+                return
+            pos = start
+        fh.truncate(0)
+    logger.warning(f"Dropped a torn last line from {path}")
+
+
+class _Journal:
+    """Open append handle on one history file, with its fsync and compaction state."""
+
+    def __init__(self, path: pathlib.Path, legacy: Optional[pathlib.Path] = None) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not path.exists() and legacy is not None:
+            entries, _ = _parse(legacy.read_bytes(), legacy)
+            _write_atomically(path, entries)
+            logger.info(f"Migrated {len(entries)} history entries from {legacy} to {path}")
+        elif path.exists():
+            with path.open("rb") as fh:
+                legacy_format = fh.read(1) == b"["
+            if legacy_format:
+                entries, _ = _parse(path.read_bytes(), path)
+                _write_atomically(path, entries)
+            else:
+                _drop_torn_tail(path)
+        self.corrupt = 0
+        self.fh = path.open("ab")
+        self.size = self.fh.tell()
+        self.index_path = _index_path(path)
+        if not self._index_matches():
+            self._rebuild_index()
+        self.index = self.index_path.open("ab")
+        self.count = self.index.tell() // _OFFSET.size
+        self.last_sync = time.monotonic()
+        self.since_compaction = 0
+
+    def _index_matches(self) -> bool:
+        """Whether the index lists exactly the journal's records (checked at its tail)."""
+        if not self.index_path.exists():
+            return False
+        index_size = self.index_path.stat().st_size
+        if index_size % _OFFSET.size:
+            return False  # Torn index write
+        if index_size == 0:
+            return self.size == 0
+        with self.index_path.open("rb") as fh:
+            fh.seek(index_size - _OFFSET.size)
+            (last,) = _OFFSET.unpack(fh.read(_OFFSET.size))
+        if last >= self.size:
+            return False
+        with self.path.open("rb") as fh:
+            fh.seek(max(0, last - 1))
+            before = fh.read(1) if last else b"\n"
+            rest = fh.read(self.size - last) if last else fh.read(self.size)
+        # The last indexed record starts a line and is the journal's final line
+        return before == b"\n" and rest.find(b"\n") == len(rest) - 1
+
+    def _rebuild_index(self) -> None:
+        offsets = _line_offsets(self.path) if self.size else []
+        tmp = self.index_path.with_suffix(self.index_path.suffix + ".tmp")
+        tmp.write_bytes(b"".join(_OFFSET.pack(offset) for offset in offsets))
+        os.replace(tmp, self.index_path)
+        logger.info(f"Rebuilt history index {self.index_path} ({len(offsets)} records)")
+
+    def stale(self) -> bool:
+        """Whether the file was removed or replaced (reset or compacted elsewhere)."""
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self.fh.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def refresh(self, check_index: bool = False) -> None:
+        """Pick up records other processes appended since our last write.
+
+        With *check_index*, also rebuild the index if it fell out of step with
+        the journal (a writer crashed between the two writes) while open here.
+        """
+        self.size = os.fstat(self.fh.fileno()).st_size
+        if check_index and not self._index_matches():
+            self.index.close()
+            self._rebuild_index()
+            self.index = self.index_path.open("ab")
+        self.count = os.fstat(self.index.fileno()).st_size // _OFFSET.size
+
+    def write(self, entries: List[Tuple[str, str]]) -> None:
+        """Append *entries*; the caller holds the journal's file lock."""
+        self.refresh()
+        lines = [
+            (json.dumps({"r": role, "c": content}, ensure_ascii=False) + "\n").encode("utf-8")
+            for role, content in entries
+        ]
+        offsets = []
+        for line in lines:
+            offsets.append(self.size)
+            self.size += len(line)
+        # Journal first: a crash in between leaves an index that is detectably behind
+        self.fh.write(b"".join(lines))
+        self.fh.flush()
+        self.index.write(b"".join(_OFFSET.pack(offset) for offset in offsets))
+        self.index.flush()
+        policy = config.HISTORY_FSYNC
+        now = time.monotonic()
+        if policy == "always" or (
+            policy == "interval" and now - self.last_sync >= config.HISTORY_FSYNC_INTERVAL_SEC
+        ):
+            os.fsync(self.fh.fileno())
+            self.last_sync = now
+        self.count += len(entries)
+        self.since_compaction += len(entries)
+        every = config.HISTORY_COMPACT_EVERY
+        if every > 0 and self.since_compaction >= every:
+            self.since_compaction = 0
+            limit = config.HISTORY_MAX_ENTRIES
+            if self.corrupt or (limit > 0 and self.count > limit):
+                self.compact()
+
+    def compact(self) -> None:
+        """Rewrite the journal without corrupt lines, keeping the newest HISTORY_MAX_ENTRIES."""
+        self.fh.close()
+        self.index.close()
+        entries, _ = _parse(self.path.read_bytes(), self.path)
+        limit = config.HISTORY_MAX_ENTRIES
+        if limit > 0:
+            entries = entries[-limit:]
+        _write_atomically(self.path, entries)
+        self.corrupt = 0
+        self.fh = self.path.open("ab")
+        self.size = self.fh.tell()
+        self._rebuild_index()
+        self.index = self.index_path.open("ab")
+        self.count = self.index.tell() // _OFFSET.size
+        self.last_sync = time.monotonic()
+        logger.info(f"Compacted {self.path} to {len(entries)} entries")
+
+    def read_range(self, start: int, stop: int) -> list:
+        """Records ``start`` to ``stop - 1`` (clamped), via their index offsets."""
+        start, stop = max(0, start), min(stop, self.count)
+        if start >= stop:
+            return []
+        with self.index_path.open("rb") as fh:
+            fh.seek(start * _OFFSET.size)
+            offsets = fh.read((stop - start) * _OFFSET.size)
+        begin = _OFFSET.unpack_from(offsets)[0]
+        end = self.size
+        if stop < self.count:
+            with self.index_path.open("rb") as fh:
+                fh.seek(stop * _OFFSET.size)
+                end = _OFFSET.unpack(fh.read(_OFFSET.size))[0]
+        with self.path.open("rb") as fh:
+            fh.seek(begin)
+            data = fh.read(end - begin)
+        return _parse_lines(data.split(b"\n"), self.path)[0]
+
+    def close(self) -> None:
+        if self.fh.closed:
+            return
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+        self.fh.close()
+        self.index.close()
+
+
+class HistoryStoreError(Exception):
+    """A history store could not be read or written (file lock timeout or I/O error)."""
+
+
+class HistoryStore:
+    """The persisted messages of one conversation, in one JSONL journal.
+
+    *legacy_sources* are older history files whose messages this conversation
+    takes over the first time its journal is created.
+    """
+
+    def __init__(self, path: pathlib.Path, legacy_sources: Sequence[pathlib.Path] = ()) -> None:
+        self.path = path
+        self.legacy_sources = tuple(legacy_sources)
+        self._lock = threading.RLock()
+        self._journal: Optional[_Journal] = None
+
+    def _legacy(self) -> Optional[pathlib.Path]:
+        return _legacy_path(self.path, self.legacy_sources)
+
+    def _current_journal(self) -> _Journal:
+        """The open journal; reopened if the file was removed or replaced. Needs the file lock."""
+        if self._journal is None or self._journal.stale():
+            self.close()
+            self._journal = _Journal(self.path, self._legacy())
+        return self._journal
+
+    @contextmanager
+    def _open_journal(self) -> Iterator[_Journal]:
+        """The journal, under this store's thread lock and the journal's file lock.
+
+        A store that (re)opens its journal is made the most recently used one in
+        ``_stores``, which closes the least recently used stores beyond
+        ``HISTORY_OPEN_STORES``. That happens after the locks are released.
+        """
+        with self._locked():
+            opening = self._journal is None
+            yield self._current_journal()
+        if opening:
+            _remember(self)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """This store's thread lock plus the journal's file lock.
+
+        A lock timeout or an I/O error while holding them is raised as
+        :class:`HistoryStoreError`.
+        """
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._lock, file_lock(self.path):
+                yield
+        except (ContextBusLockTimeout, OSError) as e:
+            raise HistoryStoreError(f"Chat history {self.path} is unavailable: {e}") from e
+
+    def _exists(self) -> bool:
+        return self.path.exists() or self._legacy() is not None
+
+    def load(self) -> list:
+        """Return every persisted message as ``{"r": role, "c": content}``, oldest first."""
+        source = self.path if self.path.exists() else self._legacy()
+        if source is None:
+            return []
+        entries, corrupt = _parse(source.read_bytes(), source)
+        with self._lock:
+            if corrupt and self._journal is not None:
+                self._journal.corrupt = corrupt  # Cleaned up by the next compaction
+        return entries
+
+    def load_tail(self, n: int) -> list:
+        """Return the newest *n* persisted messages, oldest first.
+
+        Reads backwards from the end of the file until *n* complete records are
+        found, so the cost does not depend on how long the history is.
+        """
+        path = self.path
+        if n <= 0:
+            return []
+        if not path.exists():
+            return self.load()[-n:]  # Nothing, or a legacy file awaiting migration
+        with path.open("rb") as fh:
+            if fh.read(1) == b"[":
+                return self.load()[-n:]
+            position = fh.seek(0, os.SEEK_END)
+            chunks: List[bytes] = []
+            newlines = 0
+            # n records need n newlines, plus one more to know the oldest starts a line
+            while position > 0 and newlines <= n:
+                start = max(0, position - _TAIL_CHUNK)
+                fh.seek(start)
+                chunk = fh.read(position - start)
+                chunks.append(chunk)
+                newlines += chunk.count(b"\n")
+                position = start
+        lines = b"".join(reversed(chunks)).split(b"\n")
+        lines.pop()  # Empty after the final newline, or a torn tail
+        if position > 0:
+            lines = lines[1:]  # Possibly cut mid-record
+        entries, _ = _parse_lines(lines[-n:], path)
+        return entries
+
+    def count(self) -> int:
+        """Number of persisted records (from the offset index)."""
+        if not self._exists():
+            return 0
+        with self._open_journal() as journal:
+            journal.refresh(check_index=True)
+            return journal.count
+
+    def load_range(self, start: int, stop: int) -> list:
+        """Return records ``start`` to ``stop - 1`` (0 is the oldest), e.g. an older page.
+
+        Uses the sidecar offset index, so each page costs two seeks and a read of
+        just that page.
+        """
+        if not self._exists():
+            return []
+        with self._open_journal() as journal:
+            journal.refresh(check_index=True)
+            return journal.read_range(start, stop)
+
+    def append(self, role: str, content: str) -> None:
+        self.extend([(role, content)])
+
+    def extend(self, entries: Iterable[Tuple[str, str]]) -> None:
+        """Append several (role, content) messages with a single write (one chat turn)."""
+        entries = list(entries)
+        if not entries:
+            return
+        with self._open_journal() as journal:
+            journal.write(entries)
+
+    def compact(self) -> None:
+        """Compact the journal now (see the module docstring)."""
+        if self._exists():
+            with self._open_journal() as journal:
+                journal.compact()
+
+    def reset(self) -> None:
+        """Delete this conversation's journal and index.
+
+        Takes the journal's file lock like appends do, so a reset never lands
+        between another process's journal and index writes. The lock file itself
+        is left in place for the processes that may be waiting on it.
+        """
+        with self._locked():
+            self.close()
+            for path in (self.path, _index_path(self.path)):
+                path.unlink(missing_ok=True)
+            legacy = self._legacy()
+            while legacy is not None:  # Or the next open would migrate it again
+                legacy.unlink()
+                _index_path(legacy).unlink(missing_ok=True)
+                legacy = self._legacy()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+# Most recently used last; bounded by HISTORY_OPEN_STORES (see _remember)
+_stores: "OrderedDict[pathlib.Path, HistoryStore]" = OrderedDict()
+_stores_lock = threading.Lock()
+_SESSION_ID = re.compile(r"[^A-Za-z0-9_.-]")
+DEFAULT_SESSION = "default"
+
+
+def store(path: Optional[pathlib.Path] = None, legacy_sources: Sequence[pathlib.Path] = ()) -> HistoryStore:
+    """The process-wide store for *path* (default: ``HIST_PATH``)."""
+    path = pathlib.Path(HIST_PATH if path is None else path)
+    with _stores_lock:
+        found = _stores.get(path)
+        if found is not None:
+            _stores.move_to_end(path)
+            return found
+        found = _stores[path] = HistoryStore(path, legacy_sources)
+        evicted = _evict_over_limit()
+    for stale in evicted:
+        stale.close()
+    return found
+
+
+def _remember(found: HistoryStore) -> None:
+    """Make *found* the most recently used store for its path; close the ones evicted.
+
+    Evicted stores only lose their open file handles: any caller still holding
+    one reopens its journal (and re-enters ``_stores``) on its next use.
+    """
+    with _stores_lock:
+        current = _stores.get(found.path)
+        _stores[found.path] = found
+        _stores.move_to_end(found.path)
+        evicted = _evict_over_limit()
+        if current is not None and current is not found:
+            evicted.append(current)  # A second store for the same file
+    for stale in evicted:
+        stale.close()
+
+
+def _evict_over_limit() -> List[HistoryStore]:
+    """Drop the least recently used stores beyond HISTORY_OPEN_STORES; needs ``_stores_lock``."""
+    evicted = []
+    while len(_stores) > max(1, config.HISTORY_OPEN_STORES):
+        evicted.append(_stores.popitem(last=False)[1])
+    return evicted
+
+
+def sessions_dir() -> pathlib.Path:
+    return pathlib.Path(HIST_PATH).parent / "sessions"
+
+
+def for_session(session_id: str) -> HistoryStore:
+    """The store holding one chat session's history.
+
+    The ``DEFAULT_SESSION`` takes over the history saved at ``HIST_PATH`` (or
+    its pre-JSONL ``.json`` file) before each session had its own journal.
+    """
+    safe_id = _SESSION_ID.sub("_", session_id)[:64] or DEFAULT_SESSION
+    shared = pathlib.Path(HIST_PATH)
+    sources = (shared, shared.with_suffix(".json")) if safe_id == DEFAULT_SESSION else ()
+    return store(sessions_dir() / f"{safe_id}.jsonl", sources)
+
+
+def close_all() -> None:
+    with _stores_lock:
+        stores = list(_stores.values())
+    for found in stores:
+        found.close()
+
 
 def load() -> list:
-    if HIST_PATH.exists():
-        return json.loads(HIST_PATH.read_text())
-    return []
+    """Every message in the ``HIST_PATH`` store (see :meth:`HistoryStore.load`)."""
+    return store().load()
+
+
+def load_tail(n: int) -> list:
+    return store().load_tail(n)
+
+
+def count() -> int:
+    return store().count()
+
+
+def load_range(start: int, stop: int) -> list:
+    return store().load_range(start, stop)
+
 
 def append(role: str, content: str):
-    convo = load()
-    convo.append({"r": role, "c": content})
-    HIST_PATH.parent.mkdir(exist_ok=True)
-    HIST_PATH.write_text(json.dumps(convo, indent=0))
+    store().append(role, content)
+
+
+def extend(entries: Iterable[Tuple[str, str]]) -> None:
+    store().extend(entries)
+
+
+def compact() -> None:
+    store().compact()
+
 
 def reset():
-    HIST_PATH.unlink(missing_ok=True) 
\ No newline at end of file
+    store().reset()
+
+
+atexit.register(close_all)
@@ -1,7 +1,7 @@
 import os
 
 try:
-    from prometheus_client import Counter, start_http_server, CollectorRegistry
+    from prometheus_client import Counter, Histogram, start_http_server, CollectorRegistry
     PROMETHEUS_AVAILABLE = True
 except ImportError:
     PROMETHEUS_AVAILABLE = False
@@ -11,7 +11,12 @@ except ImportError:
             pass
         def inc(self, *_ , **__):
             pass
+        def observe(self, *_, **__):
+            pass
+        def labels(self, *_, **__):
+            return self
     Counter = _Dummy  # type: ignore
+    Histogram = _Dummy  # type: ignore
     CollectorRegistry = _Dummy  # type: ignore
     def start_http_server(*_args, **_kwargs):  # type: ignore
         return None
@@ -19,6 +24,14 @@ except ImportError:
 class DummyCounter:
     def inc(self, amount=1):
         pass
+    def labels(self, *_, **__):
+        return self
+
+class DummyHistogram:
+    def labels(self, *_, **__):
+        return self
+    def observe(self, amount):
+        pass
 
 class MetricsManager:
     _instance = None
@@ -56,6 +69,64 @@ class MetricsManager:
                     registry=self._registry,
                 )
 
+                # LLM response cache effectiveness (incremented by ResponseCache)
+                self.llm_cache_hits_total = Counter(
+                    'llm_cache_hits_total',
+                    'Total number of LLM response cache hits',
+                    registry=self._registry,
+                )
+                self.llm_cache_misses_total = Counter(
+                    'llm_cache_misses_total',
+                    'Total number of LLM response cache misses',
+                    registry=self._registry,
+                )
+
+                # Prompt tokens split by provider-side prompt-cache hit (incremented by UsageLogger)
+                self.llm_prompt_tokens_total = Counter(
+                    'llm_prompt_tokens_total',
+                    'Prompt tokens sent to LLM providers, by prompt-cache status',
+                    ['provider', 'model', 'cache'],
+                    registry=self._registry,
+                )
+
+                # Time callers spent waiting on the LLM rate limiter (see llm.rate_limit)
+                self.llm_queue_wait_seconds = Histogram(
+                    'llm_queue_wait_seconds',
+                    'Time LLM requests waited for rate-limit / concurrency slots',
+                    ['provider', 'model'],
+                    buckets=(0.005, 0.05, 0.25, 1, 2.5, 5, 10, 30, 60),
+                    registry=self._registry,
+                )
+
+                # Per-call LLM performance (recorded by llm.call_metrics.CallTimer)
+                self.llm_request_latency_seconds = Histogram(
+                    'llm_request_latency_seconds',
+                    'Wall time of one LLM provider call, excluding rate-limit waits',
+                    ['provider', 'model'],
+                    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120),
+                    registry=self._registry,
+                )
+                self.llm_time_to_first_token_seconds = Histogram(
+                    'llm_time_to_first_token_seconds',
+                    'Time from sending a streamed LLM request to its first text delta',
+                    ['provider', 'model'],
+                    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30),
+                    registry=self._registry,
+                )
+                self.llm_output_tokens_per_second = Histogram(
+                    'llm_output_tokens_per_second',
+                    'Completion tokens per second of generation time',
+                    ['provider', 'model'],
+                    buckets=(5, 10, 20, 40, 60, 80, 120, 160, 250, 500),
+                    registry=self._registry,
+                )
+                self.llm_request_errors_total = Counter(
+                    'llm_request_errors_total',
+                    'Failed LLM provider calls, by transient/permanent kind',
+                    ['provider', 'model', 'kind'],
+                    registry=self._registry,
+                )
+
                 # Start the HTTP server synchronously so tests can assert on calls immediately
                 port = 9090
                 while port < 9095:
@@ -81,22 +152,77 @@ class MetricsManager:
                 self.qa_fail_total = DummyCounter()
                 self.openai_tokens_total = DummyCounter()
                 self.gemini_tokens_total = DummyCounter()
+                self.llm_cache_hits_total = DummyCounter()
+                self.llm_cache_misses_total = DummyCounter()
+                self.llm_prompt_tokens_total = DummyCounter()
+                self.llm_queue_wait_seconds = DummyHistogram()
+                self.llm_request_latency_seconds = DummyHistogram()
+                self.llm_time_to_first_token_seconds = DummyHistogram()
+                self.llm_output_tokens_per_second = DummyHistogram()
+                self.llm_request_errors_total = DummyCounter()
 
             self._initialized = True
 
     def get_snapshot(self):
+        """Return ``{metric: [(labels, value), ...]}`` from the registry.
+
+        Counters give their current value per label set. Histograms give a
+        dict with ``count``, ``mean`` and bucket-interpolated ``p50``/``p95``/``p99``.
+        """
         if self.enabled and PROMETHEUS_AVAILABLE and self._registry:
-            # This requires the text format exporter
-            # For a simple snapshot, we can manually collect and format
-            # A real implementation might use generate_latest or a custom collector
             metrics_data = {}
             for metric in self._registry.collect():
-                total = sum(sample.value for sample in metric.samples)
-                metrics_data[metric.name] = total
+                if metric.type == 'histogram':
+                    metrics_data[metric.name] = _histogram_series(metric.samples)
+                else:
+                    metrics_data[metric.name] = [
+                        (dict(sample.labels), sample.value)
+                        for sample in metric.samples
+                        if not sample.name.endswith('_created')
+                    ]
             return metrics_data
         else:
             return {'status': 'Metrics disabled'}
 
+
+def _bucket_quantile(buckets, count, q):
+    """Linear interpolation inside the cumulative bucket that holds quantile *q*."""
+    rank = q * count
+    prev_bound, prev_count = 0.0, 0.0
+    for bound, cumulative in buckets:
+        if cumulative >= rank:
+            if bound == float('inf'):
+                return prev_bound  # Above the largest finite bucket
+            if cumulative == prev_count:
+                return bound
+            return prev_bound + (bound - prev_bound) * (rank - prev_count) / (cumulative - prev_count)
+        prev_bound, prev_count = bound, cumulative
+    return prev_bound
+
+
+def _histogram_series(samples):
+    series = {}
+    for sample in samples:
+        labels = {k: v for k, v in sample.labels.items() if k != 'le'}
+        entry = series.setdefault(tuple(sorted(labels.items())), {'labels': labels, 'buckets': []})
+        if sample.name.endswith('_bucket'):
+            entry['buckets'].append((float(sample.labels['le']), sample.value))
+        elif sample.name.endswith('_count'):
+            entry['count'] = sample.value
+        elif sample.name.endswith('_sum'):
+            entry['sum'] = sample.value
+    result = []
+    for entry in series.values():
+        count = entry.get('count', 0)
+        if not count:
+            continue
+        buckets = sorted(entry['buckets'])
+        summary = {'count': int(count), 'mean': entry.get('sum', 0.0) / count}
+        for q in (0.5, 0.95, 0.99):
+            summary[f'p{int(q * 100)}'] = _bucket_quantile(buckets, count, q)
+        result.append((entry['labels'], summary))
+    return result
+
 def init():
     # Accessing the instance initializes it
     MetricsManager() 
\ No newline at end of file
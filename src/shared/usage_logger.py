@@ -24,6 +24,15 @@ class UsageLogger:
 
     _totals: dict[str, int] = {"openai": 0, "gemini": 0}
     _accum: dict[str, int] = {"openai": 0, "gemini": 0}
+    # Tokens served from the response cache (not billed), tracked apart from
+    # the billed counters above so cost accounting stays correct.
+    _cached_totals: dict[str, int] = {}
+    _cached_accum: dict[str, int] = {}
+    _cache_hits: dict[str, int] = {}
+    # Prompt tokens the provider served from its own prompt cache vs. processed
+    # in full: {provider: {"cached": n, "uncached": n}}
+    _prompt_totals: dict[str, dict[str, int]] = {}
+    _prompt_accum: dict[str, dict[str, int]] = {}
 
     @classmethod
     def inc(cls, provider: str, n: int) -> None:
@@ -48,6 +57,62 @@ class UsageLogger:
         if mm.enabled and hasattr(mm, f"{provider}_tokens_total"):
             getattr(mm, f"{provider}_tokens_total").inc(n)
 
+    @classmethod
+    def record_cache_hit(cls, provider: str, tokens_saved: int) -> None:
+        """Record a response served from the LLM cache for *provider*.
+
+        Cache hits are not billed, so they never touch the ``inc`` counters;
+        the tokens the original call cost are tallied separately instead.
+        """
+        cls._cache_hits[provider] = cls._cache_hits.get(provider, 0) + 1
+        if tokens_saved > 0:
+            cls._cached_totals[provider] = cls._cached_totals.get(provider, 0) + tokens_saved
+            cls._cached_accum[provider] = cls._cached_accum.get(provider, 0) + tokens_saved
+
+    @classmethod
+    def record_prompt_tokens(
+        cls, provider: str, model: str, prompt_tokens: int, cached_tokens: int
+    ) -> None:
+        """Record how many of *prompt_tokens* were provider prompt-cache hits.
+
+        The billed totals are still maintained by ``inc``; this only tracks the
+        split so the prompt-cache hit rate can be measured.
+        """
+        if prompt_tokens <= 0:
+            return
+        cached = min(max(cached_tokens, 0), prompt_tokens)
+        uncached = prompt_tokens - cached
+        for store in (cls._prompt_totals, cls._prompt_accum):
+            split = store.setdefault(provider, {"cached": 0, "uncached": 0})
+            split["cached"] += cached
+            split["uncached"] += uncached
+
+        counter = MetricsManager().llm_prompt_tokens_total
+        if cached:
+            counter.labels(provider=provider, model=model, cache="hit").inc(cached)
+        if uncached:
+            counter.labels(provider=provider, model=model, cache="miss").inc(uncached)
+
+    @classmethod
+    def get_prompt_cache_stats(cls) -> dict:
+        """Return ``{provider: {"cached", "uncached", "hit_rate"}}`` for this process."""
+        stats = {}
+        for provider, split in cls._prompt_totals.items():
+            total = split["cached"] + split["uncached"]
+            stats[provider] = dict(split, hit_rate=split["cached"] / total if total else 0.0)
+        return stats
+
+    @classmethod
+    def get_cache_stats(cls) -> dict:
+        """Return ``{provider: {"hits": n, "tokens_saved": n}}`` for this process."""
+        return {
+            provider: {
+                "hits": hits,
+                "tokens_saved": cls._cached_totals.get(provider, 0),
+            }
+            for provider, hits in cls._cache_hits.items()
+        }
+
     @classmethod
     def get_totals(cls) -> dict:
         """Return a shallow copy of the running totals."""
@@ -57,15 +122,25 @@ class UsageLogger:
     def _flush(cls) -> None:
         """Flush the _accum counts to disk and reset the accumulator."""
         # Skip writing empty deltas to avoid noisy logs
-        if not any(cls._accum.values()):
+        if (
+            not any(cls._accum.values())
+            and not any(cls._cached_accum.values())
+            and not cls._prompt_accum
+        ):
             return
 
-        data = {"timestamp": int(time.time())} | cls._accum
+        data: dict[str, object] = {"timestamp": int(time.time()), **cls._accum}
+        if any(cls._cached_accum.values()):
+            data["cached"] = dict(cls._cached_accum)
+        if cls._prompt_accum:
+            data["prompt_cache"] = {p: dict(split) for p, split in cls._prompt_accum.items()}
         LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
         with LOG_PATH.open("a", encoding="utf-8") as f:
             f.write(json.dumps(data, ensure_ascii=False) + "\n")
         # Reset accumulator after successful write
         cls._accum = {key: 0 for key in cls._accum}
+        cls._cached_accum = {}
+        cls._prompt_accum = {}
 
 
 # ---------------------------------------------------------------------------
@@ -2,7 +2,8 @@
 
 MultiAgentTool – minimal A2A proof-of-concept.  Spawns a *single-turn* sub-agent
 (a fresh ChatSession) with a role prompt and task, captures its first response
-and optionally persists it to a shared context file.
+and optionally persists it to a shared context file.  An optional ``context``
+argument is placed after the role prompt in the sub-agent's system prefix.
 """
 from __future__ import annotations
 
@@ -58,9 +59,10 @@ class MultiAgentTool(Tool):
             from src.core.chat_session import ChatSession as ChatSessionCls  # type: ignore
 
         logger.info("Spawning sub-agent '%s' for one-shot task", name)
-        sub_session = ChatSessionCls()
-        # Reset system prompt to role_prompt
-        sub_session.history.clear_chat(role_prompt)
+        # One-shot helper: its turn is returned to the caller, not saved as a chat
+        sub_session = ChatSessionCls(persist_history=False)
+        # Stable, cache-friendly prefix: base prompt → role prompt → tool context
+        sub_session.set_role_prompt(role_prompt, args.get("context"))
         # Run single turn
         responses = sub_session.process_user_message(task, model_choice="openai")
         if not responses:
@@ -2,4 +2,18 @@ import sys
 import os
 
 # Add the src directory to the Python path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))) 
\ No newline at end of file
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src'))) 
+
+import pytest  # noqa: E402
+
+from src.shared import history  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _isolated_session_history(tmp_path, monkeypatch):
+    """Keep the history journals written in tests (shared and per-session) out of agent_workspace."""
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.jsonl")
+    sessions = tmp_path / "sessions"
+    monkeypatch.setattr(history, "sessions_dir", lambda: sessions)
+    yield
+    history.close_all()
@@ -1,20 +1,16 @@
 import pytest
-import pathlib
 
 # Assuming the history module is at src/shared/history.py
 # Adjust the import path if necessary
 import src.shared.history as history
 
-TEST_HIST_PATH = pathlib.Path("agent_workspace/test_chat_history.json")
-
-# Use a different path for testing to avoid clashing with live history
-history.HIST_PATH = TEST_HIST_PATH
 
 @pytest.fixture(autouse=True)
-def cleanup_history_file():
-    """Fixture to ensure the history file is clean before and after each test."""
-    history.reset()
-    yield
+def hist_path(tmp_path, monkeypatch):
+    """Use a throwaway history file per test to avoid clashing with live history."""
+    path = tmp_path / "test_chat_history.json"
+    monkeypatch.setattr(history, "HIST_PATH", path)
+    yield path
     history.reset()
 
 def test_history_append_and_load():
@@ -29,17 +25,17 @@ def test_history_append_and_load():
     assert loaded_history[0] == {"r": "user", "c": "Hello"}
     assert loaded_history[1] == {"r": "agent", "c": "Hi there!"}
 
-def test_history_reset():
+def test_history_reset(hist_path):
     """Tests that history reset clears the file."""
     history.append("user", "Message 1")
     history.append("agent", "Response 1")
 
-    assert TEST_HIST_PATH.exists()
+    assert hist_path.exists()
     assert len(history.load()) == 2
 
     history.reset()
 
-    assert not TEST_HIST_PATH.exists()
+    assert not hist_path.exists()
     assert len(history.load()) == 0 # Loading after reset should return empty list
 
 def test_load_nonexistent_history():
@@ -68,4 +64,114 @@ def test_history_multiple_appends():
 
     assert len(loaded_history) == len(messages)
     for i, (role, content) in enumerate(messages):
-        assert loaded_history[i] == {"r": role, "c": content} 
\ No newline at end of file
+        assert loaded_history[i] == {"r": role, "c": content} 
+
+def test_torn_tail_is_ignored_and_dropped_on_next_append(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.jsonl")
+    history.extend([("user", "one"), ("openai", "two")])
+    history.store().close()  # As if the process crashed mid-append
+    with open(history.HIST_PATH, "a") as fh:
+        fh.write('{"r": "user", "c": "thr')
+
+    assert history.load() == [{"r": "user", "c": "one"}, {"r": "openai", "c": "two"}]
+    history.append("user", "three")
+    assert [e["c"] for e in history.load()] == ["one", "two", "three"]
+    assert history.HIST_PATH.read_text().count("\n") == 3
+
+
+def test_legacy_json_array_is_migrated(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.jsonl")
+    legacy = tmp_path / "chat_history.json"
+    legacy.write_text('[{"r": "user", "c": "old"}]')
+
+    assert history.load() == [{"r": "user", "c": "old"}]
+    history.append("openai", "new")
+    assert history.load() == [{"r": "user", "c": "old"}, {"r": "openai", "c": "new"}]
+    history.reset()
+    assert not legacy.exists() and history.load() == []
+
+
+@pytest.mark.parametrize("policy, expected", [("always", 3), ("never", 0)])
+def test_fsync_policy(tmp_path, monkeypatch, policy, expected):
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.jsonl")
+    monkeypatch.setattr(history.config, "HISTORY_FSYNC", policy)
+    calls = []
+    monkeypatch.setattr(history.os, "fsync", calls.append)
+    for i in range(3):
+        history.append("user", str(i))
+    assert len(calls) == expected
+    history.store().close()
+
+
+def test_compaction_keeps_newest_entries_and_drops_corrupt_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.jsonl")
+    monkeypatch.setattr(history.config, "HISTORY_MAX_ENTRIES", 5)
+    monkeypatch.setattr(history.config, "HISTORY_COMPACT_EVERY", 3)
+    history.append("user", "0")
+    history.store().close()
+    with open(history.HIST_PATH, "a") as fh:
+        fh.write("not json\n")
+    for i in range(1, 13):
+        history.append("user", str(i))
+
+    # Compacted after every third append once over the limit; the last pass left 5
+    assert [e["c"] for e in history.load()] == ["8", "9", "10", "11", "12"]
+    assert "not json" not in history.HIST_PATH.read_text()
+
+
+def test_tail_and_pages_match_a_full_load(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.jsonl")
+    monkeypatch.setattr(history, "_TAIL_CHUNK", 64)  # Force several backward reads
+    history.extend((("user" if i % 2 else "openai"), f"message {i} " * (i % 7)) for i in range(200))
+    everything = history.load()
+
+    assert history.count() == 200
+    assert history.load_tail(5) == everything[-5:]
+    assert history.load_tail(500) == everything
+    assert history.load_range(150, 175) == everything[150:175]
+    assert history.load_range(190, 400) == everything[190:]
+    assert history.load_range(-5, 3) == everything[:3]
+
+
+def test_tail_ignores_a_torn_record(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.jsonl")
+    history.extend([("user", "a"), ("openai", "b")])
+    with open(history.HIST_PATH, "a") as fh:
+        fh.write('{"r": "user", "c": "to')
+    assert history.load_tail(1) == [{"r": "openai", "c": "b"}]
+
+
+def test_stale_index_is_rebuilt(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.jsonl")
+    history.extend([("user", "a"), ("openai", "b")])
+    history.store().close()
+    # A crash after the journal write but before the index write
+    with open(history.HIST_PATH, "a") as fh:
+        fh.write('{"r": "user", "c": "c"}\n')
+
+    assert history.count() == 3
+    assert history.load_range(2, 3) == [{"r": "user", "c": "c"}]
+    history.reset()
+    assert not (tmp_path / "chat_history.jsonl.idx").exists()
+
+
+def test_default_session_takes_over_the_shared_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.jsonl")
+    monkeypatch.setattr(history, "sessions_dir", lambda: tmp_path / "sessions")
+    (tmp_path / "chat_history.json").write_text('[{"r": "user", "c": "before sessions"}]')
+
+    assert history.for_session("other").load() == []
+    default = history.for_session(history.DEFAULT_SESSION)
+    assert default.load() == [{"r": "user", "c": "before sessions"}]
+    default.append("openai", "after")
+    assert [e["c"] for e in default.load_tail(5)] == ["before sessions", "after"]
+    default.reset()
+    assert not (tmp_path / "chat_history.json").exists() and default.load() == []
+
+
+def test_legacy_file_next_to_a_custom_path_is_migrated(tmp_path):
+    custom = history.store(tmp_path / "elsewhere" / "notes.jsonl")
+    custom.path.parent.mkdir()
+    (tmp_path / "elsewhere" / "notes.json").write_text('[{"r": "user", "c": "old"}]')
+    custom.append("openai", "new")
+    assert [e["c"] for e in custom.load()] == ["old", "new"]
@@ -0,0 +1,136 @@
+"""Offline batch generation: bounded concurrency, checkpoint/resume, provider endpoint."""
+import json
+import threading
+
+import pytest
+
+from src import config
+from src.llm import batch
+from src.llm import clients as llm_clients
+from src.llm import resilience
+from src.llm.mock_backends import MockBehavior, MockOpenAIServer, use_mock_gemini
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(config, "LLM_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(config, "LLM_RETRY_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(config, "LLM_RATE_LIMITS", {})
+    resilience.reset_circuit_breakers()
+    yield
+    resilience.reset_circuit_breakers()
+
+
+def _write_requests(path, n):
+    with open(path, "w") as fh:
+        for i in range(n):
+            fh.write(json.dumps({"custom_id": f"r{i}", "messages": [{"role": "user", "content": f"q{i}"}]}) + "\n")
+    return path
+
+
+def _results(path):
+    return [json.loads(line) for line in open(path)]
+
+
+def _echo(prompt):
+    return "re " + prompt.splitlines()[-1]
+
+
+def test_concurrent_batch_writes_one_result_per_request(tmp_path):
+    requests = _write_requests(tmp_path / "in.jsonl", 12)
+    six = threading.Barrier(6, timeout=5)  # Breaks unless six requests are in flight at once
+
+    def reply_together(prompt):
+        six.wait()
+        return _echo(prompt)
+
+    behavior = MockBehavior(ttft_sec=0.0, tokens_per_sec=0, replies=reply_together)
+    with MockOpenAIServer(behavior) as server:
+        mgr = llm_clients.OpenAIClientManager(api_key="mock", default_model_name="gpt-4.1", base_url=server.base_url)
+        summary = mgr.generate_batch(str(requests), str(tmp_path / "out.jsonl"), concurrency=6)
+
+    results = {r["custom_id"]: r for r in _results(tmp_path / "out.jsonl")}
+    assert summary.succeeded == 12 and summary.failed == 0
+    assert results["r3"]["response"] == "re q3"
+    assert results["r3"]["model"] == "gpt-4.1"
+
+
+def test_concurrency_is_bounded(tmp_path):
+    requests = _write_requests(tmp_path / "in.jsonl", 10)
+    mgr = llm_clients.GeminiClientManager(api_key=None)
+    use_mock_gemini(mgr, MockBehavior(ttft_sec=0.02, tokens_per_sec=0))
+    in_flight, peak = [0], [0]
+    original = mgr.agenerate_response
+
+    async def tracking(history):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        try:
+            return await original(history)
+        finally:
+            in_flight[0] -= 1
+
+    mgr.agenerate_response = tracking
+    summary = mgr.generate_batch(str(requests), str(tmp_path / "out.jsonl"), concurrency=3)
+    assert summary.succeeded == 10
+    assert peak[0] == 3
+
+
+def test_rerun_skips_done_and_retries_failed(tmp_path):
+    requests = _write_requests(tmp_path / "in.jsonl", 4)
+    out = tmp_path / "out.jsonl"
+    out.write_text(
+        json.dumps({"custom_id": "r0", "model": "m", "response": "kept", "error": None}) + "\n"
+        + json.dumps({"custom_id": "r1", "model": "m", "response": None, "error": "boom"}) + "\n"
+        + '{"custom_id": "r2", "resp'  # Torn line from an interrupted run
+    )
+    mgr = llm_clients.GeminiClientManager(api_key=None)
+    model = use_mock_gemini(mgr, MockBehavior(ttft_sec=0.0, tokens_per_sec=0, replies=_echo))
+
+    summary = mgr.generate_batch(str(requests), str(out))
+
+    assert (summary.skipped, summary.succeeded) == (1, 3)
+    assert len(model.calls) == 3
+    results = _results(out)
+    assert sorted(r["custom_id"] for r in results) == ["r0", "r1", "r2", "r3"]
+    by_id = {r["custom_id"]: r for r in results}
+    assert by_id["r0"]["response"] == "kept"
+    assert by_id["r1"]["error"] is None
+
+
+def test_failed_requests_are_recorded_not_raised(tmp_path):
+    requests = _write_requests(tmp_path / "in.jsonl", 3)
+    mgr = llm_clients.GeminiClientManager(api_key=None)
+    use_mock_gemini(mgr, MockBehavior(ttft_sec=0.0, tokens_per_sec=0, error_rate=1.0, error_status=400))
+
+    summary = mgr.generate_batch(str(requests), str(tmp_path / "out.jsonl"))
+
+    assert summary.failed == 3
+    assert all(r["error"] and r["response"] is None for r in _results(tmp_path / "out.jsonl"))
+
+
+def test_provider_mode_uses_batch_endpoint_and_resumes(tmp_path):
+    requests = _write_requests(tmp_path / "in.jsonl", 5)
+    out = tmp_path / "out.jsonl"
+    seen = []
+
+    def handler(messages):
+        seen.append(messages[-1]["content"])
+        if messages[-1]["content"] == "q4":
+            raise RuntimeError("bad request")
+        return messages[-1]["content"].upper()
+
+    api = batch.LocalBatchAPI(handler)
+    mgr = llm_clients.OpenAIClientManager(api_key=None, default_model_name="gpt-4.1")
+    summary = mgr.generate_batch(str(requests), str(out), mode="provider", batch_api=api)
+
+    assert (summary.succeeded, summary.failed) == (4, 1)
+    by_id = {r["custom_id"]: r for r in _results(out)}
+    assert by_id["r2"]["response"] == "Q2"
+    assert "bad request" in by_id["r4"]["error"]
+    assert not (tmp_path / "out.jsonl.batch.json").exists()
+
+    # Only the failed request is resubmitted
+    seen.clear()
+    summary = batch.run_batch(mgr, requests, out, mode="provider", batch_api=api)
+    assert seen == ["q4"] and summary.skipped == 4
@@ -0,0 +1,77 @@
+"""Per-call latency / TTFT / throughput histograms and the /metrics command."""
+import pytest
+
+from src import config
+from src.handlers.command import CommandHandler
+from src.llm import clients as llm_clients
+from src.llm import resilience
+from src.llm.mock_backends import MockBehavior, use_mock_gemini
+from src.llm.resilience import LLMCallError
+from src.shared import metrics
+from src.shared.metrics import MetricsManager
+from src.tools.file_system import FileManagerTool
+
+
+@pytest.fixture
+def enabled_metrics(monkeypatch):
+    monkeypatch.setenv("ENABLE_METRICS", "1")
+    monkeypatch.setattr(metrics, "start_http_server", lambda *a, **k: None)
+    monkeypatch.setattr(config, "LLM_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(config, "LLM_RETRY_MAX_ATTEMPTS", 1)
+    resilience.reset_circuit_breakers()
+    MetricsManager._instance = None
+    MetricsManager._initialized = False
+    yield MetricsManager()
+    MetricsManager._instance = None
+    MetricsManager._initialized = False
+    resilience.reset_circuit_breakers()
+
+
+def _series(snapshot, name):
+    return {tuple(sorted(labels.items())): value for labels, value in snapshot[name]}
+
+
+def _gemini(behavior):
+    mgr = llm_clients.GeminiClientManager(api_key=None, default_model_name="gemini-test")
+    use_mock_gemini(mgr, behavior)
+    return mgr
+
+
+def test_blocking_and_streamed_calls_are_observed(enabled_metrics):
+    mgr = _gemini(MockBehavior(ttft_sec=0.02, tokens_per_sec=500, replies=["one two three four"]))
+    mgr.generate_response([{"role": "user", "content": "hi"}])
+    assert "".join(mgr.stream_response([{"role": "user", "content": "hi"}])) == "one two three four"
+
+    snapshot = enabled_metrics.get_snapshot()
+    key = (("model", "gemini-test"), ("provider", "gemini"))
+    latency = _series(snapshot, "llm_request_latency_seconds")[key]
+    assert latency["count"] == 2 and latency["mean"] >= 0.02
+    assert latency["p50"] <= latency["p95"] <= latency["p99"]
+    assert _series(snapshot, "llm_time_to_first_token_seconds")[key]["count"] == 1
+    assert _series(snapshot, "llm_output_tokens_per_second")[key]["count"] == 2
+
+
+def test_errors_are_counted_by_kind(enabled_metrics):
+    mgr = _gemini(MockBehavior(ttft_sec=0.0, tokens_per_sec=0, error_rate=1.0, error_status=503))
+    with pytest.raises(LLMCallError):
+        mgr.generate_response([{"role": "user", "content": "hi"}])
+
+    errors = _series(enabled_metrics.get_snapshot(), "llm_request_errors")
+    assert errors[(("kind", "transient"), ("model", "gemini-test"), ("provider", "gemini"))] == 1
+
+
+def test_metrics_command_renders_counters_and_histograms(enabled_metrics):
+    enabled_metrics.agents_spawned_total.inc(2)
+    enabled_metrics.llm_request_latency_seconds.labels("openai", "gpt-4.1").observe(1.5)
+    handler = CommandHandler(file_tool=FileManagerTool())
+
+    output = handler.execute_command(handler.parse("/metrics", []), None, "/metrics")
+
+    assert "**agents_spawned:**\n  - 2\n" in output
+    assert "{provider='openai', model='gpt-4.1'} count=1 mean=1.5" in output
+
+
+def test_bucket_quantile_interpolates():
+    buckets = [(1.0, 50.0), (2.0, 100.0), (float("inf"), 100.0)]
+    assert metrics._bucket_quantile(buckets, 100, 0.5) == 1.0
+    assert metrics._bucket_quantile(buckets, 100, 0.75) == 1.5
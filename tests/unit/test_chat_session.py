@@ -21,12 +21,13 @@ def test_add_and_clear_message_history():
     assert len(cs.history.messages) == 1
     assert cs.history.messages[0].role == 'system'
 
-def test_pending_write_logic():
+def test_pending_write_logic(monkeypatch):
     cs = ChatSession()
     cs.pending_write_user_path = 'foo.txt'
     cs.pending_write_content = 'bar'
     # Monkeypatch file_tool.execute to simulate a successful write
-    cs.file_tool.execute = lambda tool_input: type('FakeOutput', (), {'success': True, 'message': '✅ Saved', 'error': None})()
+    # The file tool is shared between sessions, so patch it for this test only
+    monkeypatch.setattr(cs.file_tool, 'execute', lambda tool_input: type('FakeOutput', (), {'success': True, 'message': '✅ Saved', 'error': None})())
     sender, response = cs.confirm_overwrite()
     assert 'Saved' in response
     assert cs.pending_write_user_path is None
@@ -0,0 +1,57 @@
+"""Process-wide pooled SDK clients shared across sessions and sub-agents."""
+import pytest
+
+from src import config
+from src.llm import client_pool
+from src.llm import clients as llm_clients
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    client_pool.reset_client_pool()
+    yield
+    client_pool.reset_client_pool()
+
+
+def test_openai_managers_share_one_client_per_key():
+    a = llm_clients.OpenAIClientManager(api_key="sk-one", default_model_name="gpt-4.1")
+    b = llm_clients.OpenAIClientManager(api_key="sk-one", default_model_name="o3")
+    c = llm_clients.OpenAIClientManager(api_key="sk-two", default_model_name="gpt-4.1")
+
+    assert a.client is b.client
+    assert a.client is not c.client
+    assert client_pool.get_client_pool().stats() == {"entries": 2, "hits": 1, "misses": 2}
+
+
+def test_pool_keys_never_hold_raw_api_keys():
+    llm_clients.OpenAIClientManager(api_key="sk-secret-value")
+    keys = list(client_pool.get_client_pool()._clients)
+    assert all("sk-secret-value" not in map(str, key) for key in keys)
+
+
+def test_gemini_configures_once_and_shares_model_handles(monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm_clients.genai, "configure", lambda api_key: calls.append(api_key))
+    monkeypatch.setattr(llm_clients, "_gemini_configured_key", None)
+
+    a = llm_clients.GeminiClientManager(api_key="g-key", default_model_name="gemini-test")
+    b = llm_clients.GeminiClientManager(api_key="g-key", default_model_name="gemini-test")
+
+    assert calls == ["g-key"]
+    assert a.client is b.client
+    assert a._model_for("be brief") is b._model_for("be brief")
+    assert a._model_for("be brief") is not a.client
+
+
+def test_disabled_pool_builds_per_manager(monkeypatch):
+    monkeypatch.setattr(config, "LLM_CLIENT_POOL_ENABLED", False)
+    a = llm_clients.OpenAIClientManager(api_key="sk-one")
+    b = llm_clients.OpenAIClientManager(api_key="sk-one")
+    assert a.client is not b.client
+
+
+def test_lru_bound():
+    pool = client_pool.ClientPool(max_entries=2)
+    for key in ("a", "b", "a", "c"):
+        pool.get(key, object)
+    assert list(pool._clients) == ["a", "c"]
@@ -0,0 +1,252 @@
+"""N-agent, N-round collaboration engine and the "collab" model choice."""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import config
+from src.core.chat_session import ChatSession
+from src.llm import collaboration
+from src.llm.collaboration import CollabAgent, Collaboration, format_event
+from src.llm.resilience import LLMCallError
+from src.shared import history
+
+
+class ScriptedManager:
+    """Answers from a per-round script; records the prompts it was sent.
+
+    *rendezvous* (a shared Barrier) makes calls wait for their peers, which only
+    returns if the calls run concurrently. A stream that *follows* another
+    manager holds back its n-th answer until that manager's n-th answer has
+    produced its first word.
+    """
+
+    def __init__(self, answers, delay=0.0, model="m", rendezvous=None, follows=None):
+        self.answers = list(answers)
+        self.delay = delay
+        self.model = model
+        self.rendezvous = rendezvous
+        self.follows = follows
+        self.prompts = []
+        self.available = True
+        self.streams_started = 0
+        self._lock = threading.Lock()
+        self._started = threading.Condition(self._lock)
+
+    def get_model_name(self):
+        return self.model
+
+    def _next(self, messages):
+        with self._lock:
+            self.prompts.append(messages)
+            answer = self.answers[min(len(self.prompts), len(self.answers)) - 1]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    def generate_response(self, messages):
+        if self.rendezvous is not None:
+            self.rendezvous.wait()
+        time.sleep(self.delay)
+        return self._next(messages)
+
+    async def agenerate_response(self, messages):
+        await asyncio.sleep(self.delay)
+        return self._next(messages)
+
+    def _wait_for_stream(self, count):
+        with self._started:
+            assert self._started.wait_for(lambda: self.streams_started >= count, timeout=5)
+
+    def stream_response(self, messages):
+        answer = self._next(messages)
+        if self.follows is not None:
+            self.follows._wait_for_stream(len(self.prompts))
+        for i, word in enumerate(answer.split(" ")):
+            time.sleep(self.delay)
+            yield word + " "
+            if i == 0:  # The first word has been handed on
+                with self._started:
+                    self.streams_started += 1
+                    self._started.notify_all()
+
+
+QUESTION = [{"role": "user", "content": "What is 2 + 2?"}]
+
+
+def test_agreeing_drafts_finish_in_one_parallel_round():
+    both = threading.Barrier(2, timeout=5)  # Breaks unless the drafts run in parallel
+    a = ScriptedManager(["The answer is 4."], rendezvous=both)
+    b = ScriptedManager(["The answer is 4."], rendezvous=both)
+    result = Collaboration([CollabAgent("a", a), CollabAgent("b", b)], max_rounds=3).run(QUESTION)
+
+    assert (result.answer, result.rounds, result.converged) == ("The answer is 4.", 1, True)
+    assert len(a.prompts) == len(b.prompts) == 1
+
+
+def test_disagreement_runs_revision_rounds_with_peer_answers():
+    a = ScriptedManager(["Paris is the capital of Italy.", "Rome is the capital of Italy."])
+    b = ScriptedManager(["Rome is the capital.", "Rome is the capital of Italy."])
+    result = Collaboration([CollabAgent("a", a), CollabAgent("b", b)], max_rounds=3).run(QUESTION)
+
+    assert result.rounds == 2 and result.converged
+    assert result.answer == "Rome is the capital of Italy."
+    revision = a.prompts[1]
+    assert revision[:-2] == QUESTION
+    assert revision[-2] == {"role": "assistant", "content": "Paris is the capital of Italy."}
+    assert "[b]\nRome is the capital." in revision[-1]["content"]
+    assert [(t.round, t.agent) for t in result.transcript] == [(1, "a"), (1, "b"), (2, "a"), (2, "b")]
+
+
+def test_round_limit_returns_lead_agent_answer():
+    a = ScriptedManager(["alpha one", "alpha two", "alpha three"])
+    b = ScriptedManager(["beta one", "beta two", "beta three"])
+    c = ScriptedManager(["gamma one", "gamma two", "gamma three"])
+    agents = [CollabAgent("a", a), CollabAgent("b", b), CollabAgent("c", c)]
+    result = Collaboration(agents, max_rounds=2).run(QUESTION)
+
+    assert (result.rounds, result.converged, result.answer) == (2, False, "alpha two")
+    assert "[b]" in a.prompts[1][-1]["content"] and "[c]" in a.prompts[1][-1]["content"]
+
+
+def test_failing_agent_drops_out():
+    a = ScriptedManager([LLMCallError("openai", "down", transient=True)])
+    b = ScriptedManager(["only b"])
+    result = Collaboration([CollabAgent("a", a), CollabAgent("b", b)]).run(QUESTION)
+    assert (result.answer, result.rounds) == ("only b", 1)
+
+
+def test_all_agents_failing_raises():
+    a = ScriptedManager([LLMCallError("openai", "down", transient=True)])
+    with pytest.raises(LLMCallError):
+        Collaboration([CollabAgent("a", a)]).run(QUESTION)
+
+
+def test_arun_matches_run():
+    a = ScriptedManager(["same answer"], delay=0.05)
+    b = ScriptedManager(["same answer"], delay=0.05)
+    result = asyncio.run(Collaboration([CollabAgent("a", a), CollabAgent("b", b)]).arun(QUESTION))
+    assert (result.answer, result.rounds) == ("same answer", 1)
+
+
+def test_rounds_are_timed():
+    a = ScriptedManager(["alpha one", "alpha two"], delay=0.05)
+    b = ScriptedManager(["beta one", "beta two"], delay=0.05)
+    result = Collaboration([CollabAgent("a", a), CollabAgent("b", b)], max_rounds=2).run(QUESTION)
+    assert len(result.round_seconds) == 2 and all(s >= 0.05 for s in result.round_seconds)
+    assert result.elapsed_sec >= sum(result.round_seconds)
+
+
+def _streamed(agents, max_rounds=2):
+    events = []
+    result = Collaboration(agents, max_rounds=max_rounds).stream(QUESTION, events.append)
+    return result, events
+
+
+def test_stream_relays_each_answer_whole_in_round_order(monkeypatch):
+    monkeypatch.setattr(config, "LLM_COLLAB_SPECULATE_CHARS", 0)
+    b = ScriptedManager(["beta one", "merged answer"])
+    a = ScriptedManager(["alpha one two", "merged answer"], follows=b)
+    result, events = _streamed([CollabAgent("a", a), CollabAgent("b", b)])
+
+    assert (result.answer.strip(), result.rounds) == ("merged answer", 2)
+    starts = [(e.round, e.agent) for e in events if e.kind == "start"]
+    assert starts == [(1, "b"), (1, "a"), (2, "b"), (2, "a")]  # b's first token is earlier
+    assert [e.round for e in events if e.kind == "round"] == [1, 2]
+    text = "".join(format_event(e) for e in events)
+    assert "[Round 1 · b]\nbeta one \n" in text and "⏱ Round 2:" in text
+    assert all(t.seconds is not None and t.ttft is not None for t in result.transcript)
+    assert len(result.round_seconds) == 2
+
+
+def test_stream_starts_revision_on_partial_draft(monkeypatch):
+    monkeypatch.setattr(config, "LLM_COLLAB_SPECULATE_CHARS", 10)
+    monkeypatch.setattr(config, "LLM_COLLAB_SPECULATE_ACCEPT", 0.5)
+    fast = ScriptedManager(["short draft", "final words here"], delay=0.01)
+    slow = ScriptedManager(["a b c d e f g", "final words here"], delay=0.03)
+    result, events = _streamed([CollabAgent("fast", fast), CollabAgent("slow", slow)])
+
+    revision = fast.prompts[1][-1]["content"]
+    assert collaboration.DRAFT_MARKER in revision  # Saw slow's draft mid-way
+    turn = next(t for t in result.transcript if (t.round, t.agent) == (2, "fast"))
+    assert turn.speculative
+    assert len(fast.prompts) == 2  # Accepted, not restarted
+    assert any(e.kind == "round" and e.speculative == 1 for e in events)
+
+
+def test_stream_restarts_revision_that_saw_too_little(monkeypatch):
+    monkeypatch.setattr(config, "LLM_COLLAB_SPECULATE_CHARS", 4)
+    monkeypatch.setattr(config, "LLM_COLLAB_SPECULATE_ACCEPT", 1.0)
+    fast = ScriptedManager(["short draft", "early guess", "final words"], delay=0.01)
+    slow = ScriptedManager(["a b c d e f g", "final words"], delay=0.03)
+    result, _events = _streamed([CollabAgent("fast", fast), CollabAgent("slow", slow)])
+
+    assert len(fast.prompts) == 3
+    assert collaboration.DRAFT_MARKER not in fast.prompts[2][-1]["content"]
+    assert "[slow]\na b c d e f g" in fast.prompts[2][-1]["content"]
+    assert not any(t.speculative for t in result.transcript)
+    assert result.answer.strip() == "final words"
+
+
+def test_stream_cancels_speculation_when_drafts_converge(monkeypatch):
+    monkeypatch.setattr(config, "LLM_COLLAB_SPECULATE_CHARS", 2)
+    fast = ScriptedManager(["one two three", "never shown"], delay=0.01)
+    slow = ScriptedManager(["one two three"], delay=0.03)
+    result, events = _streamed([CollabAgent("fast", fast), CollabAgent("slow", slow)])
+
+    assert (result.rounds, result.converged) == (1, True)
+    assert not any(e.round == 2 for e in events)
+
+
+def test_module_run_uses_the_managers_models():
+    a = ScriptedManager(["x y z"], model="gpt-4.1-mini")
+    b = ScriptedManager(["x y z"], model="gemini-2.5-flash")
+    assert collaboration.run("q", a, b) == "x y z"
+    assert a.prompts[0] == [{"role": "user", "content": "q"}]
+
+
+def test_module_run_keeps_accepting_sdk_clients():
+    openai_calls = []
+
+    def create(model, messages):
+        openai_calls.append(model)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="same answer"))])
+
+    openai_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    gemini_client = SimpleNamespace(generate_content=lambda prompt: SimpleNamespace(text="same answer"))
+
+    assert collaboration.run("q", openai_client, gemini_client) == "same answer"
+    assert openai_calls == [config.DEFAULT_OPENAI_MODEL]
+    assert collaboration.run("q", openai_client, None).startswith("Error:")
+
+
+def test_chat_session_collab_choice(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.json")
+    monkeypatch.setattr(config, "LLM_COLLAB_MAX_ROUNDS", 2)
+    cs = ChatSession()
+    cs.openai_manager = ScriptedManager(["draft one", "merged answer"])
+    cs.gemini_manager = ScriptedManager(["draft two", "merged answer"])
+
+    replies = cs.process_user_message("question?", model_choice="collab")
+
+    assert replies == [("collab", "merged answer")]
+    assert cs.last_collaboration.rounds == 2
+    assert cs.openai_manager.prompts[0][-1] == {"role": "user", "content": "question?"}
+    assert any(m.sender_provider == "collab" for m in cs.history.messages)
+
+
+def test_chat_session_streams_collab_transcript(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.json")
+    cs = ChatSession()
+    cs.openai_manager = ScriptedManager(["same answer"])
+    cs.gemini_manager = ScriptedManager(["same answer"])
+    deltas = []
+
+    replies = cs.process_user_message("question?", model_choice="collab", on_delta=lambda s, d: deltas.append((s, d)))
+
+    assert replies == [("collab", "same answer ")]
+    transcript = "".join(d for s, d in deltas if s == "collab")
+    assert "[Round 1 · openai]" in transcript and "[Round 1 · gemini]" in transcript
+    assert "⏱ Round 1:" in transcript
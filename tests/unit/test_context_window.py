@@ -0,0 +1,140 @@
+"""Token-budgeted context window over ConversationHistory."""
+from types import SimpleNamespace
+
+from src.core.chat_session import ConversationHistory
+from src.core.context_window import (
+    SUMMARY_PREFIX,
+    ContextWindow,
+    budget_for_model,
+    extractive_summarizer,
+)
+
+
+class CountingManager:
+    """One token per word; records which texts were counted."""
+
+    def __init__(self, model="test-model"):
+        self.counted = []
+        self.model = model
+
+    def get_model_name(self):
+        return self.model
+
+    def count_tokens_many(self, texts):
+        self.counted.extend(texts)
+        return [len(t.split()) for t in texts]
+
+
+def _history(turns):
+    hist = ConversationHistory("sys prompt")
+    for i in range(turns):
+        hist.add_message("user", f"question {i} " + "w " * 8, "user")
+        hist.add_message("assistant", f"answer {i} " + "w " * 8, "openai")
+    return hist
+
+
+def test_under_budget_history_is_unchanged():
+    hist = _history(2)
+    window = ContextWindow(min_recent_messages=2)
+    assert window.fit(hist, "openai", CountingManager(), budget=1000) == hist.get_openai_format()
+
+
+def test_old_turns_fold_into_summary_and_system_prompt_is_pinned():
+    hist = _history(6)  # 12 messages of 10 tokens each
+    window = ContextWindow(min_recent_messages=2, summary_tokens=25)
+
+    fitted = window.fit(hist, "openai", CountingManager(), budget=60)
+
+    assert fitted[0] == {"role": "system", "content": "sys prompt"}
+    assert fitted[1]["role"] == "system" and fitted[1]["content"].startswith(SUMMARY_PREFIX)
+    assert not any(m["content"].startswith("question 0") for m in fitted)
+    assert fitted[-1]["content"].startswith("answer 5")
+    assert fitted[2]["role"] == "user"  # Folding happens on turn boundaries
+    assert sum(len(m["content"].split()) for m in fitted) <= 60
+
+
+def test_counts_are_cached_per_message():
+    hist = _history(3)
+    manager = CountingManager()
+    window = ContextWindow(min_recent_messages=2)
+    window.fit(hist, "openai", manager, budget=1000)
+    first = len(manager.counted)
+
+    hist.add_message("user", "one more", "user")
+    window.fit(hist, "openai", manager, budget=1000)
+
+    assert manager.counted[first:] == ["one more"]
+
+
+def test_switching_model_recounts_with_its_tokenizer():
+    hist = _history(2)
+    window = ContextWindow(min_recent_messages=2)
+    window.message_counts(hist, "openai", CountingManager("gpt-4.1"))
+
+    other = CountingManager("o3")
+    window.fit(hist, "openai", other, budget=1000)
+
+    assert len(other.counted) == len(hist.messages)
+
+
+def test_clear_chat_resets_summary():
+    hist = _history(6)
+    window = ContextWindow(min_recent_messages=2)
+    window.fit(hist, "openai", CountingManager(), budget=60)
+
+    hist.clear_chat("new prompt")
+    hist.add_message("user", "hi", "user")
+
+    assert window.fit(hist, "openai", CountingManager(), budget=60) == [
+        {"role": "system", "content": "new prompt"},
+        {"role": "user", "content": "hi"},
+    ]
+
+
+def test_error_entries_are_not_sent():
+    hist = _history(1)
+    hist.add_message("error", "⚠️ boom", "openai")
+    roles = [m["role"] for m in ContextWindow().fit(hist, "openai", CountingManager(), budget=1000)]
+    assert roles == ["system", "user", "assistant"]
+
+
+def test_budget_for_model_uses_prefix_and_cap(monkeypatch):
+    from src import config
+
+    monkeypatch.setattr(config, "LLM_CONTEXT_WINDOWS", {"gpt-4": 8000, "gpt-4.1": 100000})
+    monkeypatch.setattr(config, "LLM_CONTEXT_RESPONSE_RESERVE", 1000)
+    monkeypatch.setattr(config, "LLM_CONTEXT_BUDGET_TOKENS", 0)
+    assert budget_for_model("gpt-4.1-mini") == 99000
+    assert budget_for_model("gpt-4o") == 7000
+    monkeypatch.setattr(config, "LLM_CONTEXT_BUDGET_TOKENS", 5000)
+    assert budget_for_model("gpt-4.1") == 5000
+
+
+def test_extractive_summary_clip_scales_with_budget(monkeypatch):
+    from src import config
+
+    folded = [SimpleNamespace(role="user", sender_provider="user", content="word " * 400)]
+    monkeypatch.setattr(config, "LLM_CONTEXT_SUMMARY_LINE_CHARS", 0)
+    assert len(extractive_summarizer("", folded, max_tokens=60)) == len("- user: ") + 231
+    assert len(extractive_summarizer("", folded, max_tokens=1024)) == len("- user: ") + 1999
+    monkeypatch.setattr(config, "LLM_CONTEXT_SUMMARY_LINE_CHARS", 80)
+    assert len(extractive_summarizer("", folded, max_tokens=1024)) == len("- user: ") + 80
+
+
+def test_manager_without_counter_falls_back_to_estimates():
+    hist = _history(1)
+    manager = SimpleNamespace(get_model_name=lambda: "m")
+    assert len(ContextWindow().fit(hist, "gemini", manager)) == 3
+
+
+def test_message_counts_reuse_the_window_state():
+    hist = _history(2)
+    manager = CountingManager()
+    window = ContextWindow(min_recent_messages=2)
+    assert window.message_counts(hist, "openai", manager) == [2] + [10] * 4
+    first = len(manager.counted)
+
+    hist.add_message("assistant", "new reply", "openai")
+    window.fit(hist, "openai", manager, budget=1000)
+    assert window.message_counts(hist, "openai", manager)[-1] == 2
+    assert manager.counted[first:] == ["new reply"]
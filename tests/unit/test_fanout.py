@@ -0,0 +1,117 @@
+"""Concurrent "both" turns: fan-out helpers and ChatSession integration."""
+import asyncio
+import time
+
+import pytest
+
+from src import config
+from src.core.chat_session import ChatSession
+from src.llm import clients as llm_clients
+from src.llm import resilience
+from src.llm.fanout import fan_out_call, fan_out_stream
+from src.llm.mock_backends import MockBehavior, MockOpenAIServer, use_mock_gemini
+from src.llm.resilience import LLMCallError
+from src.shared import history
+
+DELAY = 0.3
+
+
+@pytest.fixture(autouse=True)
+def isolated(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.json")
+    monkeypatch.setattr(config, "LLM_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(config, "LLM_RETRY_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(config, "LLM_RATE_LIMITS", {})
+    resilience.reset_circuit_breakers()
+    yield
+    resilience.reset_circuit_breakers()
+
+
+@pytest.fixture
+def server():
+    behavior = MockBehavior(ttft_sec=DELAY, tokens_per_sec=200, replies=["from openai side"])
+    with MockOpenAIServer(behavior) as srv:
+        yield srv
+
+
+def _session(server, gemini_behavior=None):
+    cs = ChatSession()
+    cs.openai_manager = llm_clients.OpenAIClientManager(
+        api_key="mock", default_model_name="gpt-4.1", base_url=server.base_url
+    )
+    use_mock_gemini(
+        cs.gemini_manager,
+        gemini_behavior or MockBehavior(ttft_sec=DELAY, tokens_per_sec=200, replies=["from gemini side"]),
+    )
+    return cs
+
+
+def test_both_runs_concurrently_and_records_each_sender(server):
+    cs = _session(server)
+    start = time.perf_counter()
+    replies = cs.process_user_message("hello", model_choice="both")
+    elapsed = time.perf_counter() - start
+
+    assert replies == [("openai", "from openai side"), ("gemini", "from gemini side")]
+    assert elapsed < 2 * DELAY
+    senders = {m.sender_provider for m in cs.history.messages if m.role == "assistant"}
+    assert senders == {"openai", "gemini"}
+
+
+def test_both_streams_one_answer_at_a_time(server):
+    cs = _session(server)
+    deltas = []
+    replies = cs.process_user_message("hello", model_choice="both", on_delta=lambda s, d: deltas.append((s, d)))
+
+    senders = [sender for sender, _ in deltas]
+    switches = sum(1 for a, b in zip(senders, senders[1:]) if a != b)
+    assert switches == 1
+    for sender, answer in replies:
+        assert "".join(d for s, d in deltas if s == sender) == answer
+
+
+def test_one_failing_provider_keeps_the_other_answer(server):
+    cs = _session(server, MockBehavior(ttft_sec=0.0, tokens_per_sec=0, error_rate=1.0, error_status=400))
+    replies = cs.process_user_message("hello", model_choice="both")
+
+    assert replies[0] == ("openai", "from openai side")
+    assert replies[1][0] == "gemini" and replies[1][1].startswith("⚠️")
+    assert [m.sender_provider for m in cs.history.messages if m.role == "error"] == ["gemini"]
+
+
+def test_both_async(server):
+    cs = _session(server)
+
+    async def main():
+        try:
+            return await cs.process_user_message_async("hello", model_choice="both")
+        finally:
+            await cs.openai_manager.aclose()
+
+    start = time.perf_counter()
+    replies = asyncio.run(main())
+    assert [sender for sender, _ in replies] == ["openai", "gemini"]
+    assert time.perf_counter() - start < 2 * DELAY
+
+
+def test_fan_out_call_returns_errors_per_provider():
+    def boom():
+        raise LLMCallError("gemini", "down", transient=True)
+
+    results = fan_out_call([("openai", lambda: "ok"), ("gemini", boom)])
+    assert results["openai"] == "ok"
+    assert isinstance(results["gemini"], LLMCallError)
+
+
+def test_fan_out_stream_buffers_the_slower_answer():
+    def stream(prefix, delay):
+        def gen():
+            for i in range(3):
+                time.sleep(delay)
+                yield f"{prefix}{i}"
+        return gen
+
+    seen = []
+    results = fan_out_stream([("a", stream("a", 0.03)), ("b", stream("b", 0.01))], lambda s, d: seen.append(d))
+    assert seen == ["b0", "b1", "b2", "a0", "a1", "a2"]
+    assert results == {"a": "a0a1a2", "b": "b0b1b2"}
@@ -0,0 +1,206 @@
+"""Hedged requests / failover between providers."""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.core.chat_session import ChatSession
+from src.llm import clients, hedging
+from src.llm.hedging import LatencyTracker, ahedged_call, hedged_call, hedged_stream
+from src.llm.resilience import LLMCallError
+
+
+def _slow(value, seconds, calls=None):
+    def fn():
+        if calls is not None:
+            calls.append(value)
+        time.sleep(seconds)
+        return value
+
+    return fn
+
+
+def _fail(calls=None):
+    def fn():
+        if calls is not None:
+            calls.append("fail")
+        raise LLMCallError("openai", "Error communicating with OpenAI: boom")
+
+    return fn
+
+
+def test_latency_tracker_percentile_and_default(monkeypatch):
+    monkeypatch.setattr(hedging.config, "LLM_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(hedging.config, "LLM_HEDGE_DEFAULT_DELAY_SEC", 7.0)
+    tracker = LatencyTracker()
+    assert tracker.hedge_delay("openai") == 7.0
+    for seconds in [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]:
+        tracker.observe("openai", seconds)
+    assert tracker.percentile("openai", 50) == 5
+    assert tracker.percentile("openai", 95) == 10
+    assert tracker.hedge_delay("openai") == 10
+
+
+def test_fast_primary_is_not_hedged():
+    calls = []
+    winner = hedged_call(
+        ("openai", _slow("a", 0.0, calls)),
+        ("gemini", _slow("b", 0.0, calls)),
+        delay=0.5,
+        tracker=LatencyTracker(),
+    )
+    assert winner == ("openai", "a")
+    assert calls == ["a"]
+
+
+def test_slow_primary_loses_to_hedge():
+    tracker = LatencyTracker()
+    winner = hedged_call(
+        ("openai", _slow("a", 0.5)), ("gemini", _slow("b", 0.0)), delay=0.05, tracker=tracker
+    )
+    assert winner == ("gemini", "b")
+    assert tracker.percentile("gemini", 50) is not None
+
+
+def test_primary_failure_fails_over_immediately():
+    start = time.monotonic()
+    winner = hedged_call(
+        ("openai", _fail()), ("gemini", _slow("b", 0.0)), delay=5.0, tracker=LatencyTracker()
+    )
+    assert winner == ("gemini", "b")
+    assert time.monotonic() - start < 1.0
+
+
+def test_both_failing_raises_primary_error():
+    with pytest.raises(LLMCallError):
+        hedged_call(("openai", _fail()), ("gemini", _fail()), delay=0.01, tracker=LatencyTracker())
+
+
+def test_async_hedge_cancels_loser():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "a"
+
+    async def fast():
+        return "b"
+
+    async def main():
+        return await ahedged_call(
+            ("openai", slow), ("gemini", fast), delay=0.02, tracker=LatencyTracker()
+        )
+
+    assert asyncio.run(main()) == ("gemini", "b")
+    assert cancelled == [True]
+
+
+def test_stream_hedge_on_first_token_and_loser_closed():
+    closed = threading.Event()
+
+    def slow_stream():
+        try:
+            time.sleep(0.3)
+            yield "late"
+        finally:
+            closed.set()
+
+    def fast_stream():
+        yield "x"
+        yield "y"
+
+    pairs = list(
+        hedged_stream(
+            ("openai", slow_stream), ("gemini", fast_stream), delay=0.05, tracker=LatencyTracker()
+        )
+    )
+    assert pairs == [("gemini", "x"), ("gemini", "y")]
+    assert closed.wait(2)
+
+
+
+def test_stalled_loser_is_aborted_when_the_winner_is_chosen():
+    aborted = threading.Event()
+
+    def stalled_stream():
+        hedging.on_cancel(aborted.set)  # Stands in for closing the HTTP response
+        aborted.wait(5)  # Blocked reading; no chunk ever arrives
+        yield "late"
+
+    def fast_stream():
+        yield "x"
+        time.sleep(0.5)  # Still streaming when the loser must already be aborted
+        yield "y"
+
+    stream = hedged_stream(
+        ("openai", stalled_stream), ("gemini", fast_stream), delay=0.05, tracker=LatencyTracker()
+    )
+    assert next(stream) == ("gemini", "x")
+    assert aborted.wait(0.2)
+    assert list(stream) == [("gemini", "y")]
+
+
+def test_cancelled_stream_error_is_not_a_provider_failure(monkeypatch):
+    recorded = []
+    breaker = SimpleNamespace(record_failure=lambda: recorded.append("failure"))
+    monkeypatch.setattr(clients, "get_circuit_breaker", lambda provider: breaker)
+    cancellation = hedging._Cancellation()
+    cancellation.set()
+    monkeypatch.setattr(hedging._attempt, "cancellation", cancellation, raising=False)
+    with pytest.raises(LLMCallError, match="cancelled"):
+        clients._raise_stream_error("openai", ConnectionError("response closed"))
+    assert recorded == []
+
+
+def test_stream_pause_after_first_token_does_not_hedge():
+    calls = []
+
+    def pausing_stream():
+        calls.append("openai")
+        yield "a"
+        time.sleep(0.15)  # Mid-stream stall, well past the hedge delay
+        yield "b"
+
+    def secondary_stream():
+        calls.append("gemini")
+        yield "never"
+
+    pairs = list(
+        hedged_stream(
+            ("openai", pausing_stream), ("gemini", secondary_stream), delay=0.03, tracker=LatencyTracker()
+        )
+    )
+    assert pairs == [("openai", "a"), ("openai", "b")]
+    assert calls == ["openai"]
+
+def _manager(answer, seconds=0.0):
+    def generate(_messages):
+        time.sleep(seconds)
+        return answer
+
+    return SimpleNamespace(
+        available=True, generate_response=generate, get_model_name=lambda: "m"
+    )
+
+
+def test_chat_session_records_winning_provider(tmp_path, monkeypatch):
+    from src.shared import history
+
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.json")
+    monkeypatch.setattr(hedging.config, "LLM_HEDGE_DEFAULT_DELAY_SEC", 0.05)
+    monkeypatch.setattr(hedging.config, "LLM_HEDGE_MIN_DELAY_SEC", 0.0)
+    monkeypatch.setattr(hedging, "_tracker", LatencyTracker())
+    cs = ChatSession()
+    cs.hedge_requests = True
+    cs.openai_manager = _manager("slow answer", seconds=0.5)
+    cs.gemini_manager = _manager("fast answer")
+
+    replies = cs.process_user_message("hi", model_choice="openai")
+
+    assert replies == [("gemini", "fast answer")]
@@ -0,0 +1,51 @@
+"""Incrementally maintained, read-only ConversationHistory views."""
+import pytest
+
+from src.core.chat_session import ConversationHistory, HistoryView
+
+
+def _history():
+    hist = ConversationHistory("be nice")
+    hist.add_message("user", "hi", "user")
+    hist.add_message("assistant", "hello", "openai")
+    hist.add_message("error", "⚠️ Gemini failed", "gemini")
+    return hist
+
+
+def test_views_match_the_messages():
+    hist = _history()
+    assert hist.get_chat_log() == [("user", "hi"), ("openai", "hello"), ("gemini", "⚠️ Gemini failed")]
+    assert hist.get_openai_format() == [
+        {"role": "system", "content": "be nice"},
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+    ]
+    assert hist.get_gemini_format() == hist.get_openai_format()
+    assert hist.get_chat_log()[-1] == ("gemini", "⚠️ Gemini failed")
+    assert hist.get_openai_format()[1:] == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+    ]
+
+
+def test_views_are_snapshots_and_survive_clear():
+    hist = _history()
+    log = hist.get_chat_log()
+    hist.add_message("user", "again", "user")
+    assert len(log) == 3 and log[-1] == ("gemini", "⚠️ Gemini failed")
+    assert len(hist.get_chat_log()) == 4
+
+    hist.clear_chat("be nice")
+    assert len(log) == 3
+    assert hist.get_chat_log() == [] and len(hist.get_openai_format()) == 1
+
+
+def test_views_are_read_only():
+    view = _history().get_chat_log()
+    assert isinstance(view, HistoryView)
+    with pytest.raises(TypeError):
+        view[0] = ("user", "changed")
+    with pytest.raises(AttributeError):
+        view.append(("user", "more"))
+    with pytest.raises(IndexError):
+        view[3]
@@ -0,0 +1,71 @@
+"""ChatSession builds provider clients on first use and shares its stateless helpers."""
+import pytest
+
+from src.core import chat_session as chat_session_module
+from src.core.chat_session import ChatSession
+
+
+class CountingManager:
+    """Stands in for a client manager and records how often one is built."""
+
+    built = []
+
+    def __init__(self, api_key, default_model_name):
+        self.built.append(default_model_name)
+        self.model_name = default_model_name
+        self.available = True
+
+    def get_model_name(self):
+        return self.model_name
+
+    def set_model_name(self, model_name):
+        self.model_name = model_name
+        return True
+
+    def generate_response(self, messages):
+        return f"answer from {self.model_name}"
+
+
+@pytest.fixture
+def built(monkeypatch):
+    CountingManager.built = []
+    monkeypatch.setattr(chat_session_module, "OpenAIClientManager", CountingManager)
+    monkeypatch.setattr(chat_session_module, "GeminiClientManager", CountingManager)
+    return CountingManager.built
+
+
+def test_construction_builds_no_provider_clients(built):
+    cs = ChatSession(persist_history=False)
+    assert built == []
+    assert cs.openai_model and cs.gemini_model  # Readable without building a client
+    assert built == []
+
+
+def test_openai_turn_builds_only_openai(built, monkeypatch):
+    monkeypatch.setattr(chat_session_module.config, "LLM_HEDGE_ENABLED", False)
+    cs = ChatSession(persist_history=False)
+    replies = cs.process_user_message("hi", model_choice="openai")
+    assert built == [cs.openai_model]
+    assert replies[0][0] == "openai"
+
+
+def test_model_chosen_before_first_use_is_used_to_build(built):
+    cs = ChatSession(persist_history=False)
+    cs.gemini_model = "gemini-test"
+    assert built == []
+    assert cs.gemini_available and built == ["gemini-test"]
+
+
+def test_sessions_share_command_handler_and_file_tool():
+    first, second = ChatSession(persist_history=False), ChatSession(persist_history=False)
+    assert first.command_handler is second.command_handler
+    assert first.file_tool is second.file_tool is first.command_handler.file_tool
+
+
+def test_reply_tokens_sum_only_that_providers_replies(built, monkeypatch):
+    monkeypatch.setattr(chat_session_module.config, "LLM_HEDGE_ENABLED", False)
+    cs = ChatSession(persist_history=False)
+    cs.process_user_message("hi", model_choice="openai")
+    counts = cs.context_window.message_counts(cs.history, "openai")
+    assert cs.reply_tokens("openai") == counts[-1] > 0
+    assert cs.reply_tokens("gemini") == 0
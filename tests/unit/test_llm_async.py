@@ -0,0 +1,91 @@
+"""Async client manager / ChatSession tests using in-process fake SDK clients."""
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from src.core.chat_session import ChatSession
+from src.llm import clients as llm_clients
+
+
+class FakeAsyncOpenAI:
+    """Mimics ``AsyncOpenAI().chat.completions.create`` with a fixed delay."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(self.delay)
+        last = kwargs["messages"][-1]["content"]
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=f"re:{last}"))],
+            usage=SimpleNamespace(total_tokens=3),
+        )
+
+
+class FakeAsyncGemini:
+    async def generate_content_async(self, prompt):
+        return SimpleNamespace(text="gemini-async", usage_metadata=None)
+
+
+def _session(tmp_path, monkeypatch, delay=0.0):
+    from src.shared import history
+
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.json")
+    cs = ChatSession()
+    cs.openai_manager.client = object()
+    cs.openai_manager._available = True
+    cs.openai_manager._async_client = FakeAsyncOpenAI(delay)
+    return cs
+
+
+def test_openai_agenerate_unavailable():
+    mgr = llm_clients.OpenAIClientManager(api_key=None, default_model_name="dummy")
+    assert "not available" in asyncio.run(mgr.agenerate_response([]))
+
+
+def test_gemini_agenerate_response():
+    mgr = llm_clients.GeminiClientManager(api_key=None, default_model_name="dummy")
+    mgr.client = FakeAsyncGemini()
+    mgr._available = True
+    assert asyncio.run(mgr.agenerate_response([{"role": "user", "content": "x"}])) == "gemini-async"
+
+
+def test_process_user_message_async(tmp_path, monkeypatch):
+    cs = _session(tmp_path, monkeypatch)
+    replies = asyncio.run(cs.process_user_message_async("ping"))
+    assert replies == [("openai", "re:ping")]
+
+
+def test_async_command_runs_in_thread(tmp_path, monkeypatch):
+    cs = _session(tmp_path, monkeypatch)
+    worker_threads = []
+
+    def fake_execute(parsed, session, raw):
+        worker_threads.append(threading.get_ident())
+        return "listed"
+
+    monkeypatch.setattr(cs.command_handler, "execute_command", fake_execute)
+    replies = asyncio.run(cs.process_user_message_async("/list ."))
+    assert replies == [("openai", "listed")]
+    assert worker_threads and worker_threads[0] != threading.get_ident()
+
+
+def test_sessions_multiplex_on_one_loop(tmp_path, monkeypatch):
+    sessions = [_session(tmp_path, monkeypatch, delay=0.2) for _ in range(5)]
+
+    async def _run_all():
+        return await asyncio.gather(
+            *(cs.process_user_message_async(f"q{i}") for i, cs in enumerate(sessions))
+        )
+
+    start = time.perf_counter()
+    results = asyncio.run(_run_all())
+    elapsed = time.perf_counter() - start
+
+    assert [r[0][1] for r in results] == [f"re:q{i}" for i in range(5)]
+    # Five 0.2 s calls overlap instead of taking a full second back to back.
+    assert elapsed < 0.6
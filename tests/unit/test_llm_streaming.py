@@ -0,0 +1,107 @@
+"""Streaming generation tests for the client managers and ChatSession.
+
+Fake SDK clients yield pre-built chunks so no network access is needed.
+"""
+from types import SimpleNamespace
+
+from src.core.chat_session import ChatSession
+from src.llm import clients as llm_clients
+from src.shared import usage_logger as UL
+
+
+def _openai_chunk(text=None, usage=None):
+    choices = [] if text is None else [SimpleNamespace(delta=SimpleNamespace(content=text))]
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class FakeOpenAIClient:
+    def __init__(self, deltas, total_tokens=42):
+        self.calls = []
+        usage = SimpleNamespace(total_tokens=total_tokens)
+        self._chunks = [_openai_chunk(d) for d in deltas] + [_openai_chunk(usage=usage)]
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        return iter(self._chunks)
+
+
+class FakeGeminiModel:
+    def __init__(self, deltas, total_tokens=7):
+        self.calls = []
+        self._deltas = deltas
+        self._usage = SimpleNamespace(total_token_count=total_tokens)
+
+    def generate_content(self, prompt, stream=False):
+        self.calls.append((prompt, stream))
+        return iter(
+            SimpleNamespace(text=d, usage_metadata=self._usage) for d in self._deltas
+        )
+
+
+def _reset_usage():
+    UL.UsageLogger._accum = {"openai": 0, "gemini": 0}
+    UL.UsageLogger._totals = {"openai": 0, "gemini": 0}
+
+
+def _openai_manager(client):
+    mgr = llm_clients.OpenAIClientManager(api_key=None, default_model_name="gpt-4.1")
+    mgr.client = client
+    mgr._available = True
+    return mgr
+
+
+def _gemini_manager(model):
+    mgr = llm_clients.GeminiClientManager(api_key=None, default_model_name="gemini-test")
+    mgr.client = model
+    mgr._available = True
+    return mgr
+
+
+def test_openai_stream_yields_deltas_and_records_usage():
+    _reset_usage()
+    client = FakeOpenAIClient(["Hel", "lo", "!"])
+    mgr = _openai_manager(client)
+
+    deltas = list(mgr.stream_response([{"role": "user", "content": "hi"}]))
+
+    assert deltas == ["Hel", "lo", "!"]
+    assert client.calls[0]["stream"] is True
+    assert client.calls[0]["stream_options"] == {"include_usage": True}
+    assert UL.UsageLogger.get_totals()["openai"] == 42
+
+
+def test_openai_stream_unavailable():
+    mgr = llm_clients.OpenAIClientManager(api_key=None, default_model_name="dummy")
+    deltas = list(mgr.stream_response([]))
+    assert len(deltas) == 1
+    assert "not available" in deltas[0]
+
+
+def test_gemini_stream_yields_deltas_and_records_usage():
+    _reset_usage()
+    model = FakeGeminiModel(["Bon", "jour"])
+    mgr = _gemini_manager(model)
+
+    deltas = list(mgr.stream_response([{"role": "user", "content": "hi"}]))
+
+    assert deltas == ["Bon", "jour"]
+    assert model.calls[0][1] is True
+    assert UL.UsageLogger.get_totals()["gemini"] == 7
+
+
+def test_chat_session_forwards_deltas(tmp_path, monkeypatch):
+    from src.shared import history
+
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.json")
+    cs = ChatSession()
+    cs.openai_manager.client = FakeOpenAIClient(["a", "b", "c"])
+    cs.openai_manager._available = True
+
+    seen = []
+    replies = cs.process_user_message(
+        "hello", model_choice="openai", on_delta=lambda s, d: seen.append((s, d))
+    )
+
+    assert seen == [("openai", "a"), ("openai", "b"), ("openai", "c")]
+    assert replies == [("openai", "abc")]
@@ -0,0 +1,55 @@
+"""Slotted messages with interned fields and compressed cold bodies."""
+import pytest
+
+from src import config
+from src.core.chat_session import ConversationHistory
+from src.core.message_store import Message
+
+BIG = "def handler(request):\n    return respond(request)\n" * 200
+
+
+@pytest.fixture(autouse=True)
+def small_hot_window(monkeypatch):
+    monkeypatch.setattr(config, "HISTORY_HOT_MESSAGES", 2)
+    monkeypatch.setattr(config, "HISTORY_COMPRESS_MIN_CHARS", 100)
+
+
+def test_messages_are_slotted_and_intern_their_labels():
+    a = Message("".join(["assis", "tant"]), "x", "".join(["open", "ai"]))
+    b = Message("assistant", "y", "openai")
+    assert not hasattr(a, "__dict__")
+    assert a.role is b.role and a.sender_provider is b.sender_provider
+
+
+def test_cold_bodies_are_compressed_and_read_back_transparently():
+    hist = ConversationHistory(BIG)
+    hist.add_message("user", "read the file", "user")
+    hist.add_message("assistant", BIG, "openai")
+    assert not hist.messages[2].compressed  # Still hot
+
+    hist.add_message("user", "thanks", "user")
+    hist.add_message("assistant", "you're welcome", "openai")
+
+    message = hist.messages[2]
+    assert message.compressed and message.content == BIG
+    assert len(message._body) < len(BIG) // 10
+    assert not hist.messages[0].compressed  # The system prompt stays plain
+    assert hist.get_chat_log()[1] == ("openai", BIG)
+    assert hist.get_openai_format()[2] == {"role": "assistant", "content": BIG}
+    assert message == Message("assistant", BIG, "openai")
+
+
+def test_short_bodies_stay_plain():
+    hist = ConversationHistory("")
+    for content in ("short", "x" * 99, "a", "b", "c"):
+        hist.add_message("user", content, "user")
+    assert not any(m.compressed for m in hist.messages)
+    assert hist.messages[1].content == "x" * 99
+
+
+def test_negative_hot_window_disables_compression(monkeypatch):
+    monkeypatch.setattr(config, "HISTORY_HOT_MESSAGES", -1)
+    hist = ConversationHistory("")
+    for _ in range(5):
+        hist.add_message("assistant", BIG, "openai")
+    assert not any(m.compressed for m in hist.messages)
@@ -0,0 +1,89 @@
+"""Offline mock LLM backends plugged into the real client managers."""
+import asyncio
+import time
+
+import pytest
+
+from src import config
+from src.llm import clients as llm_clients
+from src.llm import resilience
+from src.llm.mock_backends import (
+    MockBehavior,
+    MockGenerativeModel,
+    MockOpenAIServer,
+    use_mock_gemini,
+)
+from src.llm.resilience import LLMCallError
+
+FAST = dict(ttft_sec=0.0, tokens_per_sec=0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(config, "LLM_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(config, "LLM_RETRY_MAX_ATTEMPTS", 2)
+    resilience.reset_circuit_breakers()
+    yield
+    resilience.reset_circuit_breakers()
+
+
+@pytest.fixture
+def server():
+    with MockOpenAIServer(MockBehavior(replies=["alpha beta gamma", "second"], **FAST)) as srv:
+        yield srv
+
+
+def _openai(server):
+    return llm_clients.OpenAIClientManager(
+        api_key="mock", default_model_name="gpt-4.1", base_url=server.base_url
+    )
+
+
+def test_openai_manager_against_mock_server(server):
+    mgr = _openai(server)
+    assert mgr.generate_response([{"role": "user", "content": "hi"}]) == "alpha beta gamma"
+    assert server.requests[0]["model"] == "gpt-4.1"
+
+
+def test_openai_streaming_against_mock_server(server):
+    mgr = _openai(server)
+    deltas = list(mgr.stream_response([{"role": "user", "content": "hi"}]))
+    assert "".join(deltas) == "alpha beta gamma"
+    assert len(deltas) == 3
+
+
+def test_openai_async_against_mock_server(server):
+    mgr = _openai(server)
+
+    async def main():
+        return await asyncio.gather(
+            *(mgr.agenerate_response([{"role": "user", "content": str(i)}]) for i in range(3))
+        )
+
+    assert sorted(asyncio.run(main())) == ["alpha beta gamma", "alpha beta gamma", "second"]
+
+
+def test_mock_server_errors_surface_after_retries():
+    with MockOpenAIServer(MockBehavior(error_rate=1.0, error_status=500, **FAST)) as srv:
+        with pytest.raises(LLMCallError):
+            _openai(srv).generate_response([{"role": "user", "content": "hi"}])
+        assert len(srv.requests) == 2
+
+
+def test_mock_gemini_streams_with_ttft():
+    mgr = llm_clients.GeminiClientManager(api_key=None, default_model_name="gemini-test")
+    use_mock_gemini(mgr, MockBehavior(replies=["one two"], ttft_sec=0.05, tokens_per_sec=1000))
+    start = time.monotonic()
+    deltas = list(mgr.stream_response([{"role": "user", "content": "hi"}]))
+    assert deltas == ["one ", "two"]
+    assert time.monotonic() - start >= 0.05
+
+
+def test_mock_gemini_scripted_callable_and_errors():
+    model = MockGenerativeModel(behavior=MockBehavior(replies=lambda prompt: prompt.upper(), **FAST))
+    assert model.generate_content([{"role": "user", "parts": ["hey"]}]).text == "HEY"
+
+    failing = MockGenerativeModel(behavior=MockBehavior(error_rate=1.0, **FAST))
+    with pytest.raises(Exception) as info:
+        failing.generate_content("x")
+    assert resilience.is_transient(info.value)
@@ -16,7 +16,7 @@ from src.tools.base import ToolInput
 class DummyChatSession:  # noqa: D401 – simple stub
     """Minimal stub mimicking ChatSession public API used by MultiAgentTool."""
 
-    def __init__(self):
+    def __init__(self, **_kwargs):
         self.history = self
 
     # --- history subset ---
@@ -25,6 +25,9 @@ class DummyChatSession:  # noqa: D401 – simple stub
         self._sys = system_prompt_content
 
     # --- main API ---
+    def set_role_prompt(self, role_prompt: str, tool_context: str | None = None) -> None:
+        self.role_prompt, self.tool_context = role_prompt, tool_context
+
     def process_user_message(
         self,
         user_input: str,
@@ -0,0 +1,226 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src import config
+from src.llm import clients as llm_clients
+from src.llm import rate_limit
+from src.llm.rate_limit import ProviderLimiter, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiters():
+    rate_limit.reset_rate_limiters()
+    yield
+    rate_limit.reset_rate_limiters()
+
+
+def test_token_bucket_fifo_waits():
+    bucket = TokenBucket(per_minute=60, capacity=2)  # 1 token / second
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == 0.0
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+    assert bucket.reserve(1) == pytest.approx(2.0, abs=0.05)
+
+
+def test_token_bucket_settle_refunds():
+    bucket = TokenBucket(per_minute=600, capacity=100)
+    bucket.reserve(100)
+    bucket.adjust(50)  # actual usage was lower than estimated
+    assert bucket.reserve(50) == 0.0
+
+
+def test_concurrency_cap():
+    limiter = ProviderLimiter("openai", "m", max_concurrency=2)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def worker():
+        with limiter.acquire():
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) == 2
+
+
+def test_async_acquire_respects_cap():
+    limiter = ProviderLimiter("gemini", "m", max_concurrency=1)
+    order = []
+
+    async def task(i):
+        async with limiter.acquire_async():
+            order.append(("in", i))
+            await asyncio.sleep(0.02)
+            order.append(("out", i))
+
+    async def main():
+        await asyncio.gather(task(0), task(1))
+
+    asyncio.run(main())
+    assert order[0][0] == "in" and order[1][0] == "out"
+
+
+def test_manager_calls_pass_through_shared_limiter(monkeypatch):
+    monkeypatch.setattr(
+        config, "LLM_RATE_LIMITS", {"openai": {"rpm": 0, "tpm": 0, "max_concurrency": 1}}
+    )
+    in_flight = []
+    peak = []
+
+    def create(**kwargs):
+        in_flight.append(1)
+        peak.append(len(in_flight))
+        time.sleep(0.03)
+        in_flight.pop()
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))],
+            usage=SimpleNamespace(total_tokens=1),
+        )
+
+    managers = []
+    for _ in range(3):
+        mgr = llm_clients.OpenAIClientManager(api_key=None, default_model_name="gpt-4.1")
+        mgr.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        mgr._available = True
+        managers.append(mgr)
+
+    threads = [
+        threading.Thread(target=m.generate_response, args=([{"role": "user", "content": "x"}],))
+        for m in managers
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert max(peak) == 1
+    assert rate_limit.get_rate_limiter("openai", "gpt-4.1") is rate_limit.get_rate_limiter("openai", "gpt-4.1")
+
+
+def test_settle_credits_back_only_what_was_debited():
+    limiter = ProviderLimiter("openai", "m", tpm=600)  # Capacity 600 tokens
+    assert limiter._reserve(5000) == 0.0  # Debits the full bucket, not 5000
+    limiter.settle(5000, 100)
+    # 500 of the 600 come back, not 4900; the bucket is not overfilled
+    assert limiter._tokens._level == pytest.approx(500, abs=1)
+
+
+def test_async_waiters_are_woken_without_polling(monkeypatch):
+    limiter = ProviderLimiter("gemini", "m", max_concurrency=1)
+    sleeps = []
+    real_sleep = asyncio.sleep
+
+    async def counting_sleep(delay, *args):
+        sleeps.append(delay)
+        return await real_sleep(delay, *args)
+
+    async def holder(release):
+        async with limiter.acquire_async():
+            await release.wait()
+
+    async def main():
+        release = asyncio.Event()
+        first = asyncio.ensure_future(holder(release))
+        await real_sleep(0)
+        second = asyncio.ensure_future(holder(asyncio.Event()))
+        await real_sleep(0)
+        release.set()
+        await first
+        second.cancel()
+
+    monkeypatch.setattr(rate_limit.asyncio, "sleep", counting_sleep)
+    asyncio.run(main())
+    assert sleeps == []
+
+
+def test_cancelled_waiter_refunds_its_reservation_and_slot():
+    limiter = ProviderLimiter("gemini", "m", rpm=60, max_concurrency=1)
+    limiter._requests.capacity = limiter._requests._level = 2  # Two requests before waiting
+
+    async def main():
+        release = asyncio.Event()
+        entered = asyncio.Event()
+
+        async def hold():
+            async with limiter.acquire_async():
+                entered.set()
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await entered.wait()
+        waiter = asyncio.ensure_future(limiter.acquire_async().__aenter__())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        await holder
+        # The cancelled request's RPM debit is back and its slot is not leaked
+        assert limiter._requests.reserve(1) == 0.0
+        async with limiter.acquire_async():
+            pass
+
+    asyncio.run(asyncio.wait_for(main(), timeout=5))
+
+
+def test_sync_and_async_callers_share_the_cap():
+    limiter = ProviderLimiter("openai", "m", max_concurrency=1)
+    order = []
+    release = threading.Event()
+
+    def thread_holder():
+        with limiter.acquire():
+            order.append("thread in")
+            release.wait()
+            order.append("thread out")
+
+    thread = threading.Thread(target=thread_holder)
+    thread.start()
+    while not order:
+        time.sleep(0.001)
+
+    async def main():
+        threading.Timer(0.02, release.set).start()
+        async with limiter.acquire_async():
+            order.append("task in")
+
+    asyncio.run(main())
+    thread.join()
+    assert order == ["thread in", "thread out", "task in"]
+
+
+def test_retried_call_reserves_and_settles_once(monkeypatch):
+    monkeypatch.setattr(config, "LLM_RATE_LIMITS", {"openai": {"rpm": 60, "tpm": 6000, "max_concurrency": 0}})
+    monkeypatch.setattr(config, "LLM_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(config, "LLM_RETRY_MAX_ATTEMPTS", 3)
+    failures = [TimeoutError("slow"), TimeoutError("slow")]
+
+    def create(**kwargs):
+        if failures:
+            raise failures.pop()
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))],
+            usage=SimpleNamespace(total_tokens=100, prompt_tokens=90, completion_tokens=10),
+        )
+
+    mgr = llm_clients.OpenAIClientManager(api_key=None, default_model_name="gpt-4.1")
+    mgr.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    mgr._available = True
+    mgr.response_cache = None
+    assert mgr.generate_response([{"role": "user", "content": "x" * 4000}]) == "ok"
+
+    limiter = rate_limit.get_rate_limiter("openai", "gpt-4.1")
+    assert limiter._requests._level == pytest.approx(59, abs=0.1)  # One request, not three
+    assert limiter._tokens._level == pytest.approx(5900, abs=1)  # Only the real usage is spent
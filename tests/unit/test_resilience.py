@@ -0,0 +1,150 @@
+"""Retry/backoff and circuit-breaker behaviour for provider calls."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src import config
+from src.core.chat_session import ChatSession
+from src.llm import clients as llm_clients
+from src.llm import resilience
+from src.llm.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMCallError,
+    RetryPolicy,
+    call_with_retries,
+)
+
+
+class RateLimitError(Exception):
+    """Named like the OpenAI SDK class so it is classified as transient."""
+
+    def __init__(self, retry_after=None):
+        super().__init__("rate limited")
+        headers = {} if retry_after is None else {"retry-after": str(retry_after)}
+        self.response = SimpleNamespace(headers=headers)
+
+
+class BadRequestError(Exception):
+    status_code = 400
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(config, "LLM_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(config, "LLM_RETRY_MAX_ATTEMPTS", 3)
+    resilience.reset_circuit_breakers()
+    yield
+    resilience.reset_circuit_breakers()
+
+
+def _flaky(failures, exc_factory, result="ok"):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise exc_factory()
+        return result
+
+    return fn, calls
+
+
+def test_transient_errors_are_retried_honouring_retry_after():
+    fn, calls = _flaky(2, lambda: RateLimitError(retry_after=3))
+    sleeps = []
+    policy = RetryPolicy(max_attempts=4, base_delay=1.0, max_delay=10.0)
+
+    assert call_with_retries("openai", fn, policy=policy, sleep=sleeps.append) == "ok"
+    assert len(calls) == 3
+    assert sleeps == [3.0, 3.0]
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy(max_attempts=10, base_delay=1.0, max_delay=5.0)
+    delays = [policy.delay(attempt) for attempt in range(8)]
+    assert all(0.0 <= d <= 5.0 for d in delays)
+    assert policy.delay(0, retry_after=60) == 5.0
+
+
+def test_non_transient_errors_fail_immediately():
+    fn, calls = _flaky(5, BadRequestError)
+    with pytest.raises(LLMCallError) as info:
+        call_with_retries("openai", fn, sleep=lambda _s: None)
+    assert len(calls) == 1
+    assert info.value.transient is False
+    assert "Error communicating with OpenAI" in str(info.value)
+
+
+def test_circuit_opens_then_allows_single_probe(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker("gemini", failure_threshold=2, reset_timeout=30)
+    policy = RetryPolicy(max_attempts=5, base_delay=0.0)
+    fn, calls = _flaky(10, lambda: TimeoutError("slow"))
+
+    with pytest.raises(LLMCallError):
+        call_with_retries("gemini", fn, policy=policy, breaker=breaker, sleep=lambda _s: None)
+    assert len(calls) == 2  # Stopped retrying once the breaker opened
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        call_with_retries("gemini", fn, policy=policy, breaker=breaker)
+    assert len(calls) == 2  # Fast-failed without contacting the provider
+
+    clock[0] += 31
+    assert breaker.state == "half-open"
+    ok, _ok_calls = _flaky(0, TimeoutError)
+    assert call_with_retries("gemini", ok, policy=policy, breaker=breaker) == "ok"
+    assert breaker.state == "closed"
+
+
+def _failing_openai_manager():
+    attempts = []
+
+    def create(**kwargs):
+        attempts.append(kwargs)
+        raise RateLimitError()
+
+    mgr = llm_clients.OpenAIClientManager(api_key=None, default_model_name="gpt-4.1")
+    mgr.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    mgr._available = True
+    return mgr, attempts
+
+
+def test_manager_raises_after_retries():
+    mgr, attempts = _failing_openai_manager()
+    with pytest.raises(LLMCallError):
+        mgr.generate_response([{"role": "user", "content": "hi"}])
+    assert len(attempts) == 3
+
+
+def test_gemini_async_manager_raises_after_retries():
+    attempts = []
+
+    async def generate_content_async(prompt):
+        attempts.append(prompt)
+        raise ConnectionError("reset")
+
+    mgr = llm_clients.GeminiClientManager(api_key=None, default_model_name="gemini-test")
+    mgr.client = SimpleNamespace(generate_content_async=generate_content_async)
+    mgr._available = True
+    with pytest.raises(LLMCallError):
+        asyncio.run(mgr.agenerate_response([{"role": "user", "content": "hi"}]))
+    assert len(attempts) == 3
+
+
+def test_chat_session_does_not_store_errors_as_answers(tmp_path, monkeypatch):
+    from src.shared import history
+
+    monkeypatch.setattr(history, "HIST_PATH", tmp_path / "chat_history.json")
+    cs = ChatSession()
+    cs.openai_manager, _attempts = _failing_openai_manager()
+
+    replies = cs.process_user_message("hello", model_choice="openai")
+
+    assert len(replies) == 1 and replies[0][1].startswith("⚠️ Error communicating with OpenAI")
+    assert cs.chat_log[-1] == replies[0]
+    assert [m["role"] for m in cs.history.get_openai_format()] == ["system", "user"]
+    assert [m["r"] for m in cs.persistent_history.load()] == ["user"]
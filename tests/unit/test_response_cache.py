@@ -0,0 +1,114 @@
+import time
+from types import SimpleNamespace
+
+from src.llm import clients as llm_clients
+from src.llm import response_cache
+from src.llm.response_cache import ResponseCache
+from src.shared import usage_logger as UL
+
+
+MSGS = [{"role": "system", "content": "sys"}, {"role": "user", "content": "hi"}]
+
+
+def test_key_normalizes_whitespace_and_ignores_extra_fields():
+    a = ResponseCache.make_key("openai", "o3", MSGS)
+    b = ResponseCache.make_key(
+        "openai", "o3", [{"role": "system", "content": "sys\r\n"}, {"role": "user", "content": " hi", "name": "x"}]
+    )
+    assert a == b
+    assert a != ResponseCache.make_key("gemini", "o3", MSGS)
+    assert a != ResponseCache.make_key("openai", "gpt-4.1", MSGS)
+
+
+def test_memory_lru_eviction():
+    cache = ResponseCache(path=None, max_memory_entries=2)
+    cache.put("a", "A")
+    cache.put("b", "B")
+    assert cache.get("a").answer == "A"  # touch a -> b becomes LRU
+    cache.put("c", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+
+def test_ttl_expiry(tmp_path):
+    cache = ResponseCache(path=tmp_path / "c.db", ttl_sec=-1)
+    cache.put("k", "v")
+    assert cache.get("k") is None
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    db = tmp_path / "c.db"
+    ResponseCache(path=db).put("k", "persisted", tokens=9)
+    hit = ResponseCache(path=db).get("k")
+    assert hit.answer == "persisted"
+    assert hit.tokens == 9
+
+
+def test_disk_size_eviction(tmp_path):
+    cache = ResponseCache(path=tmp_path / "c.db", max_disk_bytes=10)
+    cache.put("old", "x" * 6)
+    cache.put("new", "y" * 6)
+    assert cache.stats()["disk_entries"] == 1
+    assert cache.get("new").answer == "y" * 6
+
+
+def test_disk_hit_keeps_the_rows_expiry(tmp_path):
+    db = tmp_path / "c.db"
+    ResponseCache(path=db, ttl_sec=60).put("k", "v")
+    cache = ResponseCache(path=db, ttl_sec=3600)
+    assert cache.get("k").answer == "v"
+    expires_at, _entry = cache._memory["k"]
+    assert expires_at <= time.time() + 60  # Not re-armed with a fresh TTL
+
+
+def test_running_size_total_matches_the_table(tmp_path):
+    db = tmp_path / "c.db"
+    cache = ResponseCache(path=db, max_disk_bytes=25)
+    for i in range(6):
+        cache.put(f"k{i}", "x" * 6)
+    cache.put("k5", "x" * 3)  # Replacing a row adjusts the total by the difference
+    reopened = ResponseCache(path=db)
+    assert cache.stats()["disk_bytes"] == reopened.stats()["disk_bytes"] <= 25
+
+
+def test_access_times_are_batched_and_drive_eviction(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "ACCESS_FLUSH_EVERY", 3)
+    cache = ResponseCache(path=tmp_path / "c.db", max_memory_entries=0, max_disk_bytes=12)
+    cache.put("old", "a" * 6)
+    cache.put("new", "b" * 6)
+    assert cache.get("old") is not None  # Pending, not yet written
+    assert list(cache._pending_access) == ["old"]
+
+    cache.put("third", "c" * 6)  # Eviction flushes first, so "new" is the LRU row
+    assert cache.get("new") is None
+    assert cache.get("old") is not None and cache.get("third") is not None
+
+
+def test_manager_serves_hits_and_reports_them_separately(tmp_path):
+    UL.UsageLogger._accum = {"openai": 0, "gemini": 0}
+    UL.UsageLogger._totals = {"openai": 0, "gemini": 0}
+    UL.UsageLogger._cache_hits = {}
+    UL.UsageLogger._cached_totals = {}
+
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="answer"))],
+            usage=SimpleNamespace(total_tokens=11),
+        )
+
+    cache = ResponseCache(path=tmp_path / "c.db")
+    mgr = llm_clients.OpenAIClientManager(api_key=None, default_model_name="o3", response_cache=cache)
+    mgr.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    mgr._available = True
+
+    assert mgr.generate_response(MSGS) == "answer"
+    assert mgr.generate_response(MSGS) == "answer"
+
+    assert len(calls) == 1
+    assert UL.UsageLogger.get_totals()["openai"] == 11  # billed once
+    assert UL.UsageLogger.get_cache_stats()["openai"] == {"hits": 1, "tokens_saved": 11}
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
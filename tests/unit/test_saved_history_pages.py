@@ -0,0 +1,57 @@
+"""Paging through a session's saved history in the Streamlit app."""
+import importlib
+
+import pytest
+
+from src import config
+from src.shared import history
+
+app = importlib.import_module("src.interfaces.app")
+
+
+@pytest.fixture
+def saved(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "HISTORY_PAGE_SIZE", 10)
+    store = history.store(tmp_path / "session.jsonl")
+    store.extend(("user", str(i)) for i in range(25))
+    yield store
+    store.close()
+
+
+def _texts(messages):
+    return [int(m["c"]) for m in messages]
+
+
+def test_pages_walk_back_to_the_first_record(saved):
+    messages, start = app._newest_page(saved)
+    assert (_texts(messages), start) == (list(range(15, 25)), 15)
+    messages, start = app._with_older_page(saved, messages, start)
+    assert (_texts(messages), start) == (list(range(5, 25)), 5)
+    messages, start = app._with_older_page(saved, messages, start)
+    assert (_texts(messages), start) == (list(range(25)), 0)
+
+
+def test_missing_index_is_rebuilt_for_paging(saved):
+    saved.close()
+    (saved.path.parent / "session.jsonl.idx").unlink()
+    messages, start = app._newest_page(saved)
+    assert start == 15
+    assert _texts(app._with_older_page(saved, messages, start)[0]) == list(range(5, 25))
+
+
+def test_index_behind_the_journal_is_rebuilt_while_open(saved):
+    saved.count()  # Journal and index open
+    with open(saved.path, "a") as fh:  # Another writer crashed before indexing these
+        fh.writelines(f'{{"r": "user", "c": "{i}"}}\n' for i in range(25, 40))
+    messages, start = app._newest_page(saved)
+    assert (_texts(messages), start) == (list(range(30, 40)), 30)
+    assert _texts(app._with_older_page(saved, messages, start)[0]) == list(range(20, 40))
+
+
+def test_unknown_start_reloads_from_the_first_record(saved):
+    messages, start = app._with_older_page(saved, [{"r": "user", "c": "24"}], None)
+    assert (_texts(messages), start) == (list(range(25)), 0)
+
+
+def test_without_a_store_there_is_nothing_to_page():
+    assert app._newest_page(None) == ([], 0)
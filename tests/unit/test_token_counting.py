@@ -0,0 +1,127 @@
+"""Token counting: cached tiktoken encodings and batched, memoized counts."""
+from types import SimpleNamespace
+
+import pytest
+
+from src.llm import clients as llm_clients
+
+
+class FakeEncoding:
+    name = "fake_base"
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, text):
+        return text.split()
+
+    def encode_batch(self, texts):
+        self.batches.append(list(texts))
+        return [t.split() for t in texts]
+
+
+@pytest.fixture
+def fake_tiktoken(monkeypatch):
+    encoding = FakeEncoding()
+    lookups = []
+
+    def encoding_for_model(model_name):
+        lookups.append(model_name)
+        return encoding
+
+    monkeypatch.setattr(
+        llm_clients,
+        "tiktoken",
+        SimpleNamespace(encoding_for_model=encoding_for_model, get_encoding=lambda _: encoding),
+        raising=False,
+    )
+    monkeypatch.setattr(llm_clients, "TIKTOKEN_AVAILABLE", True)
+    llm_clients._encoding_for_model.cache_clear()
+    llm_clients._token_count_memo.clear()
+    yield encoding, lookups
+    llm_clients._encoding_for_model.cache_clear()
+    llm_clients._token_count_memo.clear()
+
+
+def _manager():
+    mgr = llm_clients.OpenAIClientManager(api_key=None, default_model_name="gpt-4.1")
+    mgr.client = object()
+    mgr._available = True
+    return mgr
+
+
+def test_encoding_looked_up_once_per_model(fake_tiktoken):
+    _encoding, lookups = fake_tiktoken
+    mgr = _manager()
+    assert mgr.count_tokens("a b c") == 3
+    assert mgr.count_tokens("d e") == 2
+    assert lookups == ["gpt-4.1"]
+
+
+def test_count_tokens_many_batches_only_new_texts(fake_tiktoken):
+    encoding, _lookups = fake_tiktoken
+    mgr = _manager()
+
+    assert mgr.count_tokens_many(["one two", "", "three", "one two"]) == [2, 0, 1, 2]
+    assert encoding.batches == [["one two", "three"]]
+
+    assert mgr.count_tokens_many(["one two", "three", "four five six"]) == [2, 1, 3]
+    assert encoding.batches[-1] == ["four five six"]
+
+
+def test_count_tokens_many_word_count_fallback():
+    mgr = llm_clients.OpenAIClientManager(api_key=None, default_model_name="dummy")
+    assert mgr.count_tokens_many(["a b", "", "c"]) == [2, 0, 1]
+
+
+class FakeGeminiModel:
+    def __init__(self):
+        self.rpcs = []
+
+    def count_tokens(self, text):
+        self.rpcs.append(text)
+        return SimpleNamespace(total_tokens=len(text) // 2)
+
+
+def _gemini(mode):
+    mgr = llm_clients.GeminiClientManager(
+        api_key=None, default_model_name="gemini-test", token_count_mode=mode
+    )
+    mgr.client = FakeGeminiModel()
+    mgr._available = True
+    return mgr
+
+
+def test_gemini_estimate_mode_makes_no_rpcs():
+    mgr = _gemini("estimate")
+    assert mgr.count_tokens_many(["x" * 40, "", "y" * 8]) == [10, 0, 2]
+    assert mgr.client.rpcs == []
+
+
+def test_gemini_exact_mode_memoizes_and_calibrates():
+    mgr = _gemini("exact")
+    text = "z" * 1000
+    assert mgr.count_tokens(text) == 500
+    assert mgr.count_tokens(text) == 500
+    assert mgr.client.rpcs == [text]
+    # Estimator converged on the observed 2 chars/token ratio
+    assert mgr.count_tokens("w" * 100, mode="estimate") == 50
+
+
+def test_gemini_backfill_mode_refreshes_in_background():
+    mgr = _gemini("backfill")
+    text = "q" * 40
+    assert mgr.count_tokens(text) == 10  # estimate on the render path
+    mgr._backfill.wait_idle()
+    assert mgr.client.rpcs == [text]
+    assert mgr.count_tokens(text) == 20  # exact count once backfilled
+    assert mgr.client.rpcs == [text]
+
+
+def test_memo_keeps_digests_not_texts(fake_tiktoken):
+    mgr = _manager()
+    text = "long body " * 500
+    assert mgr.count_tokens_many([text]) == [1000]
+    keys = list(llm_clients._token_count_memo._counts)
+    assert all(len(digest) == 16 for _namespace, digest in keys)
+    assert text not in {k for key in keys for k in key}
@@ -0,0 +1,212 @@
+"""Turn journal: each reply is recorded once in memory and in the session's persistent history."""
+import multiprocessing
+import threading
+
+import pytest
+
+from src.core.chat_session import ChatSession, ConversationHistory
+from src.core.turn_journal import TurnJournal
+from src.llm.resilience import LLMCallError
+from src.shared import history
+
+
+class RecordingManager:
+    """Answers "reply N" and keeps every prompt it was sent."""
+
+    available = True
+
+    def __init__(self, fail=False):
+        self.prompts = []
+        self.fail = fail
+
+    def get_model_name(self):
+        return "test-model"
+
+    def generate_response(self, messages):
+        self.prompts.append(list(messages))
+        if self.fail:
+            raise LLMCallError("gemini", "down", transient=False)
+        return f"reply {len(self.prompts)}"
+
+
+def test_prompt_grows_by_one_copy_per_reply():
+    cs = ChatSession()
+    cs.openai_manager = manager = RecordingManager()
+    for i in range(3):
+        cs.process_user_message(f"question {i}", model_choice="openai")
+
+    sizes = [len(prompt) for prompt in manager.prompts]
+    assert sizes == [2, 4, 6]  # system + user, then one answer and one question per turn
+    last = [m["content"] for m in manager.prompts[-1]]
+    assert last[1:] == ["question 0", "reply 1", "question 1", "reply 2", "question 2"]
+    assert [m.content for m in cs.history.messages].count("reply 1") == 1
+
+
+def test_turn_is_persisted_once_without_failures():
+    cs = ChatSession()
+    cs.openai_manager = RecordingManager()
+    cs.gemini_manager = RecordingManager(fail=True)
+
+    replies = cs.process_user_message("hi", model_choice="both")
+
+    assert [sender for sender, _ in replies] == ["openai", "gemini"]
+    assert cs.persistent_history.load() == [{"r": "user", "c": "hi"}, {"r": "openai", "c": "reply 1"}]
+    assert [(m.role, m.sender_provider) for m in cs.history.messages[1:]] == [
+        ("user", "user"),
+        ("assistant", "openai"),
+        ("error", "gemini"),
+    ]
+
+
+def test_journal_commits_only_once():
+    turn = TurnJournal(ConversationHistory(""), "hi")
+    turn.reply("openai", "hello")
+    assert turn.commit() == [("openai", "hello")]
+    with pytest.raises(RuntimeError):
+        turn.commit()
+    with pytest.raises(RuntimeError):
+        turn.reply("openai", "late")
+
+
+def test_journal_without_store_only_updates_memory():
+    conversation = ConversationHistory("")
+    turn = TurnJournal(conversation, "hi")
+    turn.reply("openai", "hello")
+    turn.commit()
+    assert [m.content for m in conversation.messages] == ["hi", "hello"]
+
+
+def test_store_failure_keeps_the_turn_and_its_replies():
+    cs = ChatSession()
+    cs.openai_manager = RecordingManager()
+
+    def fail(entries):
+        raise history.HistoryStoreError("Timed out waiting for history lock")
+
+    cs.persistent_history.extend = fail
+    assert cs.process_user_message("hi", model_choice="openai") == [("openai", "reply 1")]
+    assert [m.content for m in cs.history.messages[1:]] == ["hi", "reply 1"]
+
+    turn = TurnJournal(ConversationHistory(""), "again", store=cs.persistent_history)
+    turn.reply("openai", "hello")
+    turn.commit()
+    assert not turn.persisted
+    del cs.persistent_history.extend  # The lock is free again
+    assert turn.persist()
+    assert cs.persistent_history.load() == [{"r": "user", "c": "again"}, {"r": "openai", "c": "hello"}]
+
+
+def test_sessions_persist_to_separate_journals():
+    first, second = ChatSession(), ChatSession()
+    for cs in (first, second):
+        cs.openai_manager = RecordingManager()
+    first.process_user_message("one", model_choice="openai")
+    second.process_user_message("two", model_choice="openai")
+
+    assert first.persistent_history.path != second.persistent_history.path
+    assert [m["c"] for m in first.persistent_history.load()] == ["one", "reply 1"]
+    assert [m["c"] for m in second.persistent_history.load()] == ["two", "reply 1"]
+    assert not history.HIST_PATH.exists()  # No shared global file
+
+    resumed = ChatSession(session_id=first.session_id)
+    assert resumed.persistent_history.load_tail(1) == [{"r": "openai", "c": "reply 1"}]
+
+
+def test_session_ids_cannot_escape_the_sessions_directory():
+    store = history.for_session("../../etc/passwd")
+    assert store.path.parent == history.sessions_dir()
+
+
+def test_sub_agent_sessions_do_not_persist():
+    cs = ChatSession(persist_history=False)
+    cs.openai_manager = RecordingManager()
+    cs.process_user_message("hi", model_choice="openai")
+    assert cs.persistent_history is None
+    assert not history.sessions_dir().exists()
+
+
+def test_concurrent_threads_keep_whole_turns():
+    store = history.for_session("shared")
+
+    def writer(name):
+        for i in range(50):
+            store.extend([("user", f"{name} {i}"), (name, f"answer {i}")])
+
+    threads = [threading.Thread(target=writer, args=(f"t{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    entries = store.load()
+    assert len(entries) == store.count() == 400
+    for question, answer in zip(entries[::2], entries[1::2]):
+        assert question["c"].split()[0] == answer["r"]  # Turns never interleave
+
+
+def _append_from_process(path, name):
+    store = history.store(path)
+    for i in range(25):
+        store.extend([("user", f"{name} {i}"), (name, f"answer {i}")])
+    store.close()
+
+
+def test_concurrent_processes_append_to_one_session():
+    path = history.for_session("shared").path
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=_append_from_process, args=(path, f"p{n}")) for n in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+    assert all(worker.exitcode == 0 for worker in workers)
+
+    store = history.for_session("shared")
+    entries = store.load()
+    assert len(entries) == store.count() == 100
+    assert store.load_range(98, 100) == entries[-2:]
+    for question, answer in zip(entries[::2], entries[1::2]):
+        assert question["c"].split()[0] == answer["r"]
+
+
+def test_least_recently_used_stores_are_closed(monkeypatch):
+    monkeypatch.setattr(history.config, "HISTORY_OPEN_STORES", 2)
+    stores = [history.for_session(f"s{n}") for n in range(3)]
+    for n, found in enumerate(stores):
+        found.append("user", f"hello {n}")
+
+    assert [found._journal is not None for found in stores] == [False, True, True]
+    assert len(history._stores) == 2
+    # An evicted store still works: it reopens and evicts the next oldest
+    stores[0].append("user", "again")
+    assert [m["c"] for m in stores[0].load()] == ["hello 0", "again"]
+    assert [found._journal is not None for found in stores] == [True, False, True]
+
+
+def test_reset_waits_for_the_journal_file_lock():
+    store = history.for_session("locked")
+    store.append("user", "kept until the writer is done")
+    reset_done = threading.Event()
+
+    with history.file_lock(store.path):  # Another process mid-append
+        thread = threading.Thread(target=lambda: (store.reset(), reset_done.set()))
+        thread.start()
+        assert not reset_done.wait(0.2)
+        assert store.path.exists()
+    thread.join(5)
+    assert reset_done.is_set() and not store.path.exists()
+
+
+def test_lock_timeouts_raise_history_store_error(monkeypatch):
+    store = history.for_session("busy")
+    store.append("user", "saved")
+
+    def timed_out(path, timeout=3.0):
+        raise history.ContextBusLockTimeout(f"Could not acquire lock for {path}")
+
+    monkeypatch.setattr(history, "file_lock", timed_out)
+    with pytest.raises(history.HistoryStoreError):
+        store.extend([("user", "lost")])
+    with pytest.raises(history.HistoryStoreError):
+        store.reset()
+    assert store.load() == [{"r": "user", "c": "saved"}]